@@ -0,0 +1,254 @@
+"""
+Command execution and multi-host fan-out for remediate-py-py.py.
+
+Commands run through a transport, which gives every host the same interface:
+
+- LocalTransport runs subprocesses on this machine;
+- SSHTransport runs them on a remote host through the ssh client (BatchMode, so
+  keys or an agent must be set up);
+- FakeTransport answers from canned outputs with simulated latency, transient
+  connection failures and hangs, so a sweep can be exercised without a network.
+
+fan_out() runs a task against many hosts on a bounded thread pool with a time
+budget per host and retries with exponential backoff when a host cannot be
+reached, and yields each host's result as soon as it finishes. A task that
+changes the host is only retried when it lost the host before any command was
+answered, so no step of it runs twice.
+
+remediate-py-py.py --self-check sweeps a fleet of fake hosts through the real
+remediation tasks end to end.
+"""
+
+import random
+import shlex
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+COMMAND_TIMEOUT = 60
+
+# returncode is None when the command could not be started or timed out; error says why
+CommandResult = namedtuple('CommandResult', 'command stdout stderr returncode duration error')
+
+# ok is False when the task raised; value is what the task returned, error why it failed
+HostResult = namedtuple('HostResult', 'host ok value attempts duration error')
+
+class TransportError(Exception):
+    """The host could not be reached. The attempt may be retried."""
+
+class HostTimeout(Exception):
+    """The host used up its time budget."""
+
+def decode_output(output):
+    return output.decode(errors='replace') if output else ''
+
+def run_command(command, timeout=COMMAND_TIMEOUT, input_text=None):
+    start = time.monotonic()
+    try:
+        completed = subprocess.run(command, capture_output=True, timeout=timeout,
+                                   input=input_text.encode() if input_text is not None else None)
+    except subprocess.TimeoutExpired as e:
+        return CommandResult(command, decode_output(e.stdout), decode_output(e.stderr), None,
+                             time.monotonic() - start, f"timed out after {timeout}s")
+    except OSError as e:
+        return CommandResult(command, '', '', None, time.monotonic() - start, str(e))
+    return CommandResult(command, decode_output(completed.stdout), decode_output(completed.stderr),
+                         completed.returncode, time.monotonic() - start, None)
+
+class Transport:
+    """
+    Base class of the transports. fan_out() sets deadline (a time.monotonic()
+    value) before each attempt, and run() never waits past it. answered counts
+    the commands that returned a result, however they exited.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.deadline = None
+        self.answered = 0
+
+    def remaining(self, timeout):
+        """Returns the timeout for the next command, capped by the deadline."""
+        if self.deadline is None:
+            return timeout
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise HostTimeout("ran out of time")
+        return min(timeout, remaining)
+
+    def run(self, command, input_text=None, timeout=COMMAND_TIMEOUT):
+        raise NotImplementedError
+
+class LocalTransport(Transport):
+    def __init__(self, host='localhost'):
+        super().__init__(host)
+
+    def run(self, command, input_text=None, timeout=COMMAND_TIMEOUT):
+        timeout = self.remaining(timeout)
+        result = run_command(command, timeout, input_text)
+        if result.returncode is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            raise HostTimeout(f"ran out of time during {command[0]}")
+        self.answered += 1
+        return result
+
+class SSHTransport(Transport):
+    # The exit code of the ssh client itself when the connection fails
+    SSH_FAILURE = 255
+
+    def __init__(self, host, user=None, port=None, connect_timeout=10, options=()):
+        super().__init__(host)
+        self.target = f"{user}@{host}" if user else host
+        self.base_command = ['ssh', '-o', 'BatchMode=yes', '-o', f'ConnectTimeout={connect_timeout}']
+        if port:
+            self.base_command += ['-p', str(port)]
+        self.base_command += list(options)
+
+    def run(self, command, input_text=None, timeout=COMMAND_TIMEOUT):
+        timeout = self.remaining(timeout)
+        result = run_command(self.base_command + [self.target, '--', shlex.join(command)], timeout, input_text)
+        if result.returncode == self.SSH_FAILURE or (result.returncode is None and 'timed out' not in result.error):
+            raise TransportError(result.stderr.strip() or result.error or "ssh failed")
+        if result.returncode is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            raise HostTimeout(f"ran out of time during {command[0]}")
+        self.answered += 1
+        return result._replace(command=command)
+
+def fake_responder(host, command, input_text):
+    """Canned (returncode, stdout, stderr) of a small Debian host for FakeTransport."""
+    users = ['root:x:0:0:root:/root:/bin/bash', 'daemon:x:1:1:daemon:/usr/sbin:/usr/sbin/nologin']
+    users += [f"user{i}:x:{1000 + i}:{1000 + i}::/home/user{i}:/bin/bash" for i in range(3)]
+    outputs = {
+        ('uname', '-a'): f"Linux {host} 6.1.0 #1 SMP x86_64 GNU/Linux\n",
+        ('getent', 'passwd'): ''.join(f"{line}\n" for line in users),
+        ('getent', 'group'): 'root:x:0:\nsudo:x:27:user0\n' + ''.join(f"user{i}:x:{1000 + i}:\n" for i in range(3)),
+        ('getent', 'shadow'): 'root:!:19000:0:99999:7:::\n' + ''.join(
+            f"user{i}:$y$fakehash{i}:19000:0:99999:7:::\n" for i in range(3)),
+        ('cat', '/etc/passwd'): ''.join(f"{line}\n" for line in users),
+        ('cat', '/etc/group'): 'root:x:0:\nsudo:x:27:user0\n',
+        ('dpkg-query', '-W', '-f', '${Package}\t${Version}\t${Architecture}\n'): 'bash\t5.2\tamd64\nopenssl\t3.0\tamd64\n',
+        ('ss', '-tulnH'): 'tcp LISTEN 0 128 0.0.0.0:22 0.0.0.0:*\n',
+        ('test', '-e', '/etc/debian_version'): '',
+    }
+    key = tuple(command)
+    if key in outputs:
+        return 0, outputs[key], ''
+    if command[0] in ('apt', 'chpasswd', 'gpasswd', 'userdel', 'passwd', 'df', 'lsblk', 'iptables'):
+        return 0, '', ''
+    return 127, '', f"{command[0]}: command not found\n"
+
+class FakeTransport(Transport):
+    """
+    A simulated host. Each attempt first "connects", which fails with a
+    TransportError for the first connect_failures attempts; every command then
+    takes a random latency, and a hanging host never answers before its deadline.
+    With drop_after, the connection drops once after that many answered commands.
+    """
+
+    def __init__(self, host, latency=(0.001, 0.02), connect_failures=0, hang=False, responder=fake_responder,
+                 seed=None, drop_after=None):
+        super().__init__(host)
+        self.latency = latency
+        self.connect_failures = connect_failures
+        self.hang = hang
+        self.drop_after = drop_after
+        self.responder = responder
+        self.rng = random.Random(host if seed is None else seed)
+        self.connected = False
+        self.commands = []
+
+    def connect(self):
+        if self.connect_failures > 0:
+            self.connect_failures -= 1
+            raise TransportError("connection refused (simulated)")
+        self.connected = True
+
+    def run(self, command, input_text=None, timeout=COMMAND_TIMEOUT):
+        if not self.connected:
+            self.connect()
+        if self.drop_after is not None and self.answered >= self.drop_after:
+            self.connected = False
+            self.drop_after = None
+            raise TransportError("connection reset (simulated)")
+        timeout = self.remaining(timeout)
+        delay = timeout if self.hang else self.rng.uniform(*self.latency)
+        time.sleep(min(delay, timeout))
+        if delay >= timeout:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise HostTimeout(f"ran out of time during {command[0]}")
+            return CommandResult(command, '', '', None, timeout, f"timed out after {timeout:.2f}s")
+        self.commands.append((tuple(command), input_text))
+        self.answered += 1
+        returncode, stdout, stderr = self.responder(self.host, command, input_text)
+        return CommandResult(command, stdout, stderr, returncode, delay, None)
+
+def run_host(transport, task, host_timeout, retries, backoff, idempotent=True):
+    """Runs a task against one host, retrying TransportErrors. Returns a HostResult."""
+    start = time.monotonic()
+    deadline = start + host_timeout if host_timeout else None
+    attempt = 0
+    while True:
+        attempt += 1
+        transport.deadline = deadline
+        answered = transport.answered
+        try:
+            return HostResult(transport.host, True, task(transport), attempt, time.monotonic() - start, None)
+        except TransportError as e:
+            error = str(e)
+            if not idempotent and transport.answered > answered:
+                error += f" after {transport.answered - answered} commands; not retried since the task changes the host"
+                return HostResult(transport.host, False, None, attempt, time.monotonic() - start, error)
+            delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            if attempt > retries or (deadline is not None and time.monotonic() + delay >= deadline):
+                return HostResult(transport.host, False, None, attempt, time.monotonic() - start, error)
+            time.sleep(delay)
+        except HostTimeout as e:
+            return HostResult(transport.host, False, None, attempt, time.monotonic() - start, str(e))
+        except Exception as e:
+            return HostResult(transport.host, False, None, attempt, time.monotonic() - start,
+                              f"{type(e).__name__}: {e}")
+
+def fan_out(transports, task, max_workers=32, host_timeout=300, retries=2, backoff=1.0, idempotent=True):
+    """
+    Runs task(transport) for every host on a bounded thread pool.
+
+    Parameters:
+    transports (iterable): One transport per host.
+    task (callable): Receives a transport and returns the host's result value.
+    max_workers (int): Hosts worked on at once.
+    host_timeout (float): Seconds each host may take, retries included (None for no limit).
+    retries (int): Extra attempts after a TransportError.
+    backoff (float): Delay before the first retry, doubling (with jitter) after each.
+    idempotent (bool): False for tasks that change the host. Such a task is only
+        retried when no command of the failed attempt was answered, so it should
+        start with read-only commands.
+
+    Yields:
+    HostResult: One per host, in the order the hosts finish.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_host, transport, task, host_timeout, retries, backoff, idempotent)
+                   for transport in transports]
+        for future in as_completed(futures):
+            yield future.result()
+
+class SweepSummary:
+    """Aggregates HostResults as they stream in."""
+
+    def __init__(self):
+        self.succeeded = []
+        self.failed = []
+        self.retried = 0
+        self.start = time.monotonic()
+
+    def add(self, result):
+        (self.succeeded if result.ok else self.failed).append(result)
+        self.retried += result.attempts > 1
+        return result
+
+    def format(self):
+        total = len(self.succeeded) + len(self.failed)
+        slowest = max(self.succeeded + self.failed, key=lambda result: result.duration, default=None)
+        return (f"{total} hosts in {time.monotonic() - self.start:.2f}s: {len(self.succeeded)} succeeded, "
+                f"{len(self.failed)} failed, {self.retried} needed retries"
+                + (f"; slowest {slowest.host} ({slowest.duration:.2f}s)" if slowest else ''))
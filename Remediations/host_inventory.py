@@ -0,0 +1,314 @@
+"""
+Structured host inventory snapshots for remediate-py-py.py.
+
+The output of the enumeration commands is parsed into typed records (packages,
+listening sockets, users, groups, mounts and block devices) and saved as a
+gzipped JSON snapshot, with a SHA-256 hash of each source's raw output and of
+its records. On the next run a source is only re-collected when its input files
+changed (by mtime and size), its output is only re-parsed when the output hash
+changed, and only the differences from the previous snapshot are reported.
+Sources with a native collector (see native_backend) only run their commands
+when the native collector fails. Native users and groups come from NSS, so they
+are only reused from the snapshot when nsswitch.conf resolves them from files
+alone; directory accounts (LDAP, SSSD, systemd) change without touching any
+input file. Remote hosts are collected without input file fingerprints, since
+those can only be taken locally.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT = os.path.join(os.path.expanduser('~'), '.remediate', 'inventory.json.gz')
+NSSWITCH = '/etc/nsswitch.conf'
+
+Package = namedtuple('Package', 'name version arch')
+Socket = namedtuple('Socket', 'proto address port')
+User = namedtuple('User', 'name uid gid gecos home shell')
+Group = namedtuple('Group', 'name gid members')
+Mount = namedtuple('Mount', 'filesystem size_kb used_kb available_kb mountpoint')
+BlockDevice = namedtuple('BlockDevice', 'name size type mountpoint')
+
+def parse_packages(output):
+    records = []
+    for line in output.splitlines():
+        fields = line.split('\t')
+        if len(fields) == 3:
+            records.append(Package(*fields))
+    return records
+
+def parse_ss(output):
+    # Netid State Recv-Q Send-Q Local:Port Peer:Port (ss -tulnH)
+    records = []
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) >= 5:
+            address, _, port = fields[4].rpartition(':')
+            records.append(Socket(fields[0], address.strip('[]'), port))
+    return records
+
+def parse_netstat(output):
+    # Proto Recv-Q Send-Q Local Foreign [State] (netstat -tuln)
+    records = []
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) >= 4 and fields[0].startswith(('tcp', 'udp')):
+            address, _, port = fields[3].rpartition(':')
+            records.append(Socket(fields[0].rstrip('6'), address, port))
+    return records
+
+def parse_passwd(output):
+    records = []
+    for line in output.splitlines():
+        fields = line.split(':')
+        if len(fields) == 7:
+            records.append(User(fields[0], int(fields[2]), int(fields[3]), fields[4], fields[5], fields[6]))
+    return records
+
+def parse_group(output):
+    records = []
+    for line in output.splitlines():
+        fields = line.split(':')
+        if len(fields) == 4:
+            records.append(Group(fields[0], int(fields[2]), fields[3]))
+    return records
+
+def parse_df(output):
+    # Filesystem 1024-blocks Used Available Capacity Mounted-on (df -P -k)
+    records = []
+    for line in output.splitlines()[1:]:
+        fields = line.split(None, 5)
+        if len(fields) == 6 and fields[1].isdigit():
+            records.append(Mount(fields[0], int(fields[1]), int(fields[2]), int(fields[3]), fields[5]))
+    return records
+
+def parse_lsblk(output):
+    # NAME SIZE TYPE [MOUNTPOINT], spaces escaped as \x20 (lsblk -rn)
+    records = []
+    for line in output.splitlines():
+        fields = line.split(' ')
+        if len(fields) >= 3:
+            mountpoint = fields[3].replace('\\x20', ' ') if len(fields) > 3 else ''
+            records.append(BlockDevice(fields[0], fields[1], fields[2], mountpoint))
+    return records
+
+# A source tries its commands in order and parses the first that succeeds. Sources
+# with input files are skipped while those files are unchanged; sources without
+# are collected on every run. nss names the NSS database a native collector reads.
+Source = namedtuple('Source', 'name record_type key commands inputs nss', defaults=(None,))
+
+SOURCES = [
+    Source('packages', Package, ('name', 'arch'), [
+        (['dpkg-query', '-W', '-f', '${Package}\t${Version}\t${Architecture}\n'], parse_packages),
+        (['rpm', '-qa', '--qf', '%{NAME}\t%{VERSION}-%{RELEASE}\t%{ARCH}\n'], parse_packages),
+    ], ['/var/lib/dpkg/status', '/var/lib/rpm/rpmdb.sqlite', '/var/lib/rpm/Packages']),
+    Source('sockets', Socket, ('proto', 'address', 'port'), [
+        (['ss', '-tulnH'], parse_ss),
+        (['netstat', '-tuln'], parse_netstat),
+    ], []),
+    Source('users', User, ('name',), [(['cat', '/etc/passwd'], parse_passwd)], ['/etc/passwd', NSSWITCH], 'passwd'),
+    Source('groups', Group, ('name',), [(['cat', '/etc/group'], parse_group)], ['/etc/group', NSSWITCH], 'group'),
+    Source('mounts', Mount, ('mountpoint',), [(['df', '-P', '-k'], parse_df)], []),
+    Source('block_devices', BlockDevice, ('name',), [
+        (['lsblk', '-rn', '-o', 'NAME,SIZE,TYPE,MOUNTPOINT'], parse_lsblk),
+    ], []),
+]
+
+def fingerprint(paths):
+    """Returns the (path, mtime_ns, size) of every existing input file, or None if there are none."""
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stats.append([path, stat.st_mtime_ns, stat.st_size])
+    return stats or None
+
+def nss_services(database, path=NSSWITCH):
+    """Returns the services nsswitch.conf lists for a database, e.g. ['files', 'systemd']."""
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return ['files']
+    for line in lines:
+        name, sep, services = line.split('#', 1)[0].partition(':')
+        if sep and name.strip() == database:
+            # Skip the [NOTFOUND=return] style actions between the services
+            return [service for service in services.split() if not service.startswith('[')]
+    return ['files']
+
+def content_hash(data):
+    return hashlib.sha256(data.encode()).hexdigest()
+
+def records_hash(records):
+    return content_hash(json.dumps([list(record) for record in records], separators=(',', ':')))
+
+def load_snapshot(path):
+    try:
+        with gzip.open(path, 'rt') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return snapshot if snapshot.get('version') == SNAPSHOT_VERSION else None
+
+def save_snapshot(path, snapshot):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f"{path}.tmp"
+    with gzip.open(temporary, 'wt') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(temporary, path)
+
+def snapshot_records(snapshot, source):
+    entry = snapshot['sources'].get(source.name) if snapshot else None
+    return None if entry is None else [source.record_type(*fields) for fields in entry['records']]
+
+def make_entry(inputs, command, output_hash, records):
+    return {
+        'fingerprint': inputs,
+        'command': command,
+        'output_hash': output_hash,
+        'records_hash': records_hash(records),
+        'records': [list(record) for record in records],
+    }
+
+def collect_source(source, previous, run_command, native=None, local=True):
+    """
+    Collects one source, reusing the previous snapshot entry when the input files
+    or the command output are unchanged. A native collector, if given, is tried
+    before the commands, which are then only a fallback. When the commands run on
+    another host (local is False), the local input files say nothing about it, so
+    the source is always re-run.
+
+    Returns:
+    tuple: The snapshot entry and its status: 'unchanged' (not re-run), 'same output'
+    (re-run, not re-parsed), 'collected' or 'failed'.
+    """
+    inputs = fingerprint(source.inputs) if local else None
+    if native is not None and source.nss and nss_services(source.nss) != ['files']:
+        inputs = None  # Directory accounts change without touching the input files
+    if previous and inputs is not None and previous['fingerprint'] == inputs:
+        return previous, 'unchanged'
+
+    errors = []
+    if native is not None:
+        try:
+            records = native()
+        except OSError as e:
+            errors.append(f"native: {e}")
+        else:
+            entry = make_entry(inputs, ['native'], records_hash(records), records)
+            if previous and previous['records_hash'] == entry['records_hash']:
+                return dict(previous, fingerprint=inputs), 'same output'
+            return entry, 'collected'
+
+    for command, parse in source.commands:
+        result = run_command(command)
+        if result.returncode != 0:
+            errors.append(f"{command[0]}: {result.error or result.stderr.strip() or f'exit code {result.returncode}'}")
+            continue
+        output_hash = content_hash(result.stdout)
+        if previous and previous['output_hash'] == output_hash:
+            return dict(previous, fingerprint=inputs), 'same output'
+        return make_entry(inputs, command, output_hash, parse(result.stdout)), 'collected'
+    return previous, f"failed ({'; '.join(errors)})"
+
+def collect_inventory(run_command, previous=None, sources=SOURCES, max_workers=8, native=None, local=True):
+    """
+    Collects every source concurrently.
+
+    Parameters:
+    run_command (callable): Runs a command list and returns a result with
+        stdout, stderr, returncode and error (see executor.CommandResult).
+    previous (dict, optional): The previous snapshot.
+    native (dict, optional): Native collectors by source name (see native_backend).
+    local (bool): False when run_command runs the commands on another host.
+
+    Returns:
+    tuple: The new snapshot and the status of each source by name.
+    """
+    previous_sources = previous['sources'] if previous else {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {source.name: pool.submit(collect_source, source, previous_sources.get(source.name), run_command,
+                                            (native or {}).get(source.name), local)
+                   for source in sources}
+    snapshot = {'version': SNAPSHOT_VERSION, 'created': time.time(), 'sources': {}}
+    statuses = {}
+    for name, future in futures.items():
+        entry, statuses[name] = future.result()
+        if entry is not None:
+            snapshot['sources'][name] = entry
+    return snapshot, statuses
+
+def diff_source(source, old_records, new_records):
+    """
+    Compares two record lists by the source key. Returns (added, removed, changed) lists.
+
+    Keys need not be unique (RPM hosts install several kernel or gpg-pubkey
+    versions per name and arch), so records are compared as multisets per key:
+    identical records cancel out, and the leftovers of a key are paired up in
+    order as changes, with any surplus added or removed.
+    """
+    key = lambda record: tuple(getattr(record, field) for field in source.key)
+    old, new = defaultdict(list), defaultdict(list)
+    for record in old_records:
+        old[key(record)].append(record)
+    for record in new_records:
+        new[key(record)].append(record)
+    added, removed, changed = [], [], []
+    for k in old.keys() | new.keys():
+        common = Counter(old.get(k, [])) & Counter(new.get(k, []))
+        old_left = sorted((Counter(old.get(k, [])) - common).elements())
+        new_left = sorted((Counter(new.get(k, [])) - common).elements())
+        changed.extend(zip(old_left, new_left))
+        removed.extend(old_left[len(new_left):])
+        added.extend(new_left[len(old_left):])
+    return sorted(added), sorted(removed), sorted(changed)
+
+def diff_snapshots(old, new, sources=SOURCES):
+    """Returns {source name: (added, removed, changed)} for the sources whose records hash changed."""
+    diffs = {}
+    for source in sources:
+        old_entry = old['sources'].get(source.name) if old else None
+        new_entry = new['sources'].get(source.name)
+        if new_entry is None or (old_entry and old_entry['records_hash'] == new_entry['records_hash']):
+            continue
+        diffs[source.name] = diff_source(source, snapshot_records(old, source) or [], snapshot_records(new, source))
+    return diffs
+
+def format_record(record):
+    return ' '.join(str(value) for value in record)
+
+def print_inventory(snapshot, statuses, diffs, first_run):
+    for source in SOURCES:
+        records = snapshot_records(snapshot, source)
+        count = 'no records' if records is None else f"{len(records)} records"
+        print(f"[{source.name}] {statuses[source.name]}, {count}")
+        if source.name not in diffs:
+            continue
+        added, removed, changed = diffs[source.name]
+        if first_run:
+            for record in added:
+                print(f"  {format_record(record)}")
+            continue
+        for record in added:
+            print(f"  + {format_record(record)}")
+        for record in removed:
+            print(f"  - {format_record(record)}")
+        for old_record, new_record in changed:
+            print(f"  ~ {format_record(old_record)} -> {format_record(new_record)}")
+
+def update_inventory(run_command, path=DEFAULT_SNAPSHOT, max_workers=8, native=None):
+    """Collects the inventory, prints it (or its changes since the last run) and saves the snapshot."""
+    previous = load_snapshot(path)
+    snapshot, statuses = collect_inventory(run_command, previous, max_workers=max_workers, native=native)
+    diffs = diff_snapshots(previous, snapshot)
+    print_inventory(snapshot, statuses, diffs, previous is None)
+    save_snapshot(path, snapshot)
+    return snapshot, diffs
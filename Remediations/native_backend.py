@@ -0,0 +1,182 @@
+"""
+Native POSIX collection backend for remediate-py-py.py.
+
+Reads accounts through the pwd and grp modules (so NSS sources such as LDAP are
+included), and packages, processes and sockets straight from /var/lib/dpkg/status,
+/proc and /proc/net, instead of forking cat, id, passwd -S, ps, ss or dpkg-query
+per item. Every function raises OSError when its source is unavailable, so that
+callers can fall back to the subprocess commands.
+"""
+
+import os
+import socket
+import struct
+import time
+from collections import namedtuple
+
+try:
+    import grp
+    import pwd
+except ImportError:
+    grp = pwd = None
+
+from host_inventory import Group, Package, Socket, User
+
+Process = namedtuple('Process', 'pid ppid user state rss_kb command')
+
+# /proc/net socket states listed by ss -tuln: TCP LISTEN and unconnected UDP
+LISTENING_STATES = {'tcp': '0A', 'udp': '07'}
+
+def require_accounts():
+    if pwd is None:
+        raise OSError("The pwd and grp modules are not available on this platform")
+
+def read_text(path):
+    with open(path, errors='replace') as f:
+        return f.read()
+
+def os_release(path='/etc/os-release'):
+    release = {}
+    for line in read_text(path).splitlines():
+        key, sep, value = line.partition('=')
+        if sep and not key.startswith('#'):
+            release[key.strip()] = value.strip().strip('"\'')
+    return release
+
+def users():
+    require_accounts()
+    return [User(entry.pw_name, entry.pw_uid, entry.pw_gid, entry.pw_gecos, entry.pw_dir, entry.pw_shell)
+            for entry in pwd.getpwall()]
+
+def groups():
+    require_accounts()
+    return [Group(entry.gr_name, entry.gr_gid, ','.join(entry.gr_mem)) for entry in grp.getgrall()]
+
+class AccountIndex:
+    """
+    Users, groups and every user's group memberships, collected once.
+
+    Attributes:
+    users (dict): User records by name.
+    groups (dict): Group records by name.
+    group_names (dict): Group names by gid.
+    user_names (dict): User names by uid.
+    memberships (dict): By user name, the (gid, name) of the primary group
+        followed by the supplementary groups.
+    """
+
+    def __init__(self, user_records=None, group_records=None):
+        self.users = {user.name: user for user in (users() if user_records is None else user_records)}
+        self.groups = {group.name: group for group in (groups() if group_records is None else group_records)}
+        self.group_names = {group.gid: group.name for group in self.groups.values()}
+        self.user_names = {}
+        for user in self.users.values():
+            self.user_names.setdefault(user.uid, user.name)
+        supplementary = {}
+        for group in self.groups.values():
+            for member in filter(None, group.members.split(',')):
+                supplementary.setdefault(member, []).append((group.gid, group.name))
+        self.memberships = {}
+        for user in self.users.values():
+            primary = (user.gid, self.group_names.get(user.gid, str(user.gid)))
+            self.memberships[user.name] = [primary] + [group for group in supplementary.get(user.name, [])
+                                                       if group != primary]
+
+    def format_id(self, name):
+        """Formats a user like the id command: uid=0(root) gid=0(root) groups=0(root)."""
+        user = self.users[name]
+        memberships = self.memberships[name]
+        group_list = ','.join(f"{gid}({group})" for gid, group in memberships)
+        return f"uid={user.uid}({user.name}) gid={memberships[0][0]}({memberships[0][1]}) groups={group_list}"
+
+def parse_shadow(text):
+    """Returns {user: shadow fields} from shadow file lines (or getent shadow output)."""
+    shadow = {}
+    for line in text.splitlines():
+        fields = line.split(':')
+        if len(fields) >= 7:
+            shadow[fields[0]] = fields
+    return shadow
+
+def read_shadow(path='/etc/shadow'):
+    """Returns {user: shadow fields} from the shadow file (readable by root only)."""
+    return parse_shadow(read_text(path))
+
+def password_status(fields):
+    """Formats shadow fields like passwd -S: name, L/NP/P, last change, min, max, warn and inactive days."""
+    password = fields[1]
+    status = 'L' if password.startswith(('!', '*')) else 'NP' if not password else 'P'
+    last_change = (time.strftime('%Y-%m-%d', time.gmtime(int(fields[2]) * 86400))
+                   if fields[2].isdigit() else 'never')
+    return ' '.join([fields[0], status, last_change] + [field or '-1' for field in fields[3:7]])
+
+def packages(status_path='/var/lib/dpkg/status'):
+    """Lists the installed packages from the dpkg status database."""
+    records = []
+    for paragraph in read_text(status_path).split('\n\n'):
+        fields = {}
+        for line in paragraph.splitlines():
+            key, sep, value = line.partition(': ')
+            if sep and not line[0].isspace():
+                fields[key] = value
+        if fields.get('Status', '').endswith(' installed') and 'Package' in fields:
+            records.append(Package(fields['Package'], fields.get('Version', ''), fields.get('Architecture', '')))
+    return sorted(records)
+
+def decode_address(hex_address):
+    """Decodes a /proc/net address, stored as host-order 32-bit words, into text."""
+    words = [int(hex_address[i:i + 8], 16) for i in range(0, len(hex_address), 8)]
+    packed = struct.pack(f'={len(words)}I', *words)
+    return socket.inet_ntop(socket.AF_INET if len(words) == 1 else socket.AF_INET6, packed)
+
+def sockets(proc_net='/proc/net'):
+    """Lists the listening TCP and UDP sockets, like ss -tuln."""
+    records = []
+    found = False
+    for proto, state in LISTENING_STATES.items():
+        for suffix in ('', '6'):
+            try:
+                lines = read_text(os.path.join(proc_net, proto + suffix)).splitlines()[1:]
+            except FileNotFoundError:
+                continue
+            found = True
+            for line in lines:
+                fields = line.split()
+                if len(fields) > 3 and fields[3] == state:
+                    address, port = fields[1].split(':')
+                    records.append(Socket(proto, decode_address(address), str(int(port, 16))))
+    if not found:
+        raise OSError(f"No socket tables in {proc_net}")
+    return records
+
+def processes(index=None, proc='/proc'):
+    """Lists the running processes from /proc, like ps aux."""
+    records = []
+    for entry in os.listdir(proc):
+        if not entry.isdigit():
+            continue
+        try:
+            stat = read_text(os.path.join(proc, entry, 'stat'))
+            status = read_text(os.path.join(proc, entry, 'status'))
+            with open(os.path.join(proc, entry, 'cmdline'), 'rb') as f:
+                cmdline = f.read()
+        except OSError:
+            continue  # The process exited while being read
+        # The command name is in parentheses and may itself contain spaces or parentheses
+        name = stat[stat.index('(') + 1:stat.rindex(')')]
+        fields = stat[stat.rindex(')') + 2:].split()
+        values = dict(line.split(':', 1) for line in status.splitlines() if ':' in line)
+        uid = int(values.get('Uid', '0').split()[0])
+        rss_kb = int(values.get('VmRSS', '0 kB').split()[0])
+        command = cmdline.replace(b'\0', b' ').decode(errors='replace').strip() or f"[{name}]"
+        records.append(Process(int(entry), int(fields[1]), index.user_names.get(uid, str(uid)) if index else str(uid),
+                               fields[0], rss_kb, command))
+    return sorted(records)
+
+# Native collectors for the host_inventory sources; the others only have commands
+NATIVE_COLLECTORS = {
+    'packages': packages,
+    'sockets': sockets,
+    'users': users,
+    'groups': groups,
+}
@@ -1,7 +1,68 @@
+import argparse
+import contextlib
+import functools
 import os
 import subprocess
 import platform
 import getpass
+import importlib.util
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import executor
+import host_inventory
+import native_backend
+import user_plan
+
+def import_optional(name):
+    """
+    Imports a module from the import path or else from the repository root, above
+    this directory. Returns None when neither has it.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        pass
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), f"{name}.py")
+    if not os.path.isfile(path):
+        return None
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+# metrics.py lives at the repository root; a copy of Remediations/ on its own runs uninstrumented
+metrics = import_optional('metrics')
+
+# Seconds before an enumeration command is killed, and commands run at once
+COMMAND_TIMEOUT = executor.COMMAND_TIMEOUT
+MAX_WORKERS = 8
+
+# Multi-host sweeps: hosts worked on at once, seconds per host and retries when unreachable
+HOST_WORKERS = 32
+HOST_TIMEOUT = 300
+HOST_RETRIES = 2
+UPDATE_TIMEOUT = 1800
+HOST_SNAPSHOTS = os.path.join(os.path.dirname(host_inventory.DEFAULT_SNAPSHOT), 'hosts')
+
+run_command = executor.run_command
+
+WINDOWS_COMMANDS = [
+    ['systeminfo'],
+    ['wmic', 'product', 'get', 'name'],
+    ['net', 'localgroup'],
+    ['schtasks', '/query'],
+]
+
+# Packages, sockets, users, groups, mounts and block devices are collected by host_inventory
+POSIX_COMMANDS = [
+    ['uname', '-a'],
+    ['iptables', '-L'],
+    ['crontab', '-l'],
+]
 
 def confirm_step(message):
     response = input(f"{message} (yes/no): ").lower()
@@ -9,29 +70,95 @@ def confirm_step(message):
         print("Operation cancelled.")
         exit(1)
 
-def enumerate_system():
+def collect_system_info(commands, timeout=COMMAND_TIMEOUT, max_workers=MAX_WORKERS):
+    # Commands run concurrently, so the whole collection takes about as long as the slowest one
+    if not commands:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(commands))) as pool:
+        return list(pool.map(lambda command: run_command(command, timeout), commands))
+
+def print_result(result):
+    status = result.error or f"exit code {result.returncode}"
+    print(f"$ {' '.join(result.command)}  ({status}, {result.duration:.2f}s)")
+    if result.stdout:
+        print(result.stdout)
+    if result.stderr and result.returncode != 0:
+        print(result.stderr)
+
+def enumerate_system(timeout=COMMAND_TIMEOUT, max_workers=MAX_WORKERS, snapshot_path=host_inventory.DEFAULT_SNAPSHOT):
     confirm_step("Enumerate current system status?")
     print("System Info:")
     print(platform.uname())
-    if os.name == 'nt':
-        print(subprocess.check_output(['systeminfo']).decode())
-        print(subprocess.check_output(['wmic', 'product', 'get', 'name']).decode())
-        print(subprocess.check_output(['net', 'localgroup']).decode())
-        print(subprocess.check_output(['schtasks', '/query']).decode())
-    else:
-        print(subprocess.check_output(['uname', '-a']).decode())
-        print(subprocess.check_output(['cat', '/etc/os-release']).decode())
-        print(subprocess.check_output(['dpkg', '-l']).decode())
-        print(subprocess.check_output(['rpm', '-qa']).decode())
-        print(subprocess.check_output(['ps', 'aux']).decode())
-        print(subprocess.check_output(['netstat', '-tuln']).decode())
-        print(subprocess.check_output(['iptables', '-L']).decode())
-        print(subprocess.check_output(['ss', '-tuln']).decode())
-        print(subprocess.check_output(['df', '-h']).decode())
-        print(subprocess.check_output(['lsblk']).decode())
-        print(subprocess.check_output(['cat', '/etc/passwd']).decode())
-        print(subprocess.check_output(['cat', '/etc/group']).decode())
-        print(subprocess.check_output(['crontab', '-l']).decode())
+    commands = WINDOWS_COMMANDS if os.name == 'nt' else POSIX_COMMANDS
+    start = time.monotonic()
+    results = collect_system_info(commands, timeout, max_workers)
+    for result in results:
+        print_result(result)
+    record_commands(results)
+    failed = sum(1 for result in results if result.returncode != 0)
+    print(f"Ran {len(results)} commands in {time.monotonic() - start:.2f}s ({failed} failed or timed out)")
+    if os.name != 'nt':
+        print_os_release(timeout)
+        print_processes(timeout)
+        # Only the changes since the last snapshot are printed on repeat runs
+        print(f"\nInventory ({snapshot_path}):")
+        inventory_start = time.monotonic()
+        host_inventory.update_inventory(lambda command: run_command(command, timeout), snapshot_path, max_workers,
+                                        native_backend.NATIVE_COLLECTORS)
+        if metrics is not None:
+            metrics.observe('remediate.stage_seconds', time.monotonic() - inventory_start, stage='inventory')
+    return results
+
+def record_commands(results):
+    """Records the duration and outcome of each command when metrics are enabled."""
+    if metrics is None or not metrics.enabled():
+        return
+    for result in results:
+        metrics.observe('remediate.command_seconds', result.duration, command=result.command[0])
+        # A returncode of None means the command timed out or could not be started
+        outcome = 'ok' if result.returncode == 0 else 'failed' if result.returncode is not None else 'error'
+        metrics.count('remediate.commands', command=result.command[0], outcome=outcome)
+
+def print_os_release(timeout=COMMAND_TIMEOUT):
+    try:
+        release = native_backend.os_release()
+    except OSError:
+        print_result(run_command(['cat', '/etc/os-release'], timeout))
+        return
+    print(f"\nOS: {release.get('PRETTY_NAME', release.get('NAME', 'unknown'))}")
+
+def print_processes(timeout=COMMAND_TIMEOUT):
+    try:
+        processes = native_backend.processes(load_accounts())
+    except OSError:
+        print_result(run_command(['ps', 'aux'], timeout))
+        return
+    print(f"\n{'USER':<12} {'PID':>7} {'PPID':>7} S {'RSS(kB)':>9} COMMAND")
+    for process in processes:
+        print(f"{process.user:<12} {process.pid:>7} {process.ppid:>7} {process.state} {process.rss_kb:>9} "
+              f"{process.command}")
+
+def load_accounts():
+    # One pass over the account database instead of an id/passwd process per user
+    try:
+        return native_backend.AccountIndex()
+    except OSError:
+        with open('/etc/passwd') as f:
+            users = host_inventory.parse_passwd(f.read())
+        with open('/etc/group') as f:
+            groups = host_inventory.parse_group(f.read())
+        return native_backend.AccountIndex(users, groups)
+
+def local_users():
+    # NSS/LDAP accounts from load_accounts() belong to their directory; only /etc/passwd users are managed here
+    with open('/etc/passwd') as f:
+        return [user.name for user in host_inventory.parse_passwd(f.read())]
+
+def load_shadow():
+    try:
+        return native_backend.read_shadow()
+    except OSError:
+        return None
 
 def change_passwords():
     confirm_step("Change user passwords?")
@@ -46,8 +173,7 @@ def change_passwords():
                 new_password = getpass.getpass(f"Enter new password for user {user}: ")
             subprocess.run(['net', 'user', user, new_password])
     else:
-        with open('/etc/passwd') as f:
-            users = [line.split(':')[0] for line in f.readlines()]
+        users = local_users()
         for user in users:
             if not single_password:
                 new_password = getpass.getpass(f"Enter new password for user {user}: ")
@@ -61,16 +187,21 @@ def manage_users():
         groups = subprocess.check_output(['net', 'localgroup']).decode().splitlines()
         groups = [group.strip() for group in groups if group.strip()]
     else:
-        users = [line.split(':')[0] for line in open('/etc/passwd').readlines()]
-        groups = [line.split(':')[0] for line in open('/etc/group').readlines()]
+        accounts = load_accounts()
+        shadow = load_shadow()
+        users = local_users()
+        groups = list(accounts.groups)
     
     for user in users:
         print(f"Account: {user}")
         if os.name == 'nt':
             print(subprocess.check_output(['net', 'user', user]).decode())
         else:
-            print(subprocess.check_output(['id', user]).decode())
-            print(subprocess.check_output(['passwd', '-S', user]).decode())
+            print(accounts.format_id(user))
+            if shadow is not None and user in shadow:
+                print(native_backend.password_status(shadow[user]))
+            else:
+                print(run_command(['passwd', '-S', user]).stdout)
         action = input("Choose action (delete, lock, unlock, addAdmin, removeAdmin, changeGroup, skip): ").strip().lower()
         if action == 'delete':
             if os.name == 'nt':
@@ -115,11 +246,254 @@ def update_system():
         elif os.path.exists('/etc/redhat-release'):
             subprocess.run(['dnf', 'update', '-y'])
 
+def apply_user_plan(path, dry_run=False):
+    if os.name == 'nt':
+        print("User plans are only supported on Linux.")
+        exit(1)
+    accounts = load_accounts()
+    try:
+        plan = user_plan.build_plan(user_plan.load_plan(path), accounts)
+    except (OSError, ValueError, ImportError) as e:
+        print(e)
+        exit(1)
+    user_plan.print_plan(plan)
+    if not dry_run:
+        confirm_step(f"Apply this plan to {len(plan['users'])} accounts?")
+    report = user_plan.apply_plan(plan, native_backend.read_shadow, dry_run)
+    user_plan.print_report(report, dry_run)
+
+def enumerate_host(transport, snapshot_dir=HOST_SNAPSHOTS):
+    """Runs the enumeration commands and inventory on one host. Returns a one-line summary."""
+    results = [transport.run(command) for command in POSIX_COMMANDS]
+    failed = sum(1 for result in results if result.returncode != 0)
+    path = os.path.join(snapshot_dir, f"{transport.host}.json.gz")
+    previous = host_inventory.load_snapshot(path)
+    snapshot, statuses = host_inventory.collect_inventory(transport.run, previous, max_workers=1, local=False)
+    diffs = host_inventory.diff_snapshots(previous, snapshot)
+    host_inventory.save_snapshot(path, snapshot)
+    kernel = results[0].stdout.split()[2] if results[0].returncode == 0 and len(results[0].stdout.split()) > 2 else '?'
+    sources_failed = sum(1 for status in statuses.values() if status.startswith('failed'))
+    changes = sum(len(added) + len(removed) + len(changed) for added, removed, changed in diffs.values())
+    return (f"kernel {kernel}, {failed}/{len(results)} commands failed, {len(snapshot['sources'])} inventory sources"
+            f" ({sources_failed} failed), " + ('first snapshot' if previous is None else f"{changes} changes"))
+
+def host_accounts(transport):
+    """Loads the account index and shadow entries of a host through getent."""
+    users, groups = (transport.run(['getent', database]) for database in ('passwd', 'group'))
+    if users.returncode != 0 or groups.returncode != 0:
+        raise OSError(f"getent failed: {users.stderr.strip() or groups.stderr.strip() or users.error or groups.error}")
+    accounts = native_backend.AccountIndex(host_inventory.parse_passwd(users.stdout),
+                                           host_inventory.parse_group(groups.stdout))
+
+    def read_shadow():
+        shadow = transport.run(['getent', 'shadow'])
+        if shadow.returncode != 0:
+            raise OSError(f"getent shadow: {shadow.stderr.strip() or shadow.error}")
+        return native_backend.parse_shadow(shadow.stdout)
+    return accounts, read_shadow
+
+def audit_host_users(transport, admin_group='sudo'):
+    """Summarizes the accounts of one host: superusers, admins and password states."""
+    accounts, read_shadow = host_accounts(transport)
+    try:
+        shadow = read_shadow()
+    except OSError:
+        shadow = None
+    superusers = sorted(user.name for user in accounts.users.values() if user.uid == 0)
+    admins = sorted(filter(None, accounts.groups[admin_group].members.split(','))) if admin_group in accounts.groups else []
+    summary = f"{len(accounts.users)} users, uid 0: {','.join(superusers)}, {admin_group}: {','.join(admins) or '-'}"
+    if shadow is None:
+        return summary + ", shadow unreadable"
+    states = [native_backend.password_status(fields).split()[1] for fields in shadow.values()]
+    return summary + f", {states.count('P')} with passwords, {states.count('L')} locked, {states.count('NP')} empty"
+
+def plan_host(transport, spec, dry_run=False):
+    """Builds and applies a user plan on one host. Returns a one-line summary."""
+    accounts, read_shadow = host_accounts(transport)
+    plan = user_plan.build_plan(spec, accounts)
+    # Every host gets its own passwords, so each host's generated passwords get their own file
+    plan['generated'] = {f"{path}.{transport.host}": passwords for path, passwords in plan['generated'].items()}
+    report = user_plan.apply_plan(plan, read_shadow, dry_run, transport.run)
+    errors = [error for entry in report for error in entry.errors]
+    if errors:
+        raise RuntimeError('; '.join(errors))
+    return (f"{sum(len(members) for members in plan['groups'].values())} group memberships, "
+            f"{len(plan['passwords'])} passwords, {len(plan['lock'])} locked, {len(plan['unlock'])} unlocked, "
+            f"{len(plan['delete'])} deleted" + (" (dry run)" if dry_run else ''))
+
+def update_host(transport):
+    """Updates the packages of one host with apt or dnf. Returns a one-line summary."""
+    if transport.run(['test', '-e', '/etc/debian_version']).returncode == 0:
+        commands = [['apt', 'update'], ['apt', 'upgrade', '-y']]
+    elif transport.run(['test', '-e', '/etc/redhat-release']).returncode == 0:
+        commands = [['dnf', 'update', '-y']]
+    else:
+        raise RuntimeError("no supported package manager")
+    for command in commands:
+        result = transport.run(command, timeout=UPDATE_TIMEOUT)
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)}: {result.error or result.stderr.strip() or result.returncode}")
+    return ' && '.join(' '.join(command) for command in commands)
+
+def load_hosts(spec):
+    """Reads hosts from a file (one per line, # comments) or a comma-separated list."""
+    if os.path.isfile(spec):
+        with open(spec) as f:
+            lines = (line.split('#', 1)[0].strip() for line in f)
+            return [line for line in lines if line]
+    return [host.strip() for host in spec.split(',') if host.strip()]
+
+def make_transport(host, kind, ssh_user=None, ssh_port=None):
+    if kind == 'ssh':
+        return executor.SSHTransport(host, ssh_user, ssh_port)
+    if kind == 'fake':
+        return executor.FakeTransport(host)
+    return executor.LocalTransport(host)
+
+def sweep_hosts(hosts, task, transport='ssh', workers=HOST_WORKERS, host_timeout=HOST_TIMEOUT, retries=HOST_RETRIES,
+                ssh_user=None, ssh_port=None, changes=False):
+    """
+    Runs a host task on every host, printing each result as the host finishes.
+    With changes, a host that drops the connection partway through is not retried.
+    """
+    summary = executor.SweepSummary()
+    transports = [make_transport(host, transport, ssh_user, ssh_port) for host in hosts]
+    for result in executor.fan_out(transports, task, workers, host_timeout, retries, idempotent=not changes):
+        summary.add(result)
+        if metrics is not None:
+            metrics.observe('remediate.host_seconds', result.duration, outcome='ok' if result.ok else 'failed')
+            metrics.count('remediate.host_attempts', result.attempts)
+        status = 'ok' if result.ok else 'FAILED'
+        retried = f", {result.attempts} attempts" if result.attempts > 1 else ''
+        print(f"{result.host:<30} {status:<6} {result.duration:>7.2f}s{retried}  {result.value if result.ok else result.error}")
+    print(summary.format())
+    for result in sorted(summary.failed):
+        print(f"  failed: {result.host}: {result.error}")
+    return summary
+
+def run_sweep(args):
+    hosts = load_hosts(args.hosts)
+    if args.operation == 'users' and args.plan:
+        try:
+            spec = user_plan.load_plan(args.plan)
+        except (OSError, ValueError, ImportError) as e:
+            print(e)
+            exit(1)
+
+        def task(transport):
+            return plan_host(transport, spec, args.dry_run)
+    elif args.operation == 'users':
+        task = audit_host_users
+    elif args.operation == 'update':
+        task = update_host
+    else:
+        task = enumerate_host
+    changes = args.operation == 'update' or args.operation == 'users' and args.plan and not args.dry_run
+    if changes and args.transport != 'fake':
+        confirm_step(f"Run {args.operation} on {len(hosts)} hosts?")
+    summary = sweep_hosts(hosts, task, args.transport, args.workers, args.host_timeout, args.retries,
+                          args.ssh_user, args.ssh_port, changes)
+    exit(1 if summary.failed else 0)
+
+# Plan applied by self_check(): a group membership, a password and a lock on every fake host
+SELF_CHECK_PLAN = {'rules': [
+    {'users': ['user1'], 'actions': ['add_admin', {'password': {'value': 'self-check'}}]},
+    {'users': ['user2'], 'actions': ['lock']},
+]}
+
+def fake_fleet(hosts, changes):
+    """
+    Builds fake hosts, some flaky, unreachable, hanging or dropping the connection
+    partway through. Returns the transports by host and the (ok, attempts) expected
+    of each host for a task that does or does not change it.
+    """
+    transports, expected = {}, {}
+    for i in range(hosts):
+        host = f"fake-{i:04d}"
+        if i % 10 == 3:
+            transports[host] = executor.FakeTransport(host, connect_failures=2)  # Recovers on the third attempt
+            expected[host] = (True, 3)
+        elif i % 25 == 7:
+            transports[host] = executor.FakeTransport(host, connect_failures=99)  # Never reachable
+            expected[host] = (False, 3)
+        elif i % 50 == 11:
+            transports[host] = executor.FakeTransport(host, hang=True)  # Runs out of time
+            expected[host] = (False, 1)
+        elif i % 20 == 9:
+            transports[host] = executor.FakeTransport(host, drop_after=2)  # Retried only if nothing changed
+            expected[host] = (False, 1) if changes else (True, 2)
+        else:
+            transports[host] = executor.FakeTransport(host)
+            expected[host] = (True, 1)
+    return transports, expected
+
+def self_check(hosts=300, workers=64):
+    """
+    Sweeps a fleet of fake hosts through every host task, and checks that every
+    host is reported once with the expected outcome and value, and that no command
+    that changes a host runs on it twice.
+    """
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        operations = [
+            ('enumerate', functools.partial(enumerate_host, snapshot_dir=snapshot_dir), False, "kernel 6.1.0, "),
+            ('users', audit_host_users, False, "5 users, uid 0: root, sudo: user0"),
+            ('users --plan', functools.partial(plan_host, spec=SELF_CHECK_PLAN), True,
+             "2 group memberships, 1 passwords, 1 locked"),
+            ('update', update_host, True, "apt update && apt upgrade -y"),
+        ]
+        for name, task, changes, value in operations:
+            transports, expected = fake_fleet(hosts, changes)
+            summary = executor.SweepSummary()
+            for result in executor.fan_out(transports.values(), task, workers, host_timeout=1.0, retries=2,
+                                           backoff=0.01, idempotent=not changes):
+                summary.add(result)
+                assert expected.pop(result.host, None) == (result.ok, result.attempts), f"{name}: {result}"
+                assert not result.ok or result.value.startswith(value), f"{name}: {result}"
+                assert result.duration < 1.5, f"{name}: {result}"
+                if changes:
+                    commands = [command for command, _ in transports[result.host].commands
+                                if command[0] not in ('getent', 'test')]
+                    assert len(commands) == len(set(commands)), f"{name}: {result.host} repeated a change"
+            assert not expected, f"{name}: {len(expected)} hosts were never reported"
+            print(f"{name:<14}{summary.format()}")
+
 def main():
-    enumerate_system()
-    change_passwords()
-    manage_users()
-    update_system()
+    parser = argparse.ArgumentParser(description="Interactive system remediation.")
+    parser.add_argument('--plan', help="apply a JSON/YAML user remediation plan instead of the interactive steps")
+    parser.add_argument('--dry-run', action='store_true', help="validate and show the plan without applying it")
+    parser.add_argument('--hosts', help="sweep these hosts (a file with one per line, or a comma-separated list)")
+    parser.add_argument('--operation', choices=['enumerate', 'users', 'update'], default='enumerate',
+                        help="what to run on each host; users audits accounts, or applies --plan")
+    parser.add_argument('--transport', choices=['ssh', 'local', 'fake'], default='ssh',
+                        help="how to reach the hosts; fake simulates them without a network")
+    parser.add_argument('--workers', type=int, default=HOST_WORKERS, help="hosts worked on at once")
+    parser.add_argument('--host-timeout', type=float, default=HOST_TIMEOUT, help="seconds allowed per host")
+    parser.add_argument('--retries', type=int, default=HOST_RETRIES, help="retries when a host is unreachable")
+    parser.add_argument('--ssh-user', help="user to log in as over SSH")
+    parser.add_argument('--ssh-port', type=int, help="SSH port")
+    parser.add_argument('--self-check', action='store_true',
+                        help="sweep simulated hosts through every host task end to end and check the results")
+    if metrics is not None:
+        metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    session = metrics.session(args.metrics, args.profile) if metrics is not None else contextlib.nullcontext()
+    with session:
+        if args.self_check:
+            self_check()
+            print("Self-check passed.")
+            return
+        if args.hosts:
+            run_sweep(args)
+            return
+        if args.plan:
+            apply_user_plan(args.plan, args.dry_run)
+            return
+        enumerate_system()
+        change_passwords()
+        manage_users()
+        update_system()
 
 if __name__ == "__main__":
     main()
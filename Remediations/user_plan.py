@@ -0,0 +1,351 @@
+"""
+Batch user remediation for remediate-py-py.py, declared as a plan and applied in bulk.
+
+A plan is a JSON (or, with PyYAML installed, YAML) file with a list of rules. Each
+rule selects users by glob patterns and uid range and lists the actions to take:
+
+    {
+      "admin_group": "sudo",
+      "rules": [
+        {"users": ["*"], "exclude": ["root"], "min_uid": 1000, "actions": ["lock"]},
+        {"users": ["svc-*"], "actions": [{"password": {"generate": 24, "output": "/root/svc-passwords.txt"}}]},
+        {"users": ["alice", "bob"], "actions": ["unlock", "add_admin", {"add_groups": ["docker"]}]},
+        {"users": ["olduser"], "actions": ["delete"]}
+      ]
+    }
+
+Actions: lock, unlock, delete, add_admin, remove_admin, add_groups, remove_groups,
+set_groups and password. A password comes from {"generate": length, "output": file},
+{"file": file of user:password lines}, {"env": variable} or {"value": text}. Later
+rules override earlier ones for the same user, except that deleting an account
+drops every other action on it.
+
+The plan is validated against the account index as a whole before anything runs,
+then applied with one command per step instead of one per user and action:
+gpasswd -M once per changed group, a single chpasswd for all passwords, a single
+chpasswd -e that adds or strips the '!' lock prefix of the current hashes, and
+userdel (which has no batch form) per deleted account. Commands go through the
+local subprocess runner by default, or through an executor transport's run to
+apply the plan on another host.
+"""
+
+import fnmatch
+import json
+import os
+import secrets
+import string
+import time
+from collections import namedtuple
+
+import executor
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+ACTIONS = {'lock', 'unlock', 'delete', 'add_admin', 'remove_admin', 'add_groups', 'remove_groups', 'set_groups',
+           'password'}
+PASSWORD_ALPHABET = string.ascii_letters + string.digits + '-_.,;!@#%^&*+='
+COMMAND_TIMEOUT = 300
+
+# One applied (or, in a dry run, planned) step of the timing report
+StepReport = namedtuple('StepReport', 'step users commands seconds errors')
+
+def load_plan(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError("PyYAML is required for YAML plans")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def select_users(rule, accounts):
+    patterns = rule.get('users', [])
+    exclude = rule.get('exclude', [])
+    min_uid = rule.get('min_uid', 0)
+    max_uid = rule.get('max_uid', float('inf'))
+    return [user.name for user in accounts.users.values()
+            if min_uid <= user.uid <= max_uid
+            and any(fnmatch.fnmatchcase(user.name, pattern) for pattern in patterns)
+            and not any(fnmatch.fnmatchcase(user.name, pattern) for pattern in exclude)]
+
+def read_password_file(path):
+    passwords = {}
+    with open(path) as f:
+        for line in f:
+            user, sep, password = line.rstrip('\n').partition(':')
+            if sep:
+                passwords[user] = password
+    return passwords
+
+def password_source(spec, rule_number):
+    """Returns a function giving the new password of a user, and the generated-passwords file if any."""
+    if not isinstance(spec, dict) or len(spec.keys() - {'output'}) != 1:
+        raise ValueError(f"rule {rule_number}: a password needs exactly one of generate, file, env or value")
+    if 'generate' in spec:
+        if 'output' not in spec:
+            raise ValueError(f"rule {rule_number}: generated passwords need an output file")
+        length = int(spec['generate'])
+        return lambda user: ''.join(secrets.choice(PASSWORD_ALPHABET) for _ in range(length)), spec['output']
+    if 'file' in spec:
+        passwords = read_password_file(spec['file'])
+        return passwords.get, None
+    if 'env' in spec:
+        if spec['env'] not in os.environ:
+            raise ValueError(f"rule {rule_number}: environment variable {spec['env']} is not set")
+        value = os.environ[spec['env']]
+        return lambda user: value, None
+    if 'value' in spec:
+        return lambda user: spec['value'], None
+    raise ValueError(f"rule {rule_number}: unknown password source {sorted(spec)}")
+
+def rule_shape_errors(rule, rule_number):
+    """Checks the types of a rule's fields. Returns a list of error messages."""
+    if not isinstance(rule, dict):
+        return [f"rule {rule_number}: a rule is a mapping, not {rule!r}"]
+    errors = []
+    for field in ('users', 'exclude'):
+        patterns = rule.get(field, [])
+        if not isinstance(patterns, list) or not all(isinstance(pattern, str) for pattern in patterns):
+            errors.append(f"rule {rule_number}: {field} must be a list of names or patterns, not {patterns!r}")
+    for field in ('min_uid', 'max_uid'):
+        if field in rule and (not isinstance(rule[field], (int, float)) or isinstance(rule[field], bool)):
+            errors.append(f"rule {rule_number}: {field} must be a number, not {rule[field]!r}")
+    if not isinstance(rule.get('actions', []), list):
+        errors.append(f"rule {rule_number}: actions must be a list, not {rule['actions']!r}")
+    return errors
+
+def build_plan(spec, accounts):
+    """
+    Resolves a plan against the account index (see native_backend.AccountIndex).
+
+    Returns:
+    dict: 'groups' (new member lists of the groups that change), 'passwords'
+    ({user: password}), 'generated' ({output file: {user: password}}), 'lock',
+    'unlock' and 'delete' (sorted user lists), 'users' (every user the plan
+    changes, sorted) and 'warnings' (rules that match no user on this host).
+    Raises ValueError listing every problem found.
+    """
+    if not isinstance(spec, dict) or not isinstance(spec.get('rules', []), list):
+        raise ValueError(f"Invalid plan: expected a mapping with a list of rules, not {spec!r}")
+    admin_group = spec.get('admin_group', 'sudo')
+    if not isinstance(admin_group, str):
+        raise ValueError(f"Invalid plan: admin_group must be a group name, not {admin_group!r}")
+    errors, warnings = [], []
+    members = {name: set(filter(None, group.members.split(','))) for name, group in accounts.groups.items()}
+    new_members = {name: set(users) for name, users in members.items()}
+    passwords, generated, state, deleted = {}, {}, {}, set()
+
+    for rule_number, rule in enumerate(spec.get('rules', []), 1):
+        shape_errors = rule_shape_errors(rule, rule_number)
+        if shape_errors:
+            errors += shape_errors
+            continue
+        users = select_users(rule, accounts)
+        if not users:
+            warnings.append(f"rule {rule_number}: {rule.get('users')} matches no user")
+            continue
+        for action in rule.get('actions', []):
+            if isinstance(action, str):
+                name, argument = action, None
+            elif isinstance(action, dict) and len(action) == 1:
+                name, argument = next(iter(action.items()))
+            else:
+                errors.append(f"rule {rule_number}: an action is a name or a mapping of one name to its argument,"
+                              f" not {action!r}")
+                continue
+            if name not in ACTIONS:
+                errors.append(f"rule {rule_number}: unknown action {name!r}")
+                continue
+            if name in ('add_admin', 'remove_admin'):
+                name, argument = name.replace('admin', 'groups'), [admin_group]
+            if name in ('add_groups', 'remove_groups', 'set_groups'):
+                if argument is not None and not isinstance(argument, list):
+                    errors.append(f"rule {rule_number}: {name} takes a list of groups, not {argument!r}")
+                    continue
+                missing = [group for group in argument or [] if group not in new_members]
+                if missing or not argument and name != 'set_groups':
+                    errors.append(f"rule {rule_number}: unknown groups {missing or argument} for {name}")
+                    continue
+                for user in users:
+                    if name == 'set_groups':
+                        for group, group_members in new_members.items():
+                            (group_members.add if group in argument else group_members.discard)(user)
+                    else:
+                        for group in argument:
+                            (new_members[group].add if name == 'add_groups' else new_members[group].discard)(user)
+            elif name == 'password':
+                try:
+                    source, output = password_source(argument, rule_number)
+                except (OSError, ValueError) as e:
+                    errors.append(str(e))
+                    continue
+                for user in users:
+                    password = source(user)
+                    if password is None:
+                        errors.append(f"rule {rule_number}: no password for {user}")
+                    elif ':' in password or '\n' in password:
+                        errors.append(f"rule {rule_number}: the password for {user} contains ':' or a newline")
+                    else:
+                        passwords[user] = password
+                        for users_by_file in generated.values():
+                            users_by_file.pop(user, None)
+                        if output:
+                            generated.setdefault(output, {})[user] = password
+            elif name == 'delete':
+                deleted.update(users)
+            else:
+                state.update((user, name) for user in users)
+
+    # Deleted accounts need no other changes
+    for user in deleted:
+        passwords.pop(user, None)
+        state.pop(user, None)
+        for users_by_file in generated.values():
+            users_by_file.pop(user, None)
+        for group, group_members in new_members.items():
+            (group_members.add if user in members[group] else group_members.discard)(user)
+    if errors:
+        raise ValueError("Invalid plan:\n  " + "\n  ".join(errors))
+
+    changed = set(passwords) | set(state) | deleted
+    for group, group_members in new_members.items():
+        changed |= group_members ^ members[group]
+    return {
+        'groups': {group: sorted(users) for group, users in new_members.items() if users != members[group]},
+        'passwords': passwords,
+        'generated': generated,
+        'lock': sorted(user for user, action in state.items() if action == 'lock'),
+        'unlock': sorted(user for user, action in state.items() if action == 'unlock'),
+        'delete': sorted(deleted),
+        'users': sorted(changed),
+        'warnings': warnings,
+    }
+
+def run_local(command, input_text=None):
+    return executor.run_command(command, COMMAND_TIMEOUT, input_text)
+
+def execute(command, input_text=None, dry_run=False, run=run_local):
+    """Runs a command. Returns an error message, or None on success (or in a dry run)."""
+    if dry_run:
+        return None
+    result = run(command, input_text)
+    if result.returncode is None:
+        return f"{command[0]}: {result.error}"
+    if result.returncode != 0:
+        return f"{' '.join(command[:2])}: {result.stderr.strip() or f'exit code {result.returncode}'}"
+    return None
+
+def set_lock_state(users, lock, read_shadow, dry_run=False, run=run_local):
+    """
+    Locks or unlocks all users with one chpasswd -e, falling back to passwd -l/-u
+    for users without a shadow entry (or for everyone without the shadow file).
+
+    Unlocking strips exactly one '!', and like passwd -u refuses when that would
+    leave no usable hash (e.g. the '!!' of an account whose password was never set),
+    since chpasswd -e would then make the account passwordless.
+    """
+    try:
+        shadow = read_shadow()
+    except OSError:
+        shadow = None
+    if shadow is None:
+        shadow = {}
+
+    lines = []
+    fallback = []
+    errors = []
+    for user in users:
+        if user not in shadow:
+            # Accounts from LDAP or other NSS sources have no local shadow entry
+            fallback.append(user)
+            continue
+        password = shadow[user][1]
+        if lock and not password.startswith('!'):
+            lines.append(f"{user}:!{password}\n")
+        elif not lock and password.startswith('!'):
+            if password[1:] in ('', '!', '*'):
+                errors.append(f"unlock {user}: no password hash to restore, refusing to leave it passwordless")
+            else:
+                lines.append(f"{user}:{password[1:]}\n")
+
+    commands = 0
+    for user in fallback:
+        commands += 1
+        errors.append(execute(['passwd', '-l' if lock else '-u', user], dry_run=dry_run, run=run))
+    if lines:
+        commands += 1
+        errors.append(execute(['chpasswd', '-e'], ''.join(lines), dry_run, run))
+    return commands, [error for error in errors if error]
+
+def write_generated_passwords(generated, dry_run=False):
+    for path, passwords in generated.items():
+        if dry_run:
+            continue
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, 'w') as f:
+            f.writelines(f"{user}:{password}\n" for user, password in sorted(passwords.items()))
+
+def apply_plan(plan, read_shadow, dry_run=False, run=run_local):
+    """
+    Applies a plan from build_plan(): group memberships, then passwords, then
+    locks, then deletions, each as a batch.
+
+    Parameters:
+    read_shadow (callable): Returns {user: shadow fields} (see native_backend.read_shadow).
+    run (callable): Runs a command list with optional input text and returns an
+        executor.CommandResult, e.g. a transport's run for a remote host.
+
+    Returns:
+    list: A StepReport per step.
+    """
+    report = []
+
+    def step(name, users, apply):
+        start = time.monotonic()
+        commands, errors = apply()
+        report.append(StepReport(name, users, commands, time.monotonic() - start, errors))
+
+    def groups():
+        errors = [execute(['gpasswd', '-M', ','.join(members), group], dry_run=dry_run, run=run)
+                  for group, members in plan['groups'].items()]
+        return len(plan['groups']), [error for error in errors if error]
+
+    def passwords():
+        if not plan['passwords']:
+            return 0, []
+        # Generated passwords are saved before they are set, so none can be lost
+        write_generated_passwords(plan['generated'], dry_run)
+        lines = ''.join(f"{user}:{password}\n" for user, password in plan['passwords'].items())
+        error = execute(['chpasswd'], lines, dry_run, run)
+        return 1, [error] if error else []
+
+    def deletions():
+        errors = [execute(['userdel', user], dry_run=dry_run, run=run) for user in plan['delete']]
+        return len(plan['delete']), [error for error in errors if error]
+
+    step('groups', sum(len(members) for members in plan['groups'].values()), groups)
+    step('passwords', len(plan['passwords']), passwords)
+    step('lock', len(plan['lock']), lambda: set_lock_state(plan['lock'], True, read_shadow, dry_run, run))
+    step('unlock', len(plan['unlock']), lambda: set_lock_state(plan['unlock'], False, read_shadow, dry_run, run))
+    step('delete', len(plan['delete']), deletions)
+    return report
+
+def print_plan(plan):
+    for warning in plan['warnings']:
+        print(f"warning: {warning}")
+    for group, members in sorted(plan['groups'].items()):
+        print(f"group {group}: {len(members)} members")
+    print(f"passwords: {len(plan['passwords'])} users"
+          + ''.join(f", {len(users)} generated into {path}" for path, users in plan['generated'].items()))
+    for action in ('lock', 'unlock', 'delete'):
+        listed = ', '.join(plan[action][:10]) + (', ...' if len(plan[action]) > 10 else '')
+        print(f"{action}: {len(plan[action])} users" + (f" ({listed})" if plan[action] else ''))
+
+def print_report(report, dry_run=False):
+    print(f"\n{'Step':<10} {'Users':>7} {'Commands':>9} {'Seconds':>9}" + ("  (dry run)" if dry_run else ''))
+    for entry in report:
+        print(f"{entry.step:<10} {entry.users:>7} {entry.commands:>9} {entry.seconds:>9.3f}")
+        for error in entry.errors:
+            print(f"  error: {error}")
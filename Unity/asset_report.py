@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Asset Property Report Index
+
+Companion tool for the reports written by AssetPropertyReporter.cs and
+CustomAssetPropertyReporter.cs (AssetPropertyReport.json). Both write a single
+pretty-printed JsonUtility document:
+
+    {"Assets": [{"AssetType": "...", "Properties": [{"Name": "...", "Type": "...", ...}, ...]}, ...]}
+
+The custom report nests properties under Children, with dotted paths as names.
+
+The report is parsed incrementally, one asset at a time, so only the asset being
+read is ever held in memory. Its properties (flattened, with their depth) go into
+a compact SQLite index next to the report, with names and types interned once and
+indexed both ways:
+
+- asset type -> its properties;
+- property name -> the asset types that own it;
+- property type -> every property of that type.
+
+Each asset also keeps a digest of its property list, so two reports are compared
+by digest and only the assets that changed are read back property by property.
+An index is reused until its report's size or modification time change.
+
+Usage:
+    python asset_report.py stats AssetPropertyReport.json
+    python asset_report.py type AssetPropertyReport.json Camera
+    python asset_report.py owners AssetPropertyReport.json 'shared*'
+    python asset_report.py usages AssetPropertyReport.json Material
+    python asset_report.py diff Report-2022.json Report-2023.json
+    python asset_report.py sample Synthetic.json --assets 20000 --seed 1
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import time
+from collections import namedtuple
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.index'
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+# Characters read from the report at a time
+CHUNK_SIZE = 1 << 16
+
+# Assets inserted per transaction batch while indexing
+BATCH_SIZE = 1000
+
+Asset = namedtuple('Asset', 'type properties')
+Property = namedtuple('Property', 'name type depth')
+
+# One difference between two reports. kind is 'added' or 'removed' (asset is the
+# asset type, property None), or 'property added', 'property removed' or 'type
+# changed' (old_type and new_type are the property types, None when missing)
+Change = namedtuple('Change', 'kind asset property old_type new_type')
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE strings (id INTEGER PRIMARY KEY, text TEXT NOT NULL UNIQUE);
+CREATE TABLE assets (id INTEGER PRIMARY KEY, type INTEGER NOT NULL, occurrence INTEGER NOT NULL,
+                     digest BLOB NOT NULL, property_count INTEGER NOT NULL);
+CREATE TABLE properties (asset INTEGER NOT NULL, position INTEGER NOT NULL, name INTEGER NOT NULL,
+                         type INTEGER NOT NULL, depth INTEGER NOT NULL,
+                         PRIMARY KEY (asset, position)) WITHOUT ROWID;
+"""
+
+# Created after the bulk insert, which is faster than maintaining them row by row
+INDEXES = """
+CREATE UNIQUE INDEX assets_by_type ON assets (type, occurrence);
+CREATE INDEX properties_by_name ON properties (name);
+CREATE INDEX properties_by_type ON properties (type);
+"""
+
+def flatten_properties(properties, depth=0):
+    """Yields the properties of an asset, with the Children of custom reports after their parent."""
+    for entry in properties or []:
+        yield Property(entry.get('Name', ''), entry.get('Type', ''), depth)
+        if entry.get('Children'):
+            yield from flatten_properties(entry['Children'], depth + 1)
+
+def iter_assets(path, chunk_size=CHUNK_SIZE):
+    """
+    Parses a report incrementally.
+
+    Yields:
+    Asset: Each entry of the Assets array, in report order.
+    Raises ValueError if the report is malformed or truncated.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8-sig') as f:
+        buffer = ''
+        position = 0
+
+        def read_more():
+            # Reads at least as much as is buffered, so an asset larger than a chunk is retried a logarithmic number of times
+            nonlocal buffer, position
+            data = f.read(max(chunk_size, len(buffer) - position))
+            buffer = buffer[position:] + data
+            position = 0
+            return bool(data)
+
+        def next_char():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer):
+                    return buffer[position]
+                if not read_more():
+                    raise ValueError(f"{path}: unexpected end of report")
+
+        while (start := buffer.find('"Assets"', position)) < 0:
+            position = max(0, len(buffer) - len('"Assets"'))
+            if not read_more():
+                raise ValueError(f"{path}: no Assets array")
+        position = start + len('"Assets"')
+        for expected in ':[':
+            if next_char() != expected:
+                raise ValueError(f"{path}: expected {expected!r} after \"Assets\"")
+            position += 1
+
+        while True:
+            char = next_char()
+            if char == ']':
+                return
+            if char == ',':
+                position += 1
+                continue
+            try:
+                entry, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise ValueError(f"{path}: truncated asset entry") from None
+                continue
+            position = end
+            yield Asset(entry.get('AssetType', ''), list(flatten_properties(entry.get('Properties'))))
+
+def properties_digest(properties):
+    digest = hashlib.blake2b(digest_size=8)
+    for prop in properties:
+        digest.update(f"{prop.name}\t{prop.type}\t{prop.depth}\n".encode())
+    return digest.digest()
+
+def report_fingerprint(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def build_index(report_path, index_path=None):
+    """
+    Indexes a report into a SQLite file (by default the report path plus .index).
+    The index is written to a temporary file and moved into place when complete.
+
+    Returns:
+    str: The index path.
+    """
+    index_path = index_path or report_path + INDEX_SUFFIX
+    temporary = f"{index_path}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    fingerprint = report_fingerprint(report_path)
+    connection = sqlite3.connect(temporary)
+    try:
+        connection.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+        strings = {}
+        occurrences = {}
+
+        def intern(text):
+            string_id = strings.get(text)
+            if string_id is None:
+                string_id = strings[text] = len(strings) + 1
+                connection.execute("INSERT INTO strings VALUES (?, ?)", (string_id, text))
+            return string_id
+
+        asset_rows, property_rows = [], []
+        for asset_id, asset in enumerate(iter_assets(report_path), 1):
+            type_id = intern(asset.type)
+            occurrence = occurrences[type_id] = occurrences.get(type_id, -1) + 1
+            asset_rows.append((asset_id, type_id, occurrence, properties_digest(asset.properties),
+                               len(asset.properties)))
+            property_rows.extend((asset_id, position, intern(prop.name), intern(prop.type), prop.depth)
+                                 for position, prop in enumerate(asset.properties))
+            if len(asset_rows) >= BATCH_SIZE:
+                connection.executemany("INSERT INTO assets VALUES (?, ?, ?, ?, ?)", asset_rows)
+                connection.executemany("INSERT INTO properties VALUES (?, ?, ?, ?, ?)", property_rows)
+                asset_rows, property_rows = [], []
+        connection.executemany("INSERT INTO assets VALUES (?, ?, ?, ?, ?)", asset_rows)
+        connection.executemany("INSERT INTO properties VALUES (?, ?, ?, ?, ?)", property_rows)
+        connection.executescript(INDEXES)
+        connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('version', INDEX_VERSION),
+            ('report', os.path.abspath(report_path)),
+            ('fingerprint', fingerprint),
+        ])
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(temporary, index_path)
+    return index_path
+
+def is_index(path):
+    with open(path, 'rb') as f:
+        return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+class ReportIndex:
+    """
+    Queries over an indexed report.
+
+    Parameters:
+    path (str): A report, indexed (or re-indexed, if it changed) on first use, or an index file.
+    """
+
+    def __init__(self, path):
+        if not is_index(path):
+            index_path = path + INDEX_SUFFIX
+            if not os.path.exists(index_path) or self.read_meta(index_path) != (INDEX_VERSION, report_fingerprint(path)):
+                build_index(path, index_path)
+            path = index_path
+        self.path = path
+        self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    @staticmethod
+    def read_meta(index_path):
+        try:
+            connection = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+            try:
+                meta = dict(connection.execute("SELECT key, value FROM meta"))
+            finally:
+                connection.close()
+        except sqlite3.DatabaseError:
+            return None
+        return meta.get('version'), meta.get('fingerprint')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self):
+        """Returns the number of assets, properties, distinct property names and distinct property types."""
+        query = self.connection.execute
+        return {
+            'assets': query("SELECT count(*) FROM assets").fetchone()[0],
+            'properties': query("SELECT count(*) FROM properties").fetchone()[0],
+            'property names': query("SELECT count(DISTINCT name) FROM properties").fetchone()[0],
+            'property types': query("SELECT count(DISTINCT type) FROM properties").fetchone()[0],
+        }
+
+    def string_ids(self, pattern):
+        """Returns the ids of the strings matching a glob pattern (or equal to it, without wildcards)."""
+        operator = 'GLOB' if any(char in pattern for char in '*?[') else '='
+        return [row[0] for row in self.connection.execute(f"SELECT id FROM strings WHERE text {operator} ?", (pattern,))]
+
+    def asset_properties(self, asset_id):
+        return [Property(*row) for row in self.connection.execute(
+            "SELECT n.text, t.text, p.depth FROM properties p JOIN strings n ON n.id = p.name "
+            "JOIN strings t ON t.id = p.type WHERE p.asset = ? ORDER BY p.position", (asset_id,))]
+
+    def properties(self, asset_type):
+        """Returns {asset type: properties} for the asset types matching a pattern."""
+        result = {}
+        for type_id in self.string_ids(asset_type):
+            for asset_id, occurrence, name in self.connection.execute(
+                    "SELECT a.id, a.occurrence, s.text FROM assets a JOIN strings s ON s.id = a.type "
+                    "WHERE a.type = ? ORDER BY a.occurrence", (type_id,)):
+                result[name if occurrence == 0 else f"{name}#{occurrence}"] = self.asset_properties(asset_id)
+        return result
+
+    def owners(self, property_name):
+        """Returns sorted (asset type, property name, property type) of the properties matching a pattern."""
+        return self.property_rows('p.name', property_name)
+
+    def usages(self, property_type):
+        """Returns sorted (asset type, property name, property type) of the properties of a type matching a pattern."""
+        return self.property_rows('p.type', property_type)
+
+    def property_rows(self, column, pattern):
+        rows = []
+        for string_id in self.string_ids(pattern):
+            rows.extend(self.connection.execute(
+                "SELECT s.text, n.text, t.text FROM properties p JOIN assets a ON a.id = p.asset "
+                "JOIN strings s ON s.id = a.type JOIN strings n ON n.id = p.name JOIN strings t ON t.id = p.type "
+                f"WHERE {column} = ?", (string_id,)))
+        return sorted(set(rows))
+
+    def diff(self, old):
+        """
+        Compares this (newer) report with an older ReportIndex. Assets are matched
+        by type name and occurrence, so same-named types are paired in report order.
+
+        Yields:
+        Change: Removed and added assets, then the property changes of the assets
+        whose digests differ, each group sorted by asset type.
+        """
+        self.connection.execute("ATTACH DATABASE ? AS old", (f"file:{old.path}?mode=ro",))
+        try:
+            keyed = ("SELECT s.text AS name, a.occurrence, a.digest, a.id FROM {0}.assets a "
+                     "JOIN {0}.strings s ON s.id = a.type")
+            query = (f"WITH new AS ({keyed.format('main')}), old AS ({keyed.format('old')}) "
+                     "SELECT {columns} FROM {left} LEFT JOIN {right} "
+                     "ON {right}.name = {left}.name AND {right}.occurrence = {left}.occurrence "
+                     "WHERE {condition} ORDER BY {left}.name, {left}.occurrence")
+            for kind, left, right in (('removed', 'old', 'new'), ('added', 'new', 'old')):
+                for name, occurrence in self.connection.execute(query.format(
+                        columns=f"{left}.name, {left}.occurrence", left=left, right=right,
+                        condition=f"{right}.id IS NULL")):
+                    yield Change(kind, name if occurrence == 0 else f"{name}#{occurrence}", None, None, None)
+            changed = list(self.connection.execute(query.format(
+                columns="new.name, new.occurrence, old.id, new.id", left='new', right='old',
+                condition="old.id IS NOT NULL AND old.digest != new.digest")))
+        finally:
+            self.connection.execute("DETACH DATABASE old")
+        for name, occurrence, old_id, new_id in changed:
+            yield from diff_properties(name if occurrence == 0 else f"{name}#{occurrence}",
+                                       old.asset_properties(old_id), self.asset_properties(new_id))
+
+def diff_properties(asset, old_properties, new_properties):
+    old_types = {prop.name: prop.type for prop in old_properties}
+    new_types = {prop.name: prop.type for prop in new_properties}
+    for name in sorted(old_types.keys() | new_types.keys()):
+        old_type, new_type = old_types.get(name), new_types.get(name)
+        if old_type is None:
+            yield Change('property added', asset, name, None, new_type)
+        elif new_type is None:
+            yield Change('property removed', asset, name, old_type, None)
+        elif old_type != new_type:
+            yield Change('type changed', asset, name, old_type, new_type)
+
+def format_change(change):
+    if change.property is None:
+        return f"{'+' if change.kind == 'added' else '-'} {change.asset}"
+    if change.kind == 'property added':
+        return f"  + {change.asset}.{change.property}: {change.new_type}"
+    if change.kind == 'property removed':
+        return f"  - {change.asset}.{change.property}: {change.old_type}"
+    return f"  ~ {change.asset}.{change.property}: {change.old_type} -> {change.new_type}"
+
+PROPERTY_TYPES = ['Boolean', 'Int32', 'Single', 'String', 'Vector2', 'Vector3', 'Vector4', 'Quaternion', 'Color',
+                  'Matrix4x4', 'Bounds', 'Rect', 'Material', 'Mesh', 'Texture', 'Transform', 'GameObject', 'HideFlags']
+
+def write_sample_report(path, num_assets, seed=None, nested=False):
+    """Writes a synthetic report in JsonUtility's pretty-printed layout, streaming one asset at a time."""
+    rng = random.Random(seed)
+    names = [f"property{i}" for i in range(2000)]
+
+    def make_properties(prefix, depth):
+        properties = []
+        for name in rng.sample(names, rng.randint(5, 60) if depth == 0 else rng.randint(0, 4)):
+            full_name = f"{prefix}.{name}" if prefix else name
+            entry = {'Name': full_name, 'Type': rng.choice(PROPERTY_TYPES)}
+            if nested:
+                entry.update(Description='', Group='',
+                             Children=make_properties(full_name, depth + 1) if depth < 2 and rng.random() < 0.1 else [])
+            properties.append(entry)
+        return properties
+
+    with open(path, 'w') as f:
+        f.write('{\n    "Assets": [')
+        for i in range(num_assets):
+            entry = {'AssetType': f"Asset{i}", 'Properties': make_properties('', 0)}
+            text = json.dumps(entry, indent=4).replace('\n', '\n        ')
+            f.write(('\n        ' if i == 0 else ',\n        ') + text)
+        f.write('\n    ]\n}')
+
+def main():
+    parser = argparse.ArgumentParser(description="Index, query and compare Unity asset property reports.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    parser_index = subparsers.add_parser('index', help="(re)build the index of a report")
+    parser_index.add_argument('report')
+    parser_index.add_argument('--output', help="index path (default: the report path plus .index)")
+    parser_stats = subparsers.add_parser('stats', help="count assets, properties, names and types")
+    parser_stats.add_argument('report', help="a report or an index")
+    for name, argument, text in (('type', 'asset_type', "list the properties of asset types"),
+                                 ('owners', 'property_name', "list the asset types owning a property"),
+                                 ('usages', 'property_type', "list the properties of a type")):
+        subparser = subparsers.add_parser(name, help=f"{text} (glob patterns allowed)")
+        subparser.add_argument('report', help="a report or an index")
+        subparser.add_argument(argument)
+    parser_diff = subparsers.add_parser('diff', help="compare two reports (or indexes)")
+    parser_diff.add_argument('old')
+    parser_diff.add_argument('new')
+    parser_sample = subparsers.add_parser('sample', help="write a synthetic report for testing")
+    parser_sample.add_argument('output')
+    parser_sample.add_argument('--assets', type=int, default=1000)
+    parser_sample.add_argument('--seed', type=int)
+    parser_sample.add_argument('--nested', action='store_true', help="nest Children like the custom report")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'sample':
+        write_sample_report(args.output, args.assets, args.seed, args.nested)
+        print(f"Wrote {args.assets} assets to {args.output}")
+    elif args.command == 'index':
+        print(f"Indexed into {build_index(args.report, args.output)}")
+    elif args.command == 'diff':
+        with ReportIndex(args.old) as old, ReportIndex(args.new) as new:
+            counts = {}
+            for change in new.diff(old):
+                counts[change.kind] = counts.get(change.kind, 0) + 1
+                print(format_change(change))
+        print(', '.join(f"{count} {kind}" for kind, count in counts.items()) or "No differences")
+    else:
+        with ReportIndex(args.report) as index:
+            if args.command == 'stats':
+                for name, value in index.stats().items():
+                    print(f"{name}: {value}")
+            elif args.command == 'type':
+                for asset, properties in index.properties(args.asset_type).items():
+                    print(asset)
+                    for prop in properties:
+                        print(f"  {'  ' * prop.depth}{prop.name}: {prop.type}")
+            else:
+                rows = index.owners(args.property_name) if args.command == 'owners' else index.usages(args.property_type)
+                for asset, name, prop_type in rows:
+                    print(f"{asset}.{name}: {prop_type}")
+                print(f"{len(rows)} properties")
+    print(f"({time.perf_counter() - start:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Cross-script benchmark suite with regression tracking.
+
+Times the hot paths of the scripts in this repository:
+- bitslots: parsing draws into registers, the jackpot and double slit checks,
+  and rendering the pyramid display to a null sink (repeated and fresh draws);
+- pyramid: build_pyramid at several widths;
+- register_layout: classifying 32-, 128- and 256-bit draws;
+- network-sim: display_ip_info to a null sink and the subnet mask generators;
+- Remediations/remediate-py-py.py: enumerate_system with every command stubbed
+  by canned output, on a first run and on a repeat run with a snapshot.
+
+Each benchmark is calibrated to run for at least --min-time per sample and
+sampled --repeats times; results are per operation. Every run is appended to a
+JSON history file. When a baseline exists, each benchmark is compared with it
+and reported as regressed (or improved) when its median changed by more than
+--threshold percent and a one-sided Mann-Whitney U test on the samples gives
+p < --alpha, so a noisy sample alone does not fail the run. The exit code is 1
+when any benchmark regressed.
+
+Usage:
+    python bench_suite.py --save-baseline
+    python bench_suite.py --threshold 5 --alpha 0.01
+    python bench_suite.py --filter 'bitslots.*' --repeats 9
+    python bench_suite.py --list
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import functools
+import gc
+import importlib.util
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+import bitslots
+import pyramid
+from register_layout import RegisterLayout
+from network_sim_bench import load_network_sim, make_inputs
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HISTORY = 'bench_history.json'
+DEFAULT_BASELINE = 'bench_baseline.json'
+
+# Draws, addresses or calls per benchmark operation batch
+BATCH = 10000
+
+# Largest number of rank splits the Mann-Whitney test enumerates exactly (9 vs 9 samples is 48620)
+EXACT_SPLITS = 100000
+
+# setup() prepares the inputs and returns (run, operations): run() is timed and
+# performs that many operations. A setup that leaves files behind is a context
+# manager yielding (run, operations) instead, and cleans up when the timing is done
+Benchmark = namedtuple('Benchmark', 'name setup')
+
+# median and spread (median absolute deviation) are in seconds per operation
+Result = namedtuple('Result', 'name samples median spread operations')
+
+class NullSink:
+    """A text stream that discards everything written to it."""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+def load_script(path, name):
+    """Imports a script whose file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def random_words(count, seed=0):
+    rng = random.Random(seed)
+    return [rng.getrandbits(32) for _ in range(count)]
+
+def setup_parse_registers():
+    words = random_words(BATCH)
+    parse = bitslots.parse_registers_from_32bit
+    return lambda: [parse(word) for word in words], len(words)
+
+def setup_check(check):
+    draws = [bitslots.parse_registers_from_32bit(word) for word in random_words(BATCH)]
+    return lambda: [check(registers, bonus) for registers, bonus in draws], len(draws)
+
+def setup_classify_layout(spec):
+    layout = RegisterLayout.from_spec(spec)
+    rng = random.Random(0)
+    words = [rng.getrandbits(layout.word_bits) for _ in range(BATCH)]
+    classify = layout.classify
+    return lambda: [classify(word) for word in words], len(words)
+
+def setup_display_pyramid(distinct):
+    # More distinct draws than the pyramid cache holds measure rendering; a few repeated ones measure cache hits
+    draws = [bitslots.parse_registers_from_32bit(word) for word in random_words(distinct)]
+    batch = 1000
+    position = 0
+    sink = NullSink()
+
+    def run():
+        nonlocal position
+        with contextlib.redirect_stdout(sink):
+            for i in range(position, position + batch):
+                registers, bonus = draws[i % distinct]
+                bitslots.display_pyramid(registers, bonus)
+        position = (position + batch) % distinct
+    return run, batch
+
+def setup_build_pyramid(width, max_rows=128):
+    rng = random.Random(0)
+    row = [rng.getrandbits(1) for _ in range(width)]
+    return lambda: pyramid.build_pyramid(row, min(width, max_rows)), 1
+
+def setup_display_ip_info():
+    network_sim = load_network_sim()
+    inputs = make_inputs(network_sim, 2000, 0)
+    sink = NullSink()
+
+    def run():
+        with contextlib.redirect_stdout(sink):
+            for ip, subnet_mask, turn in inputs:
+                network_sim.display_ip_info(ip, subnet_mask, turn)
+    return run, len(inputs)
+
+def setup_mask_generators():
+    network_sim = load_network_sim()
+    random.seed(0)
+    ips = [network_sim.generate_random_private_ip() if i % 5 == 0 else network_sim.generate_random_ip()
+           for i in range(BATCH)]
+
+    def run():
+        for ip in ips:
+            network_sim.generate_private_subnet_mask(ip)
+            network_sim.generate_random_subnet_mask()
+    return run, len(ips)
+
+@contextlib.contextmanager
+def setup_enumerate_system(repeat_run):
+    remediations = os.path.join(ROOT, 'Remediations')
+    if remediations not in sys.path:
+        sys.path.insert(0, remediations)
+    remediate = load_script(os.path.join('Remediations', 'remediate-py-py.py'), 'remediate')
+    executor = remediate.executor
+
+    def run_command(command, timeout=None):
+        returncode, stdout, stderr = executor.fake_responder('bench', command, None)
+        return executor.CommandResult(command, stdout, stderr, returncode, 0.0, None)
+
+    # Commands answer from canned output and nothing is confirmed; native collectors still read /proc
+    remediate.run_command = run_command
+    remediate.confirm_step = lambda message: None
+    sink = NullSink()
+    with tempfile.TemporaryDirectory(prefix='bench-') as directory:
+        snapshot_path = os.path.join(directory, 'inventory.json.gz')
+
+        def run():
+            if not repeat_run and os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            with contextlib.redirect_stdout(sink):
+                remediate.enumerate_system(snapshot_path=snapshot_path)
+        if repeat_run:
+            run()
+        yield run, 1
+
+BENCHMARKS = [
+    Benchmark('bitslots.parse_registers_from_32bit', setup_parse_registers),
+    Benchmark('bitslots.check_jackpot', functools.partial(setup_check, bitslots.check_jackpot)),
+    Benchmark('bitslots.check_double_slit_experiment',
+              functools.partial(setup_check, bitslots.check_double_slit_experiment)),
+    Benchmark('register_layout.classify.32', functools.partial(setup_classify_layout, '4x7+4')),
+    Benchmark('register_layout.classify.128', functools.partial(setup_classify_layout, '8x15+8')),
+    Benchmark('register_layout.classify.256', functools.partial(setup_classify_layout, '16x15+16')),
+    Benchmark('bitslots.display_pyramid.repeated', functools.partial(setup_display_pyramid, 16)),
+    Benchmark('bitslots.display_pyramid.fresh',
+              functools.partial(setup_display_pyramid, 8 * bitslots.PYRAMID_CACHE.maxsize)),
+    Benchmark('pyramid.build_pyramid.32', functools.partial(setup_build_pyramid, 32)),
+    Benchmark('pyramid.build_pyramid.256', functools.partial(setup_build_pyramid, 256)),
+    Benchmark('pyramid.build_pyramid.4096', functools.partial(setup_build_pyramid, 4096)),
+    Benchmark('network-sim.display_ip_info', setup_display_ip_info),
+    Benchmark('network-sim.mask_generators', setup_mask_generators),
+    Benchmark('remediate.enumerate_system.first', functools.partial(setup_enumerate_system, False)),
+    Benchmark('remediate.enumerate_system.repeat', functools.partial(setup_enumerate_system, True)),
+]
+
+def measure(benchmark, repeats=7, min_time=0.1):
+    """
+    Times a benchmark: calibrates how many runs make a sample of at least
+    min_time seconds, then takes repeats samples with the garbage collector off.
+    """
+    with contextlib.ExitStack() as stack:
+        prepared = benchmark.setup()
+        if isinstance(prepared, contextlib.AbstractContextManager):
+            prepared = stack.enter_context(prepared)
+        samples, operations = take_samples(*prepared, repeats, min_time)
+    median = statistics.median(samples)
+    spread = statistics.median(abs(sample - median) for sample in samples)
+    return Result(benchmark.name, samples, median, spread, operations)
+
+def take_samples(run, operations, repeats, min_time):
+    """Returns repeats timings of run() in seconds per operation, and operations."""
+    run()  # Warm up caches and lazy imports
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            samples.append((time.perf_counter() - start) / (number * operations))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return samples, operations
+
+def mann_whitney_p(samples, baseline):
+    """
+    One-sided Mann-Whitney U test. Small samples (up to EXACT_SPLITS ways of
+    splitting the ranks between the two groups) get the exact test, ties included;
+    larger ones the normal approximation with tie correction.
+
+    Returns:
+    float: The probability of samples being at least this much slower than the
+    baseline if both came from the same distribution.
+    """
+    n, m = len(samples), len(baseline)
+    if not n or not m:
+        return 1.0
+    ranked = sorted([(value, 0) for value in samples] + [(value, 1) for value in baseline])
+    ranks = [0.0] * len(ranked)
+    ties = 0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, ranked) if group == 0)
+    if math.comb(n + m, n) <= EXACT_SPLITS:
+        # Every split of the ranks is equally likely under the null hypothesis
+        sums = [sum(split) for split in itertools.combinations(ranks, n)]
+        return sum(1 for split_sum in sums if split_sum >= rank_sum - 1e-9) / len(sums)
+    u = rank_sum - n * (n + 1) / 2
+    total = n + m
+    variance = n * m / 12 * ((total + 1) - ties / (total * (total - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n * m / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def compare(result, baseline, threshold, alpha):
+    """Returns the change of the median as a fraction, the p-value and the verdict against a baseline entry."""
+    if baseline is None:
+        return None, None, 'new'
+    change = result.median / baseline['median'] - 1
+    if change > threshold and (p := mann_whitney_p(result.samples, baseline['samples'])) < alpha:
+        return change, p, 'REGRESSED'
+    if change < -threshold and (p := mann_whitney_p(baseline['samples'], result.samples)) < alpha:
+        return change, p, 'improved'
+    return change, None, 'unchanged'
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.1f}ns"
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+def make_run(results):
+    return {
+        'created': time.time(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': {result.name: {'median': result.median, 'spread': result.spread, 'samples': result.samples,
+                                  'operations': result.operations} for result in results},
+    }
+
+def load_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def save_json(path, data):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(temporary, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the repository's hot paths and track regressions.")
+    parser.add_argument('--filter', nargs='+', default=['*'], help="glob patterns of the benchmarks to run")
+    parser.add_argument('--repeats', type=int, default=7, help="samples per benchmark")
+    parser.add_argument('--min-time', type=float, default=0.1, help="minimum seconds per sample")
+    parser.add_argument('--threshold', type=float, default=10.0, help="percent change reported as a regression")
+    parser.add_argument('--alpha', type=float, default=0.05, help="significance level of the comparison")
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help="JSON file every run is appended to")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="JSON baseline to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--list', action='store_true', help="list the benchmarks and exit")
+    args = parser.parse_args()
+    # The exact test cannot go below 1 / C(2n, n), e.g. 0.05 with 3 samples against 3
+    minimum = next(repeats for repeats in itertools.count(2) if 1 / math.comb(2 * repeats, repeats) < args.alpha)
+    if args.repeats < minimum:
+        parser.error(f"--repeats must be at least {minimum} to ever reach p < {args.alpha}")
+
+    benchmarks = [benchmark for benchmark in BENCHMARKS
+                  if any(fnmatch.fnmatchcase(benchmark.name, pattern) for pattern in args.filter)]
+    if args.list or not benchmarks:
+        print('\n'.join(benchmark.name for benchmark in benchmarks) or "No benchmark matches the filter")
+        return
+
+    baseline = load_json(args.baseline, {}).get('results', {})
+    threshold = args.threshold / 100
+    results = []
+    regressed = []
+    print(f"{'Benchmark':<38} {'Median/op':>10} {'+-MAD':>7} {'Baseline':>10} {'Change':>8}  Verdict")
+    for benchmark in benchmarks:
+        result = measure(benchmark, args.repeats, args.min_time)
+        results.append(result)
+        reference = baseline.get(result.name)
+        change, p, verdict = compare(result, reference, threshold, args.alpha)
+        if verdict == 'REGRESSED':
+            regressed.append(result.name)
+        spread = f"{result.spread / result.median * 100:.1f}%" if result.median else '-'
+        print(f"{result.name:<38} {format_time(result.median):>10} {spread:>7} "
+              f"{format_time(reference['median']) if reference else '-':>10} "
+              f"{f'{change * 100:+.1f}%' if change is not None else '-':>8}  {verdict}"
+              + (f" (p={p:.3f})" if p is not None else ''))
+
+    run = make_run(results)
+    history = load_json(args.history, [])
+    history.append(run)
+    save_json(args.history, history)
+    if args.save_baseline:
+        save_json(args.baseline, run)
+        print(f"Saved the baseline to {args.baseline}")
+    if regressed:
+        print(f"{len(regressed)} benchmarks regressed by more than {args.threshold}%: {', '.join(regressed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -15,8 +15,37 @@ Jackpot Conditions:
 - Double Slit Experiment Jackpot: Alternating 1's and 0's throughout all registers in either order but must be continuous through all 4 registers and into the bonus.
 """
 
+import argparse
 import random
-import os
+
+import metrics
+from frame_renderer import FrameRenderer
+from jackpot_rules import JackpotRules, display_word
+from pyramid_cache import PyramidCache
+
+MAIN_REGISTERS = ['r0', 'r1', 'r2', 'r3']
+
+# Histogram of the time spent in each stage of a draw, labelled by stage
+STAGE_SECONDS = 'bitslots.stage_seconds'
+
+DOUBLE_SLIT_JACKPOT = "Double Slit Experiment Jackpot"
+
+# Jackpot rules in priority order; see jackpot_rules for the rule format
+JACKPOT_RULE_SPECS = [
+    {'name': "Super Mega Jackpot", 'priority': 1,
+     'registers': dict.fromkeys(MAIN_REGISTERS + ['bonus'], 'ones')},
+    {'name': "Fools Jackpot", 'priority': 2,
+     'registers': dict.fromkeys(MAIN_REGISTERS + ['bonus'], 'zeros')},
+    {'name': "Mega Jackpot", 'priority': 3,
+     'registers': {**dict.fromkeys(MAIN_REGISTERS, 'ones'), 'bonus': 'zeros'}},
+    {'name': "Super Jackpot", 'priority': 4,
+     'registers': {**dict.fromkeys(MAIN_REGISTERS, 'zeros'), 'bonus': 'ones'}},
+    # Alternating bits in display order (0xAAAAAAAA and 0x55555555) as packed words
+    {'name': DOUBLE_SLIT_JACKPOT, 'priority': 5,
+     'patterns': [(0xFFFFFFFF, 0xA5555555), (0xFFFFFFFF, 0x5AAAAAAA)]},
+]
+
+JACKPOT_RULES = JackpotRules(JACKPOT_RULE_SPECS)
 
 def random_32bit_number():
     """Generates a random 32-bit number."""
@@ -36,6 +65,78 @@ def parse_registers_from_32bit(num):
     bonus_register = (num >> 28) & 0b1111
     return registers, bonus_register
 
+def compose_32bit_from_registers(registers, bonus_register):
+    """
+    Packs four 7-bit registers and one 4-bit bonus register back into a 32-bit number.
+    This is the inverse of parse_registers_from_32bit().
+
+    Args:
+    registers (list): The list of four 7-bit registers.
+    bonus_register (int): The 4-bit bonus register.
+
+    Returns:
+    int: The 32-bit number holding the registers.
+    """
+    num = 0
+    for i, reg in enumerate(registers):
+        num |= (reg & 0b1111111) << (7 * i)
+    return num | ((bonus_register & 0b1111) << 28)
+
+# Every winning word of the rules above, which only fix whole words or registers
+JACKPOT_WORDS = JACKPOT_RULES.winning_words()
+
+# Every register state that wins a jackpot, showcased in the order the rules declare them
+JACKPOT_STATES = [(*parse_registers_from_32bit(word), name) for word, name in JACKPOT_WORDS]
+
+# The winning words of the double slit rule in display order, as pyramid_word() packs them
+DOUBLE_SLIT_WORDS = frozenset(display_word(word) for word, name in JACKPOT_WORDS if name == DOUBLE_SLIT_JACKPOT)
+
+def pyramid_word(registers, bonus_register):
+    """
+    Packs the registers in display order: the four 7-bit registers from left to
+    right followed by the bonus register, most significant bit first.
+
+    Args:
+    registers (list): The list of four 7-bit registers.
+    bonus_register (int): The 4-bit bonus register.
+
+    Returns:
+    int: The 32-bit value whose binary form is the base row of the pyramid.
+    """
+    word = 0
+    for reg in registers:
+        word = (word << 7) | (reg & 0b1111111)
+    return (word << 4) | (bonus_register & 0b1111)
+
+def format_pyramid_rows(rows):
+    """Renders the rows of a pyramid as lines centered on the 120-column display."""
+    return '\n'.join(' '.join(map(str, row)).center(120) for row in rows)
+
+# Pyramids of recently displayed draws, keyed by their display word
+PYRAMID_CACHE = PyramidCache(format_pyramid_rows)
+
+def warm_pyramid_cache():
+    """Precomputes the pyramids of every jackpot state."""
+    PYRAMID_CACHE.warm(pyramid_word(registers, bonus) for registers, bonus, _ in JACKPOT_STATES)
+
+def format_display(registers, bonus_register):
+    """
+    Renders the full 32-bit number, the bonus register and the bit-pyramid as text.
+
+    Args:
+    registers (list): The list of four 7-bit registers.
+    bonus_register (int): The 4-bit bonus register.
+
+    Returns:
+    str: The rendered display without a trailing newline.
+    """
+    word = pyramid_word(registers, bonus_register)
+    return (
+        f'Full 32-bit number: {word:032b}\n'
+        f'Bonus Register: {bonus_register:04b} ({bonus_register})\n\n'
+        + PYRAMID_CACHE.get(word).text
+    )
+
 def display_pyramid(registers, bonus_register):
     """
     Displays the bit-pyramid and decimal values from the registers.
@@ -44,32 +145,7 @@ def display_pyramid(registers, bonus_register):
     registers (list): The list of four 7-bit registers.
     bonus_register (int): The 4-bit bonus register.
     """
-    # Convert registers to binary strings
-    bit_strings = [f'{reg:07b}' for reg in registers]
-    bonus_bit_string = f'{bonus_register:04b}'
-    
-    # Create the complete binary array for the registers
-    complete_binary_array = ''.join(bit_strings)
-    
-    # Display the complete 32-bit binary number
-    full_32bit_string = complete_binary_array + bonus_bit_string
-    print(f'Full 32-bit number: {full_32bit_string}')
-    
-    # Display the bonus register separately
-    print(f'Bonus Register: {bonus_bit_string} ({int(bonus_bit_string, 2)})\n')
-
-    # Display the pyramid
-    length = len(full_32bit_string)
-    for i in range(1, length + 1):
-        row = []
-        for start in range(length - i + 1):
-            row_bits = full_32bit_string[start:start + i]
-            decimal_value = int(row_bits, 2)
-            if i == 1:
-                row.append(f'{row_bits}')
-            else:
-                row.append(f'{decimal_value}')
-        print(' '.join(row).center(120))
+    print(format_display(registers, bonus_register))
 
 def check_jackpot(registers, bonus_register):
     """
@@ -82,17 +158,7 @@ def check_jackpot(registers, bonus_register):
     Returns:
     str: The name of the jackpot if any, otherwise "No Jackpot".
     """
-    if all(reg == 0b1111111 for reg in registers) and bonus_register == 0b1111:
-        return "Super Mega Jackpot"
-    elif all(reg == 0b0000000 for reg in registers) and bonus_register == 0b0000:
-        return "Fools Jackpot"
-    elif all(reg == 0b1111111 for reg in registers) and bonus_register == 0b0000:
-        return "Mega Jackpot"
-    elif all(reg == 0b0000000 for reg in registers) and bonus_register == 0b1111:
-        return "Super Jackpot"
-    elif check_double_slit_experiment(registers, bonus_register):
-        return "Double Slit Experiment Jackpot"
-    return "No Jackpot"
+    return JACKPOT_RULES.classify_registers(registers, bonus_register)
 
 def check_double_slit_experiment(registers, bonus_register):
     """
@@ -105,25 +171,81 @@ def check_double_slit_experiment(registers, bonus_register):
     Returns:
     bool: True if the Double Slit Experiment Jackpot condition is met, otherwise False.
     """
-    bit_strings = ''.join(f'{reg:07b}' for reg in registers) + f'{bonus_register:04b}'
-    if bit_strings == '01' * 16 or bit_strings == '10' * 16:
-        return True
-    return False
+    return pyramid_word(registers, bonus_register) in DOUBLE_SLIT_WORDS
 
 def clear_screen():
     """Clears the terminal screen."""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    FrameRenderer().clear()
+
+def format_frame(title, registers, bonus_register, result):
+    """Renders a whole screen: a title, the display of the registers and the jackpot result."""
+    return f"{title}\n{format_display(registers, bonus_register)}\n{result}"
+
+def timed_draw():
+    """Draws a random number and parses its registers, timing both stages when metrics are enabled."""
+    if not metrics.REGISTRY.enabled:
+        # Uninstrumented runs skip even the no-op timers
+        return parse_registers_from_32bit(random_32bit_number())
+    with metrics.timer(STAGE_SECONDS, stage='draw'):
+        random_number = random_32bit_number()
+    with metrics.timer(STAGE_SECONDS, stage='parse'):
+        return parse_registers_from_32bit(random_number)
+
+def render_result(renderer, title, registers, bonus_register):
+    """Classifies the registers and renders the frame, timing the classify, format and write stages."""
+    if not metrics.REGISTRY.enabled:
+        result = check_jackpot(registers, bonus_register)
+        renderer.render(format_frame(title, registers, bonus_register, result))
+        return
+    with metrics.timer(STAGE_SECONDS, stage='classify'):
+        result = check_jackpot(registers, bonus_register)
+    metrics.count('bitslots.draws', outcome=result)
+    with metrics.timer(STAGE_SECONDS, stage='format'):
+        frame = format_frame(title, registers, bonus_register, result)
+    with metrics.timer(STAGE_SECONDS, stage='write'):
+        renderer.render(frame)
 
 def main():
-    clear_screen()
-    
+    parser = argparse.ArgumentParser(description="Bit-pyramid slot machine.")
+    parser.add_argument('--diff', action='store_true', help="only redraw the lines that change between draws")
+    parser.add_argument('--draws', type=int, help="write this many draws without any terminal interaction")
+    parser.add_argument('--format', choices=['jsonl', 'csv', 'binary', 'journal'], default='jsonl',
+                        help="record format of the headless draws")
+    parser.add_argument('--output', help="file for the headless draws instead of stdout")
+    parser.add_argument('--seed', type=int, help="seed for reproducible headless draws")
+    parser.add_argument('--journal', help="append every random draw of the game to this draw journal")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.draws is not None:
+        if args.draws < 1:
+            parser.error("--draws must be at least 1")
+        if args.format == 'journal' and args.output is None:
+            parser.error("--format journal needs --output")
+        # The headless mode needs NumPy, which the interactive game does not
+        from bitslots_sim import export_draws
+        export_draws(args.draws, args.format, args.output, args.seed)
+        return
+
+    if args.journal is None:
+        with metrics.session(args.metrics, args.profile):
+            play(FrameRenderer(diff=args.diff))
+        return
+
+    # Like the headless mode, the journal needs NumPy
+    from draw_journal import DrawJournal
+    with DrawJournal(args.journal, 'a') as journal, metrics.session(args.metrics, args.profile):
+        play(FrameRenderer(diff=args.diff), journal)
+
+def play(renderer, journal=None):
+    """Runs the interactive game until the player types 'exit', appending the random draws to journal if given."""
+    warm_pyramid_cache()
+
     # Start by displaying the highest possible win condition (all 1's)
     registers = [0b1111111] * 4
     bonus_register = 0b1111
 
-    print("Initial State (Super Mega Jackpot):")
-    display_pyramid(registers, bonus_register)
-    print(check_jackpot(registers, bonus_register))
+    render_result(renderer, "Initial State (Super Mega Jackpot):", registers, bonus_register)
 
     draw_count = 0
     jackpot_displayed = False
@@ -135,43 +257,29 @@ def main():
             print("Exiting the game.")
             break
         
-        clear_screen()
-        
         if draw_count < 5:
             # Perform a single 32-bit random draw and parse the registers
-            random_number = random_32bit_number()
-            registers, bonus_register = parse_registers_from_32bit(random_number)
+            registers, bonus_register = timed_draw()
+            if journal is not None:
+                journal.append(compose_32bit_from_registers(registers, bonus_register))
         elif draw_count == 5:
             # After 5 random draws, display each jackpot once
-            jackpots = [
-                ([0b1111111] * 4, 0b1111, "Super Mega Jackpot"),
-                ([0b0000000] * 4, 0b0000, "Fools Jackpot"),
-                ([0b1111111] * 4, 0b0000, "Mega Jackpot"),
-                ([0b0000000] * 4, 0b1111, "Super Jackpot"),
-                ([0b1010101, 0b0101010, 0b1010101, 0b0101010], 0b1010, "Double Slit Experiment Jackpot"),
-                ([0b0101010, 0b1010101, 0b0101010, 0b1010101], 0b0101, "Double Slit Experiment Jackpot")
-            ]
-            
-            for reg_set, bonus, name in jackpots:
+            for reg_set, bonus, name in JACKPOT_STATES:
                 input(f"Press Enter to display {name}...")
-                clear_screen()
                 registers = reg_set
                 bonus_register = bonus
-                print(f"\n{name}:")
-                display_pyramid(registers, bonus_register)
-                print(name)
+                renderer.render(format_frame(f"\n{name}:", registers, bonus_register, name))
             
             jackpot_displayed = True
         else:
             # Continue with normal random draws after displaying jackpots once
-            random_number = random_32bit_number()
-            registers, bonus_register = parse_registers_from_32bit(random_number)
+            registers, bonus_register = timed_draw()
+            if journal is not None:
+                journal.append(compose_32bit_from_registers(registers, bonus_register))
 
         draw_count += 1
 
-        print("\nAfter Random Draws:")
-        display_pyramid(registers, bonus_register)
-        print(check_jackpot(registers, bonus_register))
+        render_result(renderer, "\nAfter Random Draws:", registers, bonus_register)
 
 if __name__ == "__main__":
     main()
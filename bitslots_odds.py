@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+Exact jackpot odds for the bit-pyramid slot machine in bitslots.py.
+
+The odds are computed two ways:
+
+- Analytically: the compiled jackpot rules count the words every outcome wins
+  from the table entries of the two 16-bit halves of the word, without
+  enumerating them. Dividing by 2^32 gives the exact probability.
+- Exhaustively: all 2^32 words are enumerated in chunks and classified in bulk
+  with JACKPOT_RULES.classify_array(). The chunks are spread over a process pool
+  and every winning word found is re-checked with check_jackpot() itself, which
+  splits it with parse_registers_from_32bit() first.
+
+The payout table lists the winning combinations, probability and odds of every
+outcome, plus the fair payout: the multiple of the stake at which a jackpot
+would break even.
+
+Usage:
+    python bitslots_odds.py
+    python bitslots_odds.py --exhaustive --workers 8
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+
+import numpy as np
+
+from bitslots import JACKPOT_RULES, check_jackpot, parse_registers_from_32bit
+from bitslots_sim import OUTCOME_NAMES, merge_counts
+from jackpot_rules import NO_JACKPOT
+
+WORD_SPACE = 1 << 32
+
+# Words enumerated per NumPy chunk during the exhaustive search
+DEFAULT_CHUNK_BITS = 22
+
+def analytic_counts():
+    """
+    Counts the winning words of every outcome from the compiled jackpot rules.
+
+    JACKPOT_RULES.count_outcomes() groups the 2^16 values of each half of the word
+    by the rule terms they allow, and multiplies the group sizes of the two halves,
+    so the counts are exact without enumerating the 2^32 words.
+
+    Returns:
+    dict: Outcome name mapped to its number of winning words.
+    """
+    return JACKPOT_RULES.count_outcomes()
+
+def enumerate_range(start, stop, chunk_bits=DEFAULT_CHUNK_BITS):
+    """
+    Classifies every word in [start, stop) and verifies the winners with check_jackpot().
+
+    Args:
+    start (int): The first word.
+    stop (int): One past the last word.
+    chunk_bits (int): log2 of the number of words classified at a time.
+
+    Returns:
+    dict: Outcome name mapped to its number of words.
+    """
+    no_jackpot = OUTCOME_NAMES.index(NO_JACKPOT)
+    totals = np.zeros(len(OUTCOME_NAMES), dtype=np.int64)
+    for chunk_start in range(start, stop, 1 << chunk_bits):
+        chunk_stop = min(chunk_start + (1 << chunk_bits), stop)
+        words = np.arange(chunk_start, chunk_stop, dtype=np.uint64).astype(np.uint32)
+        codes = JACKPOT_RULES.classify_array(words)
+        totals += np.bincount(codes, minlength=len(OUTCOME_NAMES))
+
+        for word, code in zip(words[codes != no_jackpot].tolist(), codes[codes != no_jackpot].tolist()):
+            expected = check_jackpot(*parse_registers_from_32bit(word))
+            if expected != OUTCOME_NAMES[code]:
+                raise AssertionError(f"{word:#010x} classified as {OUTCOME_NAMES[code]}, expected {expected}")
+    return dict(zip(OUTCOME_NAMES, totals.tolist()))
+
+def exhaustive_counts(workers=1, chunk_bits=DEFAULT_CHUNK_BITS):
+    """
+    Classifies all 2^32 words, split into contiguous ranges across a process pool.
+
+    Args:
+    workers (int): The number of worker processes.
+    chunk_bits (int): log2 of the number of words classified at a time.
+
+    Returns:
+    dict: Outcome name mapped to its number of words.
+    """
+    # Several ranges per worker keep the pool busy until the end
+    num_ranges = max(workers * 4, 1)
+    bounds = [WORD_SPACE * i // num_ranges for i in range(num_ranges + 1)]
+    starts, stops = bounds[:-1], bounds[1:]
+
+    chunk_bits = [chunk_bits] * num_ranges
+
+    if workers == 1:
+        return merge_counts(map(enumerate_range, starts, stops, chunk_bits))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return merge_counts(pool.map(enumerate_range, starts, stops, chunk_bits))
+
+def payout_table(counts):
+    """
+    Builds the exact odds of every outcome.
+
+    Args:
+    counts (dict): Outcome name mapped to its number of winning words.
+
+    Returns:
+    list: One (name, words, probability, fair payout) tuple per outcome, with the
+    probability as an exact Fraction and the fair payout as the stake multiple
+    that breaks even.
+    """
+    table = []
+    for name in OUTCOME_NAMES:
+        probability = Fraction(counts[name], WORD_SPACE)
+        fair_payout = 1 / probability if probability else None
+        table.append((name, counts[name], probability, fair_payout))
+    return table
+
+def print_payout_table(counts):
+    """Prints the odds of every outcome."""
+    print(f"{'Outcome':<32}{'Words':>12}{'Probability':>16}{'Odds':>24}{'Fair payout':>20}")
+    for name, words, probability, fair_payout in payout_table(counts):
+        odds = f"1 in {float(fair_payout):,.2f}" if fair_payout else "never"
+        payout = f"{float(fair_payout):,.2f}x" if fair_payout else "-"
+        print(f"{name:<32}{words:>12}{float(probability):>16.6e}{odds:>24}{payout:>20}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact jackpot odds of the bit-pyramid slot machine.")
+    parser.add_argument('--exhaustive', action='store_true', help="also enumerate all 2^32 words and compare")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes for --exhaustive")
+    parser.add_argument('--chunk-bits', type=int, default=DEFAULT_CHUNK_BITS, help="log2 of words per NumPy chunk")
+    args = parser.parse_args()
+
+    counts = analytic_counts()
+    print("Analytic payout table:")
+    print_payout_table(counts)
+
+    if args.exhaustive:
+        start = time.perf_counter()
+        enumerated = exhaustive_counts(args.workers, args.chunk_bits)
+        elapsed = time.perf_counter() - start
+        print(f"\nExhaustive enumeration of 2^32 words on {args.workers} worker(s) in {elapsed:.1f}s:")
+        print_payout_table(enumerated)
+        if enumerated != counts:
+            raise SystemExit("Exhaustive enumeration does not match the analytic counts")
+        print("\nVerified: the exhaustive counts match the analytic counts.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+
+"""
+Bulk Monte Carlo simulation for the bit-pyramid slot machine in bitslots.py.
+
+Instead of drawing, parsing and checking one 32-bit number at a time, this script
+draws millions of 32-bit words straight into a NumPy array and classifies every
+draw at once with the compiled jackpot rules of bitslots.py. Other rule sets can
+be simulated by passing a JSON rule file with --rules (see jackpot_rules).
+
+The simulation reports the number of hits per jackpot together with the
+empirical and theoretical probability of each outcome.
+
+write_draws() streams every individual draw (registers, bonus register and
+jackpot result) as JSON lines, CSV or fixed-width binary records. It backs the
+headless mode of bitslots.py (--draws N --format jsonl|csv|binary|journal), where
+the journal format appends the raw draws to a draw_journal with a jackpot index.
+
+With --workers the draw budget is split into one shard per worker process. Each
+shard draws from its own stream spawned from a single SeedSequence, so a run is
+bit-identical for a given seed and worker count.
+
+Usage:
+    python bitslots_sim.py 100000000 --seed 42
+    python bitslots_sim.py 1000000000 --seed 42 --workers 8
+    python bitslots_sim.py 100000000 --rules my_rules.json
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bitslots import JACKPOT_RULES
+from jackpot_rules import JackpotRules, load_rules
+
+# Number of draws generated and classified per NumPy chunk
+DEFAULT_CHUNK_SIZE = 1 << 22
+
+# Jackpot names in priority order, followed by the losing outcome
+OUTCOME_NAMES = JACKPOT_RULES.outcome_names
+
+# Bit offsets of the four 7-bit registers, as in parse_registers_from_32bit()
+REGISTER_SHIFTS = np.array([0, 7, 14, 21], dtype=np.uint32)
+
+RECORD_FORMATS = ('jsonl', 'csv', 'binary', 'journal')
+
+# Draws formatted per chunk when writing text records
+TEXT_CHUNK_SIZE = 1 << 16
+
+# Binary draw files start with a magic number, a version and the record size
+BINARY_MAGIC = b'BSLT'
+BINARY_VERSION = 1
+BINARY_HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'), ('record_size', '<u2')])
+
+# One fixed-width binary record per draw; outcome is an index into OUTCOME_NAMES
+RECORD_DTYPE = np.dtype([('registers', 'u1', (4,)), ('bonus', 'u1'), ('outcome', 'u1')])
+
+JSONL_RECORD = '{"draw":%d,"registers":[%d,%d,%d,%d],"bonus":%d,"jackpot":"%s"}\n'
+CSV_HEADER = 'draw,register_0,register_1,register_2,register_3,bonus,jackpot\n'
+CSV_RECORD = '%d,%d,%d,%d,%d,%d,%s\n'
+
+def theoretical_probabilities(rules=JACKPOT_RULES):
+    """
+    Computes the exact probability of every outcome for a uniform 32-bit draw.
+
+    Args:
+    rules (JackpotRules): The compiled jackpot rules.
+
+    Returns:
+    dict: Outcome name mapped to its probability.
+    """
+    return {name: words / 2**32 for name, words in rules.count_outcomes().items()}
+
+def generate_draws(rng, count):
+    """
+    Draws uniformly distributed 32-bit words.
+
+    Args:
+    rng (numpy.random.Generator): The random generator to draw from.
+    count (int): The number of words to draw.
+
+    Returns:
+    numpy.ndarray: A uint32 array of the drawn words.
+    """
+    return rng.integers(0, 1 << 32, size=count, dtype=np.uint32)
+
+def classify_draws(draws, rules=JACKPOT_RULES):
+    """
+    Counts the jackpot outcomes in an array of 32-bit draws.
+
+    Args:
+    draws (numpy.ndarray): A uint32 array of draws.
+    rules (JackpotRules): The compiled jackpot rules.
+
+    Returns:
+    dict: Outcome name mapped to its number of hits.
+    """
+    hits = np.bincount(rules.classify_array(draws), minlength=len(rules.outcome_names))
+    return dict(zip(rules.outcome_names, hits.tolist()))
+
+def draw_records(draws):
+    """
+    Splits draws into their registers and jackpot outcome.
+
+    Args:
+    draws (numpy.ndarray): A uint32 array of draws.
+
+    Returns:
+    numpy.ndarray: A RECORD_DTYPE array with one record per draw.
+    """
+    records = np.empty(draws.shape, dtype=RECORD_DTYPE)
+    records['registers'] = (draws[:, None] >> REGISTER_SHIFTS) & 0b1111111
+    records['bonus'] = draws >> 28
+    records['outcome'] = JACKPOT_RULES.classify_array(draws)
+    return records
+
+def _format_text_records(records, first_draw, template):
+    """Formats a chunk of records as text lines, numbering draws from first_draw."""
+    registers = records['registers'].tolist()
+    bonuses = records['bonus'].tolist()
+    outcomes = records['outcome'].tolist()
+    return ''.join(
+        template % (first_draw + i, *registers[i], bonuses[i], OUTCOME_NAMES[outcomes[i]])
+        for i in range(len(outcomes))
+    )
+
+def write_draws(out, num_draws, record_format, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams individual draws to a binary file.
+
+    Args:
+    out (file): A file opened in binary mode.
+    num_draws (int): The number of draws to write.
+    record_format (str): One of RECORD_FORMATS.
+    seed (int or numpy.random.SeedSequence, optional): Seed for the random generator.
+    chunk_size (int): The number of draws generated at a time.
+
+    Returns:
+    dict: Outcome name mapped to its number of hits.
+    """
+    if num_draws < 1:
+        raise ValueError("num_draws must be at least 1")
+    if record_format not in RECORD_FORMATS:
+        raise ValueError(f"Unknown record format: {record_format}")
+    if record_format == 'journal':
+        raise ValueError("Draw journals cannot be streamed; write them with export_draws()")
+
+    if record_format == 'binary':
+        header = np.array([(BINARY_MAGIC, BINARY_VERSION, RECORD_DTYPE.itemsize)], dtype=BINARY_HEADER)
+        out.write(header.tobytes())
+    else:
+        chunk_size = min(chunk_size, TEXT_CHUNK_SIZE)
+        if record_format == 'csv':
+            out.write(CSV_HEADER.encode())
+    template = JSONL_RECORD if record_format == 'jsonl' else CSV_RECORD
+
+    rng = np.random.default_rng(seed)
+    counts = dict.fromkeys(OUTCOME_NAMES, 0)
+    written = 0
+    while written < num_draws:
+        records = draw_records(generate_draws(rng, min(chunk_size, num_draws - written)))
+        if record_format == 'binary':
+            out.write(records.tobytes())
+        else:
+            out.write(_format_text_records(records, written, template).encode())
+        for code, hits in enumerate(np.bincount(records['outcome'], minlength=len(OUTCOME_NAMES)).tolist()):
+            counts[OUTCOME_NAMES[code]] += hits
+        written += len(records)
+    return counts
+
+def read_binary_draws(path):
+    """
+    Loads a binary draw file written by write_draws().
+
+    Args:
+    path (str): The file to read.
+
+    Returns:
+    numpy.ndarray: A RECORD_DTYPE array with one record per draw.
+    """
+    header = np.fromfile(path, dtype=BINARY_HEADER, count=1)
+    if len(header) != 1 or header['magic'][0] != BINARY_MAGIC:
+        raise ValueError(f"{path} is not a binary draw file")
+    if header['version'][0] != BINARY_VERSION or header['record_size'][0] != RECORD_DTYPE.itemsize:
+        raise ValueError(f"Unsupported binary draw file version in {path}")
+    return np.fromfile(path, dtype=RECORD_DTYPE, offset=BINARY_HEADER.itemsize)
+
+def export_draws(num_draws, record_format, output=None, seed=None):
+    """
+    Writes draws to a file, or to stdout if no output path is given.
+
+    Args:
+    num_draws (int): The number of draws to write.
+    record_format (str): One of RECORD_FORMATS.
+    output (str, optional): The file to write. Defaults to stdout, except for journals, which need a path.
+    seed (int, optional): Seed for a reproducible run.
+
+    Returns:
+    dict: Outcome name mapped to its number of hits.
+    """
+    # Checked before the output file is created
+    if num_draws < 1:
+        raise ValueError("num_draws must be at least 1")
+    if record_format == 'journal':
+        if output is None:
+            raise ValueError("Draw journals are memory-mapped and need an output path")
+        from draw_journal import write_journal
+        return write_journal(output, num_draws, seed)
+    if output is None:
+        return write_draws(sys.stdout.buffer, num_draws, record_format, seed)
+    with open(output, 'wb', buffering=1 << 20) as out:
+        return write_draws(out, num_draws, record_format, seed)
+
+def simulate(num_draws, seed=None, chunk_size=DEFAULT_CHUNK_SIZE, rules=JACKPOT_RULES):
+    """
+    Runs a Monte Carlo simulation of the slot machine.
+
+    Args:
+    num_draws (int): The total number of draws to simulate.
+    seed (int or numpy.random.SeedSequence, optional): Seed for the random generator. A fresh seed is used if None.
+    chunk_size (int): The number of draws generated and classified at a time.
+    rules (JackpotRules): The compiled jackpot rules.
+
+    Returns:
+    dict: Outcome name mapped to its number of hits.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    rng = np.random.default_rng(seed)
+    counts = dict.fromkeys(rules.outcome_names, 0)
+    remaining = num_draws
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        for name, hits in classify_draws(generate_draws(rng, size), rules).items():
+            counts[name] += hits
+        remaining -= size
+    return counts
+
+def shard_sizes(num_draws, workers):
+    """
+    Splits a draw budget into near-equal shards, one per worker.
+
+    Args:
+    num_draws (int): The total number of draws.
+    workers (int): The number of shards.
+
+    Returns:
+    list: The number of draws in each shard.
+    """
+    base, extra = divmod(num_draws, workers)
+    return [base + (1 if i < extra else 0) for i in range(workers)]
+
+def merge_counts(shard_counts):
+    """
+    Merges the outcome counts of several shards.
+
+    Args:
+    shard_counts (iterable): Dicts of outcome name mapped to number of hits.
+
+    Returns:
+    dict: Outcome name mapped to the total number of hits.
+    """
+    counts = {}
+    for shard in shard_counts:
+        for name, hits in shard.items():
+            counts[name] = counts.get(name, 0) + hits
+    return counts
+
+def simulate_parallel(num_draws, workers, seed=None, chunk_size=DEFAULT_CHUNK_SIZE, rules=JACKPOT_RULES):
+    """
+    Runs a Monte Carlo simulation sharded across a pool of worker processes.
+
+    Every shard gets an independent stream spawned from one SeedSequence, so the
+    result only depends on the seed and the number of workers.
+
+    Args:
+    num_draws (int): The total number of draws to simulate.
+    workers (int): The number of worker processes (and shards).
+    seed (int or numpy.random.SeedSequence, optional): The root seed. Fresh entropy is used if None.
+    chunk_size (int): The number of draws generated and classified at a time.
+    rules (JackpotRules): The compiled jackpot rules.
+
+    Returns:
+    dict: Outcome name mapped to its number of hits.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    sizes = shard_sizes(num_draws, workers)
+    shard_seeds = seed_sequence.spawn(workers)
+    chunk_sizes = [chunk_size] * workers
+    shard_rules = [rules] * workers
+
+    if workers == 1:
+        return merge_counts(map(simulate, sizes, shard_seeds, chunk_sizes, shard_rules))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return merge_counts(pool.map(simulate, sizes, shard_seeds, chunk_sizes, shard_rules))
+
+def probability_table(counts, rules=JACKPOT_RULES):
+    """
+    Compares the empirical outcome probabilities against the theoretical ones.
+
+    Args:
+    counts (dict): Outcome name mapped to its number of hits, as returned by simulate().
+    rules (JackpotRules): The compiled jackpot rules the counts were simulated with.
+
+    Returns:
+    list: One (name, hits, empirical probability, theoretical probability) tuple per outcome.
+    """
+    total = sum(counts.values())
+    theoretical = theoretical_probabilities(rules)
+    return [
+        (name, counts[name], counts[name] / total if total else 0.0, theoretical[name])
+        for name in rules.outcome_names
+    ]
+
+def print_probability_table(counts, rules=JACKPOT_RULES):
+    """Prints the outcome counts and probabilities of a simulation."""
+    print(f"{'Outcome':<32}{'Hits':>14}{'Empirical':>16}{'Theoretical':>16}")
+    for name, hits, empirical, theoretical in probability_table(counts, rules):
+        print(f"{name:<32}{hits:>14}{empirical:>16.6e}{theoretical:>16.6e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of the bit-pyramid slot machine.")
+    parser.add_argument('draws', type=int, help="number of 32-bit draws to simulate")
+    parser.add_argument('--seed', type=int, default=None, help="seed for a reproducible run")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="draws per NumPy chunk")
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f"number of worker processes (this machine has {os.cpu_count()} cores)")
+    parser.add_argument('--rules', help="JSON file of jackpot rules to simulate instead of the built-in ones")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    rules = JackpotRules(load_rules(args.rules)) if args.rules else JACKPOT_RULES
+
+    # Keep the root seed around so an unseeded run can still be reproduced
+    seed_sequence = np.random.SeedSequence(args.seed)
+
+    start = time.perf_counter()
+    counts = simulate_parallel(args.draws, args.workers, seed=seed_sequence, chunk_size=args.chunk_size, rules=rules)
+    elapsed = time.perf_counter() - start
+
+    print_probability_table(counts, rules)
+    rate = args.draws / elapsed if elapsed else float('inf')
+    print(f"\n{args.draws} draws on {args.workers} worker(s) in {elapsed:.2f}s ({rate:,.0f} draws/s)")
+    print(f"Seed: {seed_sequence.entropy}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+
+"""
+Append-only, memory-mapped journal of bit-pyramid slot machine draws.
+
+Every draw is stored as its packed 32-bit word (4 bytes, little-endian, in the
+register layout of bitslots.parse_registers_from_32bit()), so draw k lives at a
+fixed offset and replaying it is O(1). The journal file is written through a
+memory map that grows by doubling, and its header holds the number of committed
+draws, which is only advanced after the records are in place.
+
+A sidecar index (the journal path plus .jackpots) lists every draw that won a
+jackpot under check_jackpot(), as one 8-byte entry per hit holding the draw
+number and the outcome code. Entries are in draw order, so all jackpots (or
+those of one outcome) are enumerated in O(hits) and a single draw is checked
+with a binary search. The index records how many draws it covers and a
+fingerprint of the jackpot rules; when it is behind (after a crash) or the
+rules changed, it is brought up to date from the journal on the next open.
+
+Replay is zero-copy: DrawJournal.draws is a NumPy view of the mapped file.
+
+Usage:
+    python draw_journal.py write draws.bsj --draws 100000000 --seed 1
+    python draw_journal.py stats draws.bsj
+    python draw_journal.py draw draws.bsj 48213771
+    python draw_journal.py jackpots draws.bsj --outcome "Mega Jackpot"
+    python draw_journal.py verify draws.bsj
+"""
+
+import argparse
+import mmap
+import os
+import time
+
+import numpy as np
+
+from bitslots import JACKPOT_RULES, parse_registers_from_32bit
+
+JOURNAL_MAGIC = b'BSJR'
+INDEX_MAGIC = b'BSJX'
+JOURNAL_VERSION = 1
+
+# Both headers are padded to 32 bytes, which keeps the records aligned
+JOURNAL_HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'), ('record_size', '<u2'), ('count', '<u8'),
+                           ('reserved', 'V16')])
+INDEX_HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'), ('entry_size', '<u2'), ('indexed', '<u8'),
+                         ('rules', 'V16')])
+RECORD_DTYPE = np.dtype('<u4')
+
+# An index entry is the draw number shifted left by 8 bits, or-ed with the outcome code
+INDEX_DTYPE = np.dtype('<u8')
+OUTCOME_BITS = 8
+OUTCOME_MASK = (1 << OUTCOME_BITS) - 1
+
+INDEX_SUFFIX = '.jackpots'
+
+# The journal file grows to at least this many records, then doubles
+MIN_CAPACITY = 1 << 20
+
+# Draws classified at a time when appending arrays or rebuilding the index
+CHUNK_SIZE = 1 << 22
+
+class DrawJournal:
+    """
+    A draw journal and its jackpot index.
+
+    Args:
+    path (str): The journal file, created if it does not exist in write mode.
+    mode (str): 'r' to replay, 'a' to append.
+    rules (JackpotRules): The rules the index classifies draws with.
+    """
+
+    def __init__(self, path, mode='r', rules=JACKPOT_RULES):
+        if mode not in ('r', 'a'):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.mode = mode
+        self.rules = rules
+        self._rules_fingerprint = rules.fingerprint()
+        self._mmap = None
+        if mode == 'a' and not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(np.array([(JOURNAL_MAGIC, JOURNAL_VERSION, RECORD_DTYPE.itemsize, 0, b'')],
+                                 dtype=JOURNAL_HEADER).tobytes())
+        self._file = open(path, 'r+b' if mode == 'a' else 'rb')
+        header = np.frombuffer(self._file.read(JOURNAL_HEADER.itemsize), dtype=JOURNAL_HEADER)
+        if len(header) != 1 or header['magic'][0] != JOURNAL_MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a draw journal")
+        if header['version'][0] != JOURNAL_VERSION or header['record_size'][0] != RECORD_DTYPE.itemsize:
+            self._file.close()
+            raise ValueError(f"Unsupported draw journal version in {path}")
+        self._map(os.fstat(self._file.fileno()).st_size)
+        if self.count > self.capacity:
+            raise ValueError(f"{path} is truncated: its header counts {self.count} draws")
+        self._index_file = None
+        self._pending = []
+        if mode == 'a':
+            self._open_index()
+
+    def _map(self, size):
+        # Views handed out earlier keep the previous mapping alive until they are released
+        self._mmap = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_WRITE if self.mode == 'a' else mmap.ACCESS_READ)
+        self._header = np.frombuffer(self._mmap, dtype=JOURNAL_HEADER, count=1)
+        self.capacity = (size - JOURNAL_HEADER.itemsize) // RECORD_DTYPE.itemsize
+        self._records = np.frombuffer(self._mmap, dtype=RECORD_DTYPE, count=self.capacity,
+                                      offset=JOURNAL_HEADER.itemsize)
+
+    @property
+    def count(self):
+        """The number of committed draws."""
+        return int(self._header['count'][0])
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def draws(self):
+        """A read-only NumPy view of every committed draw, mapped straight from the file."""
+        view = self._records[:self.count]
+        view.flags.writeable = False
+        return view
+
+    def draw(self, k):
+        """Returns draw k (counted from 0) as its packed 32-bit word."""
+        if not 0 <= k < self.count:
+            raise IndexError(f"Draw {k} is not in the journal ({self.count} draws)")
+        return int(self._records[k])
+
+    def __getitem__(self, k):
+        return self.draw(k)
+
+    # Appending
+
+    def _reserve(self, needed):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, 2 * self.capacity, MIN_CAPACITY)
+        self._mmap.flush()
+        self._file.truncate(JOURNAL_HEADER.itemsize + capacity * RECORD_DTYPE.itemsize)
+        self._map(JOURNAL_HEADER.itemsize + capacity * RECORD_DTYPE.itemsize)
+
+    def _commit(self, count):
+        self._header['count'] = count
+
+    def append(self, word):
+        """Appends one draw. Returns its draw number."""
+        k = self.count
+        self._reserve(k + 1)
+        self._records[k] = word
+        code = self.rules.classify_code(word)
+        if code != self.rules.no_jackpot:
+            self._pending.append((k << OUTCOME_BITS) | code)
+        self._commit(k + 1)
+        return k
+
+    def append_many(self, words):
+        """Appends an array of draws. Returns the draw number of the first."""
+        words = np.asarray(words, dtype=np.uint32).ravel()
+        first = self.count
+        self._reserve(first + len(words))
+        for start in range(0, len(words), CHUNK_SIZE):
+            chunk = words[start:start + CHUNK_SIZE]
+            self._records[first + start:first + start + len(chunk)] = chunk
+            self._index_chunk(chunk, first + start)
+        self._commit(first + len(words))
+        return first
+
+    def _index_chunk(self, chunk, first):
+        codes = self.rules.classify_array(chunk)
+        hits = np.flatnonzero(codes != self.rules.no_jackpot)
+        if hits.size:
+            entries = ((hits.astype(np.uint64) + np.uint64(first)) << np.uint64(OUTCOME_BITS)) | codes[hits]
+            self._flush_pending()
+            self._index_file.seek(0, os.SEEK_END)
+            self._index_file.write(entries.astype(INDEX_DTYPE).tobytes())
+
+    def _flush_pending(self):
+        if self._pending:
+            self._index_file.seek(0, os.SEEK_END)
+            self._index_file.write(np.array(self._pending, dtype=INDEX_DTYPE).tobytes())
+            self._pending = []
+
+    def flush(self):
+        """Writes the pending index entries and syncs the journal and index to disk."""
+        if self.mode != 'a':
+            return
+        self._flush_pending()
+        self._write_index_header(self.count)
+        self._index_file.flush()
+        os.fsync(self._index_file.fileno())
+        self._mmap.flush()
+
+    def close(self):
+        if self._mmap is None:
+            return
+        count = self.count
+        if self.mode == 'a':
+            self.flush()
+            self._index_file.close()
+        self._header = self._records = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # A draws view is still alive; the mapping is released with it
+        self._mmap = None
+        if self.mode == 'a':
+            # Drop the unused preallocated records
+            self._file.truncate(JOURNAL_HEADER.itemsize + count * RECORD_DTYPE.itemsize)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # The jackpot index
+
+    def _write_index_header(self, indexed):
+        self._index_file.seek(0)
+        self._index_file.write(np.array([(INDEX_MAGIC, JOURNAL_VERSION, INDEX_DTYPE.itemsize, indexed,
+                                          self._rules_fingerprint)], dtype=INDEX_HEADER).tobytes())
+
+    def _read_index(self):
+        """Returns the index header and a view of its entries, or (None, None) if it is missing or unusable."""
+        try:
+            with open(self.index_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < INDEX_HEADER.itemsize:
+                    return None, None
+                data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None, None
+        header = np.frombuffer(data, dtype=INDEX_HEADER, count=1)[0]
+        if (header['magic'] != INDEX_MAGIC or header['version'] != JOURNAL_VERSION
+                or header['entry_size'] != INDEX_DTYPE.itemsize or header['rules'].tobytes() != self._rules_fingerprint):
+            return None, None
+        entries = np.frombuffer(data, dtype=INDEX_DTYPE, offset=INDEX_HEADER.itemsize,
+                                count=(size - INDEX_HEADER.itemsize) // INDEX_DTYPE.itemsize)
+        return header, entries
+
+    def _open_index(self):
+        """Opens the index for appending, first bringing it up to date with the journal."""
+        header, entries = self._read_index()
+        if header is None:
+            indexed, keep = 0, 0
+        else:
+            indexed = min(int(header['indexed']), self.count)
+            # Entries past the covered draws may be from a run that stopped before updating the header
+            keep = int(np.searchsorted(entries, np.uint64(indexed) << np.uint64(OUTCOME_BITS)))
+        del entries
+        mode = 'r+b' if header is not None else 'w+b'
+        self._index_file = open(self.index_path, mode)
+        self._index_file.truncate(INDEX_HEADER.itemsize + keep * INDEX_DTYPE.itemsize)
+        self._write_index_header(indexed)
+        for start in range(indexed, self.count, CHUNK_SIZE):
+            self._index_chunk(self._records[start:min(start + CHUNK_SIZE, self.count)], start)
+        self._write_index_header(self.count)
+        self._index_file.flush()
+
+    def _covered_entries(self):
+        """Returns the number of draws the index covers and a view of their entries."""
+        if self.mode == 'a':
+            self._flush_pending()
+            self._write_index_header(self.count)
+            self._index_file.flush()
+        header, entries = self._read_index()
+        if header is None:
+            return 0, np.empty(0, dtype=INDEX_DTYPE)
+        indexed = min(int(header['indexed']), self.count)
+        return indexed, entries[:np.searchsorted(entries, np.uint64(indexed) << np.uint64(OUTCOME_BITS))]
+
+    def jackpot_entries(self):
+        """
+        Returns every jackpot of the committed draws as (draw numbers, outcome codes) arrays.
+        Draws the index does not cover yet are classified on the fly.
+        """
+        indexed, entries = self._covered_entries()
+        draws = entries >> np.uint64(OUTCOME_BITS)
+        codes = (entries & np.uint64(OUTCOME_MASK)).astype(np.uint8)
+        count = self.count
+        if indexed < count:
+            tail = self.rules.classify_array(self._records[indexed:count])
+            hits = np.flatnonzero(tail != self.rules.no_jackpot)
+            draws = np.concatenate([draws, hits.astype(np.uint64) + np.uint64(indexed)])
+            codes = np.concatenate([codes, tail[hits]])
+        return draws, codes
+
+    def jackpots(self, outcome=None):
+        """
+        Lists the jackpots in draw order.
+
+        Args:
+        outcome (str, optional): Only list this outcome.
+
+        Returns:
+        list: (draw number, outcome name) pairs.
+        """
+        draws, codes = self.jackpot_entries()
+        if outcome is not None:
+            selected = codes == self.rules.outcome_names.index(outcome)
+            draws, codes = draws[selected], codes[selected]
+        names = self.rules.outcome_names
+        return [(draw, names[code]) for draw, code in zip(draws.tolist(), codes.tolist())]
+
+    def indexed_outcome(self, k):
+        """Returns the outcome the index holds for draw k, by binary search over the hits."""
+        word = self.draw(k)
+        indexed, entries = self._covered_entries()
+        if k >= indexed:
+            return self.rules.classify(word)
+        position = int(np.searchsorted(entries, np.uint64(k) << np.uint64(OUTCOME_BITS)))
+        if position < len(entries) and int(entries[position]) >> OUTCOME_BITS == k:
+            return self.rules.outcome_names[int(entries[position]) & OUTCOME_MASK]
+        return self.rules.outcome_names[self.rules.no_jackpot]
+
+    def audit(self, k):
+        """Returns draw k's word, registers, bonus register, outcome under the rules and outcome in the index."""
+        word = self.draw(k)
+        registers, bonus_register = parse_registers_from_32bit(word)
+        return word, registers, bonus_register, self.rules.classify(word), self.indexed_outcome(k)
+
+    def verify(self):
+        """Reclassifies every draw and checks the index against it. Returns a list of problems."""
+        draws, codes = self.jackpot_entries()
+        problems = []
+        expected_draws, expected_codes = [], []
+        for start in range(0, self.count, CHUNK_SIZE):
+            chunk = self.rules.classify_array(self._records[start:min(start + CHUNK_SIZE, self.count)])
+            hits = np.flatnonzero(chunk != self.rules.no_jackpot)
+            expected_draws.append(hits.astype(np.uint64) + np.uint64(start))
+            expected_codes.append(chunk[hits])
+        expected_draws = np.concatenate(expected_draws) if expected_draws else np.empty(0, dtype=np.uint64)
+        expected_codes = np.concatenate(expected_codes) if expected_codes else np.empty(0, dtype=np.uint8)
+        if not np.array_equal(draws, expected_draws) or not np.array_equal(codes, expected_codes):
+            missing = np.setdiff1d(expected_draws, draws)
+            extra = np.setdiff1d(draws, expected_draws)
+            problems.append(f"index holds {len(draws)} jackpots, the draws {len(expected_draws)} "
+                            f"({len(missing)} missing, {len(extra)} unexpected)")
+        return problems
+
+    def outcome_counts(self):
+        """Counts the draws of every outcome from the index alone."""
+        draws, codes = self.jackpot_entries()
+        hits = np.bincount(codes, minlength=len(self.rules.outcome_names)).tolist()
+        hits[self.rules.no_jackpot] = self.count - len(draws)
+        return dict(zip(self.rules.outcome_names, hits))
+
+def write_journal(path, num_draws, seed=None, chunk_size=CHUNK_SIZE):
+    """
+    Appends random draws to a journal. For a given seed, these are the draws bitslots_sim.write_draws() writes.
+
+    Args:
+    path (str): The journal file.
+    num_draws (int): The number of draws to append.
+    seed (int or numpy.random.SeedSequence, optional): Seed for the random generator.
+    chunk_size (int): The number of draws generated at a time.
+
+    Returns:
+    dict: Outcome name mapped to its number of hits among the appended draws.
+    """
+    from bitslots_sim import generate_draws
+
+    rng = np.random.default_rng(seed)
+    with DrawJournal(path, 'a') as journal:
+        before = journal.outcome_counts()
+        written = 0
+        while written < num_draws:
+            size = min(chunk_size, num_draws - written)
+            journal.append_many(generate_draws(rng, size))
+            written += size
+        return {name: hits - before[name] for name, hits in journal.outcome_counts().items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Write, replay and audit bit-pyramid slot machine draw journals.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    parser_write = subparsers.add_parser('write', help="append random draws")
+    parser_write.add_argument('journal')
+    parser_write.add_argument('--draws', type=int, required=True)
+    parser_write.add_argument('--seed', type=int)
+    parser_stats = subparsers.add_parser('stats', help="count the draws of every outcome")
+    parser_stats.add_argument('journal')
+    parser_draw = subparsers.add_parser('draw', help="show and audit individual draws")
+    parser_draw.add_argument('journal')
+    parser_draw.add_argument('numbers', type=int, nargs='+')
+    parser_jackpots = subparsers.add_parser('jackpots', help="list the jackpots")
+    parser_jackpots.add_argument('journal')
+    parser_jackpots.add_argument('--outcome', choices=JACKPOT_RULES.names)
+    parser_jackpots.add_argument('--limit', type=int, default=100)
+    parser_verify = subparsers.add_parser('verify', help="reclassify every draw and check the index")
+    parser_verify.add_argument('journal')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'write':
+        for name, hits in write_journal(args.journal, args.draws, args.seed).items():
+            print(f"{name:<32}{hits:>14}")
+        print(f"Appended {args.draws} draws to {args.journal}")
+    else:
+        with DrawJournal(args.journal) as journal:
+            if args.command == 'stats':
+                print(f"{journal.count} draws")
+                for name, hits in journal.outcome_counts().items():
+                    print(f"{name:<32}{hits:>14}")
+            elif args.command == 'draw':
+                for k in args.numbers:
+                    try:
+                        word, registers, bonus_register, outcome, indexed = journal.audit(k)
+                    except IndexError as e:
+                        print(e)
+                        raise SystemExit(1)
+                    status = 'matches the index' if outcome == indexed else f"but the index holds {indexed}"
+                    print(f"Draw {k}: {word:032b} registers {registers} bonus {bonus_register}: {outcome} ({status})")
+            elif args.command == 'jackpots':
+                jackpots = journal.jackpots(args.outcome)
+                for k, name in jackpots[:args.limit]:
+                    print(f"{k:>14}  {name}")
+                if len(jackpots) > args.limit:
+                    print(f"... {len(jackpots) - args.limit} more")
+                print(f"{len(jackpots)} jackpots in {journal.count} draws")
+            else:
+                problems = journal.verify()
+                print('\n'.join(problems) if problems else f"The index matches all {journal.count} draws")
+                if problems:
+                    raise SystemExit(1)
+    print(f"({time.perf_counter() - start:.2f}s)")
+
+if __name__ == "__main__":
+    main()
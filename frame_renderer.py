@@ -0,0 +1,72 @@
+"""
+Buffered full-screen frame renderer for the terminal scripts.
+
+Each frame is assembled into one buffer and written to the terminal in a single
+os.write() call. The screen is cleared with ANSI escape sequences instead of
+running `clear`/`cls` in a subprocess.
+
+In diff mode only the lines that differ from the previous frame are rewritten,
+using absolute cursor positioning. This assumes the terminal is at least as
+wide as the longest line, so that no line wraps.
+"""
+
+import os
+import sys
+
+CURSOR_HOME = '\x1b[H'
+CLEAR_SCREEN = '\x1b[2J'
+CLEAR_TO_END_OF_LINE = '\x1b[K'
+CLEAR_TO_END_OF_SCREEN = '\x1b[J'
+
+def move_cursor(row, column=1):
+    """Returns the escape sequence moving the cursor to a 1-based row and column."""
+    return f'\x1b[{row};{column}H'
+
+class FrameRenderer:
+    """
+    Writes whole frames of text to a terminal.
+
+    Args:
+    fd (int, optional): The file descriptor to write to. Defaults to stdout.
+    diff (bool): Only rewrite the lines that changed since the previous frame.
+    """
+
+    def __init__(self, fd=None, diff=False):
+        self.fd = sys.stdout.fileno() if fd is None else fd
+        self.diff = diff
+        self._previous = None
+
+    def _write(self, data):
+        # Anything still buffered in sys.stdout (such as an input() prompt) goes first
+        sys.stdout.flush()
+        view = memoryview(data.encode())
+        while view:
+            view = view[os.write(self.fd, view):]
+
+    def clear(self):
+        """Clears the screen and forgets the previous frame."""
+        self._previous = None
+        self._write(CURSOR_HOME + CLEAR_SCREEN)
+
+    def render(self, text):
+        """
+        Replaces the screen contents with a frame.
+
+        Args:
+        text (str): The frame, with lines separated by newlines.
+        """
+        lines = text.split('\n')
+        previous = self._previous
+        self._previous = lines
+
+        if not self.diff or previous is None:
+            self._write(CURSOR_HOME + CLEAR_SCREEN + text + '\n')
+            return
+
+        buffer = []
+        for row, line in enumerate(lines, start=1):
+            if row > len(previous) or previous[row - 1] != line:
+                buffer.append(move_cursor(row) + line + CLEAR_TO_END_OF_LINE)
+        # Park the cursor below the frame and wipe leftovers such as old prompts
+        buffer.append(move_cursor(len(lines) + 1) + CLEAR_TO_END_OF_SCREEN)
+        self._write(''.join(buffer))
@@ -0,0 +1,425 @@
+"""
+Declarative, precompiled jackpot rules for the bit-pyramid slot machine.
+
+A rule is a dict with a unique 'name', an optional 'priority' (lower numbers are
+checked first, ties keep their listed order) and one or more conditions. The
+rule wins if any of its conditions holds:
+
+- 'patterns': a list of (mask, value) pairs on the packed 32-bit word, matching
+  when word & mask == value.
+- 'registers': a dict mapping register names ('r0'..'r3', 'bonus') to the values
+  they may take: 'ones', 'zeros', a list of values or a predicate on the value.
+  With 'match': 'all' (the default) every listed register must hold, with
+  'match': 'any' one of them is enough.
+- 'words': an explicit list of winning words.
+- 'palindrome': True, won when the bits read the same in both directions in
+  display order (registers left to right, then the bonus register).
+
+JackpotRules compiles the rules once. Pattern and register conditions are split
+into terms whose constraints each fall within one 16-bit half of the word, and
+every term gets one bit in two 2^16-entry tables. A draw is classified in O(1)
+by and-ing the table entries of its two halves: the lowest set bit is the
+matching term with the highest priority. Word and palindrome conditions are
+dispatched through a dict of winning words. The same tables classify NumPy
+arrays of draws in bulk.
+"""
+
+import hashlib
+import json
+from array import array
+from collections import Counter, defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NO_JACKPOT = "No Jackpot"
+
+# (name, shift, width) of every register in the packed word, as in parse_registers_from_32bit()
+REGISTER_FIELDS = [('r0', 0, 7), ('r1', 7, 7), ('r2', 14, 7), ('r3', 21, 7), ('bonus', 28, 4)]
+
+WORD_BITS = 32
+SPLIT_BITS = 16
+SPLIT_MASK = (1 << SPLIT_BITS) - 1
+
+# Every term needs its own bit in the uint64 split tables
+MAX_TERMS = 64
+
+def _to_int(value):
+    """Reads an int, also accepting strings such as '0xFFFFFFFF' from JSON rule files."""
+    return int(value, 0) if isinstance(value, str) else int(value)
+
+def display_word(word):
+    """
+    Rearranges a packed word into display order: the registers from left to right
+    followed by the bonus register, most significant bit first.
+
+    Args:
+    word (int): The packed 32-bit word.
+
+    Returns:
+    int: The word in display order.
+    """
+    display = 0
+    for _, shift, width in REGISTER_FIELDS:
+        display = (display << width) | ((word >> shift) & ((1 << width) - 1))
+    return display
+
+def packed_word(display):
+    """
+    Packs a display-order word back into the register layout. Inverse of display_word().
+
+    Args:
+    display (int): The word in display order.
+
+    Returns:
+    int: The packed 32-bit word.
+    """
+    word = 0
+    for _, shift, width in reversed(REGISTER_FIELDS):
+        word |= (display & ((1 << width) - 1)) << shift
+        display >>= width
+    return word
+
+def _allowed_values(spec, width):
+    """Turns a register spec into the set of values the register may take."""
+    if spec == 'ones':
+        return {(1 << width) - 1}
+    if spec == 'zeros':
+        return {0}
+    if callable(spec):
+        return {value for value in range(1 << width) if spec(value)}
+    values = {_to_int(value) for value in spec}
+    if any(value < 0 or value >> width for value in values):
+        raise ValueError(f"Register values must fit in {width} bits: {sorted(values)}")
+    return values
+
+def _pattern_fields(mask, value):
+    """Turns a mask/value pair on the packed word into the allowed values of every register."""
+    if value & ~mask:
+        raise ValueError(f"Pattern value {value:#010x} has bits outside its mask {mask:#010x}")
+    fields = []
+    for _, shift, width in REGISTER_FIELDS:
+        field_mask = (mask >> shift) & ((1 << width) - 1)
+        field_value = (value >> shift) & field_mask
+        if field_mask:
+            fields.append({v for v in range(1 << width) if v & field_mask == field_value})
+        else:
+            fields.append(None)
+    return fields
+
+def _rule_terms(rule):
+    """Yields the conditions of a rule as lists of allowed values per register (None for any)."""
+    for mask, value in rule.get('patterns', []):
+        yield _pattern_fields(_to_int(mask) & 0xFFFFFFFF, _to_int(value))
+
+    registers = rule.get('registers')
+    if registers:
+        unknown = set(registers) - {name for name, _, _ in REGISTER_FIELDS}
+        if unknown:
+            raise ValueError(f"Unknown registers in rule {rule['name']}: {sorted(unknown)}")
+        fields = [
+            _allowed_values(registers[name], width) if name in registers else None
+            for name, _, width in REGISTER_FIELDS
+        ]
+        match = rule.get('match', 'all')
+        if match == 'all':
+            yield fields
+        elif match == 'any':
+            for i, allowed in enumerate(fields):
+                if allowed is not None:
+                    yield [allowed if j == i else None for j in range(len(fields))]
+        else:
+            raise ValueError(f"Unknown match mode in rule {rule['name']}: {match}")
+
+def _rule_words(rule):
+    """Yields the explicitly listed and palindromic winning words of a rule."""
+    for word in rule.get('words', []):
+        yield _to_int(word)
+    if rule.get('palindrome'):
+        half = WORD_BITS // 2
+        for high in range(1 << half):
+            low = int(f'{high:0{half}b}'[::-1], 2)
+            yield packed_word((high << half) | low)
+
+def _split_term(fields):
+    """
+    Splits a term into subterms whose constraints each lie within one 16-bit half.
+
+    A register straddling the split is expanded over the values of its low bits, so
+    every subterm fixes those bits and constrains the high bits independently.
+    """
+    low_half, high_half, straddling = [], [], None
+    for (_, shift, width), allowed in zip(REGISTER_FIELDS, fields):
+        if allowed is None:
+            continue
+        if shift + width <= SPLIT_BITS:
+            low_half.append((shift, width, allowed))
+        elif shift >= SPLIT_BITS:
+            high_half.append((shift - SPLIT_BITS, width, allowed))
+        else:
+            straddling = (shift, width, allowed)
+
+    if straddling is None:
+        return [(low_half, high_half)]
+
+    shift, width, allowed = straddling
+    low_width = SPLIT_BITS - shift
+    low_mask = (1 << low_width) - 1
+    subterms = []
+    for low in sorted({value & low_mask for value in allowed}):
+        highs = {value >> low_width for value in allowed if value & low_mask == low}
+        subterms.append((low_half + [(shift, low_width, {low})], high_half + [(0, width - low_width, highs)]))
+    return subterms
+
+def _half_values(constraints):
+    """Enumerates every 16-bit half value satisfying (shift, width, allowed) constraints."""
+    values = [0]
+    constrained = 0
+    for shift, width, allowed in constraints:
+        values = [value | (a << shift) for value in values for a in allowed]
+        constrained |= ((1 << width) - 1) << shift
+
+    # Every combination of the unconstrained bits is allowed
+    free = SPLIT_MASK & ~constrained
+    result = []
+    subset = free
+    while True:
+        result.extend(value | subset for value in values)
+        if subset == 0:
+            return result
+        subset = (subset - 1) & free
+
+def load_rules(path):
+    """
+    Loads a list of rules from a JSON file.
+
+    Args:
+    path (str): The JSON file holding a list of rule dicts.
+
+    Returns:
+    list: The rules, ready for JackpotRules.
+    """
+    with open(path) as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError(f"{path} must hold a list of rules")
+    return rules
+
+class JackpotRules:
+    """
+    A compiled set of jackpot rules.
+
+    Args:
+    rules (list): The rule dicts described in the module docstring.
+    """
+
+    def __init__(self, rules):
+        rules = sorted(rules, key=lambda rule: rule.get('priority', 0))
+        self.names = [rule['name'] for rule in rules]
+        duplicates = [name for name, count in Counter(self.names).items() if count > 1]
+        if duplicates:
+            raise ValueError(f"Duplicate rule names: {duplicates}")
+        if NO_JACKPOT in self.names:
+            raise ValueError(f"{NO_JACKPOT!r} is reserved for draws that match no rule")
+
+        self.outcome_names = self.names + [NO_JACKPOT]
+        self.no_jackpot = len(self.names)
+
+        self._low_table = array('Q', bytes(8 << SPLIT_BITS))
+        self._high_table = array('Q', bytes(8 << SPLIT_BITS))
+        self._term_codes = []
+        self._word_codes = {}
+        self._numpy_tables = None
+        # The listed words of every rule in their listed order, before priorities are applied
+        self._rule_words = [{} for _ in rules]
+
+        for code, rule in enumerate(rules):
+            conditions = 0
+            for fields in _rule_terms(rule):
+                conditions += 1
+                for low_half, high_half in _split_term(fields):
+                    if len(self._term_codes) == MAX_TERMS:
+                        raise ValueError(f"Rules compile to more than {MAX_TERMS} terms")
+                    # Terms are numbered in priority order, so the lowest set bit wins
+                    bit = 1 << len(self._term_codes)
+                    self._term_codes.append(code)
+                    for value in _half_values(low_half):
+                        self._low_table[value] |= bit
+                    for value in _half_values(high_half):
+                        self._high_table[value] |= bit
+            for word in _rule_words(rule):
+                conditions += 1
+                self._word_codes.setdefault(word, code)
+                self._rule_words[code][word] = None
+            if not conditions:
+                raise ValueError(f"Rule {rule['name']} has no conditions")
+
+    def _table_code(self, word):
+        """Classifies a word with the split tables only."""
+        bits = self._low_table[word & SPLIT_MASK] & self._high_table[word >> SPLIT_BITS]
+        if bits:
+            return self._term_codes[(bits & -bits).bit_length() - 1]
+        return self.no_jackpot
+
+    def classify_code(self, word):
+        """
+        Classifies a packed 32-bit word.
+
+        Args:
+        word (int): The packed 32-bit word.
+
+        Returns:
+        int: The index into outcome_names of the winning rule, or no_jackpot.
+        """
+        code = self._table_code(word)
+        if self._word_codes:
+            code = min(code, self._word_codes.get(word, code))
+        return code
+
+    def classify(self, word):
+        """Returns the name of the outcome of a packed 32-bit word."""
+        return self.outcome_names[self.classify_code(word)]
+
+    def winning_words(self, limit=None):
+        """
+        Lists the words every rule wins, rules in priority order. The words of a
+        rule follow the order of its conditions, as declared: patterns, then
+        registers, then listed words, with the words of one pattern or register
+        condition in increasing order.
+
+        Args:
+        limit (int, optional): List at most this many words per rule, which are
+            then the first found rather than the lowest of each condition.
+
+        Returns:
+        list: (word, name) pairs.
+        """
+        # The half values that allow every term, gathered in one pass over each table
+        low_values, high_values = defaultdict(list), defaultdict(list)
+        for table, values in ((self._low_table, low_values), (self._high_table, high_values)):
+            for value, bits in enumerate(table):
+                while bits:
+                    lowest = bits & -bits
+                    values[lowest.bit_length() - 1].append(value)
+                    bits ^= lowest
+
+        result = []
+        for code, name in enumerate(self.names):
+            # Terms are numbered in the order of the rule's conditions
+            won = {}
+            for term, term_code in enumerate(self._term_codes):
+                if term_code != code:
+                    continue
+                term_words = set()
+                for high in high_values[term]:
+                    if limit is not None and len(won) + len(term_words) >= limit:
+                        break
+                    for low in low_values[term]:
+                        word = (high << SPLIT_BITS) | low
+                        # Words that a rule with a higher priority also matches are not won by this one
+                        if self.classify_code(word) == code and word not in won:
+                            term_words.add(word)
+                won.update(dict.fromkeys(sorted(term_words)))
+            for word in self._rule_words[code]:
+                if self.classify_code(word) == code:
+                    won.setdefault(word)
+            result.extend((word, name) for word in list(won)[:limit])
+        return result
+
+    def fingerprint(self):
+        """Returns a digest of the compiled rules, which changes whenever any outcome could."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps([self.outcome_names, self._term_codes, sorted(self._word_codes.items())]).encode())
+        digest.update(self._low_table.tobytes())
+        digest.update(self._high_table.tobytes())
+        return digest.digest()
+
+    def classify_registers(self, registers, bonus_register):
+        """
+        Returns the name of the outcome of a register state.
+
+        Args:
+        registers (list): The list of four 7-bit registers.
+        bonus_register (int): The 4-bit bonus register.
+        """
+        word = 0
+        for (_, shift, width), value in zip(REGISTER_FIELDS, list(registers) + [bonus_register]):
+            if value < 0 or value >> width:
+                return NO_JACKPOT
+            word |= value << shift
+        return self.classify(word)
+
+    def _tables(self):
+        """Returns NumPy views of the compiled tables, built on first use."""
+        if np is None:
+            raise ImportError("NumPy is required to classify arrays of draws")
+        if self._numpy_tables is None:
+            words = np.array(sorted(self._word_codes), dtype=np.uint32)
+            low_table = np.frombuffer(self._low_table, dtype=np.uint64)
+            self._numpy_tables = (
+                low_table,
+                # A compact mask of the low halves that can match a term at all
+                low_table != 0,
+                np.frombuffer(self._high_table, dtype=np.uint64),
+                np.array(self._term_codes, dtype=np.uint8),
+                words,
+                np.array([self._word_codes[word] for word in words.tolist()], dtype=np.uint8),
+            )
+        return self._numpy_tables
+
+    def classify_array(self, draws):
+        """
+        Classifies an array of packed 32-bit words.
+
+        Args:
+        draws (numpy.ndarray): A one-dimensional uint32 array of draws.
+
+        Returns:
+        numpy.ndarray: A uint8 array holding the index into outcome_names of every draw.
+        """
+        low_table, low_matches, high_table, term_codes, words, word_codes = self._tables()
+        draws = np.asarray(draws, dtype=np.uint32).ravel()
+        codes = np.full(draws.shape, self.no_jackpot, dtype=np.uint8)
+
+        # Only draws whose low half can match some term need the high half looked up
+        candidates = np.flatnonzero(np.take(low_matches, draws & SPLIT_MASK))
+        if candidates.size:
+            bits = low_table[draws[candidates] & SPLIT_MASK] & high_table[draws[candidates] >> SPLIT_BITS]
+            matched = bits != 0
+            hits = bits[matched]
+            lowest = hits & (~hits + np.uint64(1))
+            # The lowest set bit is a power of two, which float64 represents exactly
+            codes[candidates[matched]] = term_codes[np.log2(lowest.astype(np.float64)).astype(np.intp)]
+
+        if words.size:
+            positions = np.searchsorted(words, draws).clip(max=words.size - 1)
+            listed = words[positions] == draws
+            codes[listed] = np.minimum(codes[listed], word_codes[positions[listed]])
+        return codes
+
+    def count_outcomes(self):
+        """
+        Counts exactly how many of the 2^32 words every outcome wins.
+
+        Half values are grouped by their table entry, so the cost depends on the
+        number of distinct entries rather than on the 2^32 words.
+
+        Returns:
+        dict: Outcome name mapped to its number of winning words.
+        """
+        counts = [0] * len(self.outcome_names)
+        high_groups = Counter(self._high_table)
+        for low_bits, low_count in Counter(self._low_table).items():
+            for high_bits, high_count in high_groups.items():
+                bits = low_bits & high_bits
+                code = self._term_codes[(bits & -bits).bit_length() - 1] if bits else self.no_jackpot
+                counts[code] += low_count * high_count
+
+        for word, code in self._word_codes.items():
+            table_code = self._table_code(word)
+            if code < table_code:
+                counts[table_code] -= 1
+                counts[code] += 1
+        return dict(zip(self.outcome_names, counts))
@@ -0,0 +1,381 @@
+"""
+Lightweight hot-path instrumentation for the interactive scripts.
+
+Named counters, timers and histograms are recorded into a process-wide registry
+that is disabled by default. While disabled, timer() returns one shared no-op
+context manager and count()/observe() return after a single flag check, so the
+instrumented loops cost next to nothing.
+
+Histograms bucket values on a log scale with four buckets per power of two
+(about 19% wide), so any percentile can be estimated from a fixed amount of
+memory however many values are recorded. They export as JSON (with count, sum,
+min, max and p50/p90/p99) or in the Prometheus text format, with cumulative
+buckets at every power of two, for the node_exporter textfile collector.
+
+An opt-in sampling profiler thread periodically records the stack of every
+other thread, and aggregates them in collapsed form ("outer;inner count" per
+line) for flame graph tools, or hands each sample to a callback.
+
+Usage in a script:
+
+    import metrics
+
+    parser = argparse.ArgumentParser()
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    with metrics.session(args.metrics, args.profile):
+        with metrics.timer('stage'):
+            ...
+"""
+
+import bisect
+import contextlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+# Buckets per power of two, and the smallest and largest bucketed values (seconds for timers)
+SUB_BUCKETS = 4
+MIN_VALUE = 2.0 ** -20
+MAX_VALUE = 2.0 ** 12
+BUCKET_COUNT = int(math.log2(MAX_VALUE / MIN_VALUE)) * SUB_BUCKETS
+
+# Upper bound of every bucket; values above the last one are counted in the overflow bucket
+BUCKET_BOUNDS = [MIN_VALUE * 2 ** ((i + 1) / SUB_BUCKETS) for i in range(BUCKET_COUNT)]
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+# Seconds between the stack samples of the sampling profiler
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+class Histogram:
+    """
+    Log-scale histogram of non-negative values.
+
+    Attributes:
+    counts (list): Values per bucket; the last entry counts values above BUCKET_BOUNDS[-1].
+    count (int), total (float), minimum (float), maximum (float): Totals over all values.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (BUCKET_COUNT + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+    def percentile(self, percent):
+        """Estimates a percentile by interpolating within its bucket, clamped to the observed range."""
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKET_BOUNDS[index - 1] if index else 0.0
+                upper = BUCKET_BOUNDS[index] if index < BUCKET_COUNT else self.maximum
+                estimate = lower + (upper - lower) * max(rank - seen, 0) / bucket_count
+                return min(max(estimate, self.minimum), self.maximum)
+            seen += bucket_count
+        return self.maximum
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES):
+        summary = {'count': self.count, 'sum': self.total,
+                   'min': self.minimum if self.count else None, 'max': self.maximum if self.count else None}
+        summary.update((f"p{percent}", self.percentile(percent)) for percent in percentiles)
+        return summary
+
+class _NullTimer:
+    """The timer handed out while the registry is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ('registry', 'key', 'start')
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+def metric_key(name, labels):
+    if len(labels) < 2:
+        return (name, tuple(labels.items()))
+    return (name, tuple(sorted(labels.items())))
+
+class Registry:
+    """
+    Counters and histograms by name and labels.
+
+    Args:
+    enabled (bool): Whether recording starts enabled.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.stacks = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def count(self, name, amount=1, **labels):
+        """Adds to a counter."""
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Records a value in a histogram."""
+        if self.enabled:
+            self._observe(metric_key(name, labels), value)
+
+    def _observe(self, key, value):
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def timer(self, name, **labels):
+        """Returns a context manager recording its duration in seconds into a histogram."""
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, metric_key(name, labels))
+
+    def timed(self, name, **labels):
+        """Decorates a function to time every call, checking whether the registry is enabled per call."""
+        def decorate(function):
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Timer(self, metric_key(name, labels)):
+                    return function(*args, **kwargs)
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            wrapper.__wrapped__ = function
+            return wrapper
+        return decorate
+
+    def timed_iter(self, name, iterable, **labels):
+        """Times every step of an iterator, e.g. the lazy construction of each pyramid row."""
+        if not self.enabled:
+            return iter(iterable)
+        return self._timed_iter(metric_key(name, labels), iter(iterable))
+
+    def _timed_iter(self, key, iterator):
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self._observe(key, time.perf_counter() - start)
+            yield item
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.stacks.clear()
+
+    def start_sampler(self, interval=DEFAULT_SAMPLE_INTERVAL, callback=None):
+        """
+        Starts the sampling profiler thread.
+
+        Args:
+        interval (float): Seconds between samples.
+        callback (callable, optional): Called with (thread id, frame) for every
+            sampled thread instead of aggregating collapsed stacks.
+        """
+        if self._sampler is not None:
+            return
+        stop = threading.Event()
+        sampler_id = []
+
+        def sample():
+            sampler_id.append(threading.get_ident())
+            while not stop.wait(interval):
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == sampler_id[0]:
+                        continue
+                    if callback is not None:
+                        callback(thread_id, frame)
+                        continue
+                    names = []
+                    while frame is not None:
+                        code = frame.f_code
+                        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    stack = ';'.join(reversed(names))
+                    with self._lock:
+                        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+        thread = threading.Thread(target=sample, name='metrics-sampler', daemon=True)
+        self._sampler = (thread, stop)
+        thread.start()
+
+    def stop_sampler(self):
+        if self._sampler is None:
+            return
+        thread, stop = self._sampler
+        stop.set()
+        thread.join()
+        self._sampler = None
+
+    def to_dict(self, percentiles=DEFAULT_PERCENTILES):
+        def entry(key, value):
+            name, labels = key
+            return dict({'name': name, 'labels': dict(labels)}, **value)
+        with self._lock:
+            return {
+                'created': time.time(),
+                'counters': [entry(key, {'value': value}) for key, value in sorted(self.counters.items())],
+                'histograms': [entry(key, histogram.summary(percentiles))
+                               for key, histogram in sorted(self.histograms.items())],
+            }
+
+    def to_prometheus(self, prefix=''):
+        """Renders the counters and histograms in the Prometheus text exposition format."""
+        def metric_name(name):
+            return prefix + ''.join(char if char.isalnum() else '_' for char in name)
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+            return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = metric_name(name) + '_total'
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{label_text(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = metric_name(name)
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                # Only the bucket bounds at powers of two are exported, which keeps the series count small
+                for index, bucket_count in enumerate(histogram.counts[:BUCKET_COUNT]):
+                    cumulative += bucket_count
+                    if (index + 1) % SUB_BUCKETS == 0:
+                        lines.append(f"{metric}_bucket{label_text(labels, [('le', repr(BUCKET_BOUNDS[index]))])} "
+                                     f"{cumulative}")
+                lines.append(f"{metric}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{metric}_sum{label_text(labels)} {histogram.total!r}")
+                lines.append(f"{metric}_count{label_text(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Writes the metrics as Prometheus text for a .prom path, or as JSON otherwise.
+        The file is replaced atomically, as the textfile collector expects.
+        """
+        text = self.to_prometheus() if path.endswith('.prom') else json.dumps(self.to_dict(), indent=1)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            f.write(text)
+        os.replace(temporary, path)
+
+    def write_stacks(self, path):
+        """Writes the profiler samples as collapsed stacks, most sampled first."""
+        with self._lock:
+            stacks = sorted(self.stacks.items(), key=lambda item: -item[1])
+        with open(path, 'w') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks)
+
+    def format_summary(self):
+        """Renders the histograms as a latency table and the counters below it."""
+        data = self.to_dict()
+        lines = [f"{'Metric':<40} {'Count':>8} {'p50':>10} {'p90':>10} {'p99':>10} {'Max':>10}"]
+        for entry in data['histograms']:
+            label = ','.join(f"{key}={value}" for key, value in entry['labels'].items())
+            lines.append(f"{entry['name'] + (f'{{{label}}}' if label else ''):<40} {entry['count']:>8}"
+                         + ''.join(f" {entry[key] * 1e3:>8.3f}ms" for key in ('p50', 'p90', 'p99', 'max')))
+        for entry in data['counters']:
+            label = ','.join(f"{key}={value}" for key, value in entry['labels'].items())
+            lines.append(f"{entry['name'] + (f'{{{label}}}' if label else ''):<40} {entry['value']:>8}")
+        return '\n'.join(lines)
+
+# The registry the scripts record into
+REGISTRY = Registry()
+
+count = REGISTRY.count
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+timed_iter = REGISTRY.timed_iter
+
+def enabled():
+    return REGISTRY.enabled
+
+def enable():
+    REGISTRY.enabled = True
+
+def disable():
+    REGISTRY.enabled = False
+
+def add_arguments(parser):
+    """Adds the --metrics and --profile options of session() to an argparse parser."""
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="record stage timings and write them on exit (.prom for Prometheus text, else JSON)")
+    parser.add_argument('--profile', metavar='PATH', help="sample the stacks and write them collapsed on exit")
+
+@contextlib.contextmanager
+def session(metrics_path=None, profile_path=None, interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    Enables recording while metrics or profiling were asked for, and writes them
+    out on exit, including after Ctrl+C.
+    """
+    if not metrics_path and not profile_path:
+        yield REGISTRY
+        return
+    if metrics_path:
+        enable()
+    if profile_path:
+        REGISTRY.start_sampler(interval)
+    try:
+        yield REGISTRY
+    finally:
+        REGISTRY.stop_sampler()
+        if metrics_path:
+            disable()
+            REGISTRY.write(metrics_path)
+            print(f"\n{REGISTRY.format_summary()}\nMetrics written to {metrics_path}", file=sys.stderr)
+        if profile_path:
+            REGISTRY.write_stacks(profile_path)
+            print(f"Profile samples written to {profile_path}", file=sys.stderr)
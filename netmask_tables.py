@@ -0,0 +1,49 @@
+"""
+Precomputed IPv4 netmask and octet tables.
+
+Every subnet mask the trainer can show is one of 33 prefix lengths (/0 to /32),
+and every address is made of octets 0-255, so their representations are
+computed once here instead of building ipaddress objects or formatting strings
+for every address:
+
+- MASK_INTS, MASK_PACKED, MASK_DOTTED and MASK_BINARY, indexed by prefix length
+- PREFIX_BY_MASK, mapping a mask (packed bytes or int) back to its prefix length
+- OCTET_BINARY and OCTET_DECIMAL, indexed by octet value
+"""
+
+PREFIX_LENGTHS = range(33)
+
+# Octet value -> '{:08b}' and decimal strings
+OCTET_BINARY = [f'{octet:08b}' for octet in range(256)]
+OCTET_DECIMAL = [str(octet) for octet in range(256)]
+
+def address_octets(address):
+    """Splits a 32-bit address into its four octets, most significant first."""
+    return (address >> 24, (address >> 16) & 0xFF, (address >> 8) & 0xFF, address & 0xFF)
+
+def format_binary(octets):
+    """Formats octets as space-separated 8-bit binary strings."""
+    return ' '.join([OCTET_BINARY[octet] for octet in octets])
+
+def format_dotted(octets):
+    """Formats octets in dotted decimal notation."""
+    return '.'.join([OCTET_DECIMAL[octet] for octet in octets])
+
+def format_address_lines(address):
+    """Formats a 32-bit address as its binary line and its dotted decimal line, joined by a newline."""
+    a, b, c, d = address >> 24, (address >> 16) & 0xFF, (address >> 8) & 0xFF, address & 0xFF
+    return (f'{OCTET_BINARY[a]} {OCTET_BINARY[b]} {OCTET_BINARY[c]} {OCTET_BINARY[d]}\n'
+            f'{OCTET_DECIMAL[a]}.{OCTET_DECIMAL[b]}.{OCTET_DECIMAL[c]}.{OCTET_DECIMAL[d]}')
+
+# Prefix length -> mask as an int, packed bytes, dotted string and binary string
+MASK_INTS = [(0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF for prefix in PREFIX_LENGTHS]
+MASK_PACKED = [mask.to_bytes(4, 'big') for mask in MASK_INTS]
+MASK_DOTTED = [format_dotted(address_octets(mask)) for mask in MASK_INTS]
+MASK_BINARY = [format_binary(address_octets(mask)) for mask in MASK_INTS]
+
+# Mask (packed bytes or int) -> prefix length
+PREFIX_BY_MASK = {}
+for _prefix in PREFIX_LENGTHS:
+    PREFIX_BY_MASK[MASK_PACKED[_prefix]] = _prefix
+    PREFIX_BY_MASK[MASK_INTS[_prefix]] = _prefix
+del _prefix
@@ -16,20 +16,43 @@ Features:
 - Clears the screen between each presentation to focus on the same spots.
 - Indicates when the IP address is within a private IP space.
 - Ensures a private IP address is generated every 5th turn.
+- Optionally names the special-purpose or internal range of each address, from a
+  prefix table file (see prefix_index.py and ipv4-special-ranges.txt).
 - Allows users to generate new IP addresses and subnets by pressing Enter.
+- Optionally records the time spent generating, classifying, masking, formatting
+  and printing each turn (see metrics.py).
 
 Usage:
 Run the script in a terminal. Press Enter to generate a new IP address and subnet mask,
 or use Ctrl+C to exit the loop.
 
+    python network-sim.py
+    python network-sim.py --prefixes ipv4-special-ranges.txt
+    python network-sim.py --metrics turns.prom
+
 Author: [Your Name]
 Date: [Current Date]
 """
 
+import argparse
 import random
-import ipaddress
 import os
 
+import metrics
+from netmask_tables import (MASK_BINARY, MASK_DOTTED, MASK_INTS, MASK_PACKED, PREFIX_BY_MASK,
+                            format_address_lines, format_dotted)
+from prefix_index import NO_MATCH, PRIVATE_PREFIXES, PrefixIndex
+
+PRIVATE_INDEX = PrefixIndex(PRIVATE_PREFIXES)
+
+PRIVATE_NOTE = "\n\nNote: This IP address is within a private IP range."
+
+# Prefix length -> the whole subnet mask section of format_ip_info()
+MASK_SECTIONS = [f"\n\nSubnet Mask (CIDR /{cidr}):\n{MASK_BINARY[cidr]}\n{MASK_DOTTED[cidr]}" for cidr in range(33)]
+
+# Histogram of the time spent in each stage of a turn, labelled by stage
+STAGE_SECONDS = 'network_sim.stage_seconds'
+
 def clear_screen():
     """Clears the terminal screen."""
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -50,7 +73,7 @@ def generate_random_private_ip():
 def generate_random_subnet_mask():
     """Generates a random subnet mask with a length between /8 and /30."""
     mask_length = random.randint(8, 30)
-    return ipaddress.IPv4Network((0, mask_length)).netmask.packed
+    return MASK_PACKED[mask_length]
 
 def generate_private_subnet_mask(ip):
     """
@@ -70,68 +93,82 @@ def generate_private_subnet_mask(ip):
         mask_length = random.randint(16, 30)  # Class C private range
     else:
         mask_length = random.randint(8, 30)  # Public IP
-    return ipaddress.IPv4Network((0, mask_length)).netmask.packed
+    return MASK_PACKED[mask_length]
+
+def ip_to_int(ip):
+    """Packs an IP address given as a list of 4 octets into a 32-bit int."""
+    return (ip[0] << 24) | (ip[1] << 16) | (ip[2] << 8) | ip[3]
+
+def is_private_ip(ip):
+    """Checks whether an IP address lies in a private (RFC 1918) range."""
+    return PRIVATE_INDEX.lookup(ip_to_int(ip)) != NO_MATCH
 
 def format_ip(ip):
     """Formats an IP address as a string with periods between octets."""
-    return '.'.join(map(str, ip))
+    return format_dotted(ip)
 
 def format_subnet_mask(subnet_mask):
     """Formats a subnet mask as a string with periods between octets."""
-    return '.'.join(str(octet) for octet in subnet_mask)
+    return MASK_DOTTED[PREFIX_BY_MASK[bytes(subnet_mask)]]
 
-def display_ip_info(ip, subnet_mask, turn_counter):
+def format_ip_info(ip, subnet_mask, turn_counter, ranges=None):
     """
-    Displays IP address information in binary and decimal formats.
+    Renders IP address information in binary and decimal formats.
 
     Parameters:
     ip (list): The IP address as a list of 4 octets.
     subnet_mask (bytes): The subnet mask in binary format.
     turn_counter (int): The current turn counter.
-    """
-    cidr = sum(bin(octet).count('1') for octet in subnet_mask)
-    network = ipaddress.IPv4Network(f'{ip[0]}.{ip[1]}.{ip[2]}.{ip[3]}/{cidr}', strict=False)
-
-    # Check if the IP is within a private range
-    is_private = (ip[0] == 10) or (ip[0] == 172 and 16 <= ip[1] <= 31) or (ip[0] == 192 and ip[1] == 168)
-
-    print(f"\nTurn: {turn_counter}")
-    if is_private:
-        print("\nNote: This IP address is within a private IP range.")
-
-    print("\nIP Address:")
-    print(' '.join(f'{octet:08b}' for octet in ip))
-    print(format_ip(ip))
-
-    print("\nSubnet Mask (CIDR /{}):".format(cidr))
-    print(' '.join(f'{octet:08b}' for octet in subnet_mask))
-    print(format_subnet_mask(subnet_mask))
-
-    print("\nNetwork Address:")
-    print(' '.join(f'{octet:08b}' for octet in network.network_address.packed))
-    print(network.network_address)
-
-    print("\nClient ID/Address:")
-    print(' '.join(f'{octet:08b}' for octet in ip))
-    print(format_ip(ip))
+    ranges (PrefixIndex, optional): Named ranges; the range of the address is shown if it has one.
 
-    print("\nBroadcast Address:")
-    print(' '.join(f'{octet:08b}' for octet in network.broadcast_address.packed))
-    print(network.broadcast_address)
-
-    print("\nFirst Addressable IP:")
-    first_address = list(network.network_address.packed)
-    first_address[-1] += 1
-    print(' '.join(f'{octet:08b}' for octet in first_address))
-    print(network.network_address + 1)
+    Returns:
+    str: The rendered information, one line per printed line.
+    """
+    cidr = PREFIX_BY_MASK[bytes(subnet_mask)]
+    mask = MASK_INTS[cidr]
+    address = ip_to_int(ip)
+    network_address = address & mask
+    broadcast_address = network_address | (mask ^ 0xFFFFFFFF)
+    ip_lines = format_address_lines(address)
+
+    # The whole block is one template of precomputed pieces, without a list of lines to join
+    note = PRIVATE_NOTE if PRIVATE_INDEX.lookup(address) != NO_MATCH else ''
+    range_name = ranges.classify(address) if ranges is not None else None
+    if range_name is not None:
+        note += f"\n\nAddress Range: {range_name}"
+    return (f"\nTurn: {turn_counter}{note}\n\nIP Address:\n{ip_lines}{MASK_SECTIONS[cidr]}"
+            f"\n\nNetwork Address:\n{format_address_lines(network_address)}"
+            f"\n\nClient ID/Address:\n{ip_lines}"
+            f"\n\nBroadcast Address:\n{format_address_lines(broadcast_address)}"
+            f"\n\nFirst Addressable IP:\n{format_address_lines(network_address + 1)}"
+            f"\n\nLast Addressable IP:\n{format_address_lines(broadcast_address - 1)}")
+
+def display_ip_info(ip, subnet_mask, turn_counter, ranges=None):
+    """
+    Displays IP address information in binary and decimal formats.
 
-    print("\nLast Addressable IP:")
-    last_address = list(network.broadcast_address.packed)
-    last_address[-1] -= 1
-    print(' '.join(f'{octet:08b}' for octet in last_address))
-    print(network.broadcast_address - 1)
+    Parameters:
+    ip (list): The IP address as a list of 4 octets.
+    subnet_mask (bytes): The subnet mask in binary format.
+    turn_counter (int): The current turn counter.
+    ranges (PrefixIndex, optional): Named ranges, as for format_ip_info().
+    """
+    if not metrics.REGISTRY.enabled:
+        # Uninstrumented runs skip even the no-op timers
+        print(format_ip_info(ip, subnet_mask, turn_counter, ranges))
+        return
+    with metrics.timer(STAGE_SECONDS, stage='format'):
+        text = format_ip_info(ip, subnet_mask, turn_counter, ranges)
+    with metrics.timer(STAGE_SECONDS, stage='print'):
+        print(text)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IP address and subnet mask trainer.")
+    parser.add_argument('--prefixes', help="prefix table file naming the range of each address")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    ranges = PrefixIndex.from_file(args.prefixes) if args.prefixes else None
+
     # Initialize counter
     turn_counter = 0
 
@@ -141,30 +178,36 @@ if __name__ == "__main__":
     subnet_mask = generate_private_subnet_mask(ip_address)
 
     # Display the initial IP information
-    display_ip_info(ip_address, subnet_mask, turn_counter)
+    display_ip_info(ip_address, subnet_mask, turn_counter, ranges)
     input("\nPress Enter to generate a new IP address and subnet...")
 
-    while True:
-        # Clear the screen
-        clear_screen()
-
-        # Increment the turn counter
-        turn_counter += 1
-
-        # Generate a random IP address, ensuring a private IP every 5th turn
-        if turn_counter % 5 == 0:
-            ip_address = generate_random_private_ip()
-        else:
-            ip_address = generate_random_ip()
-
-        # Determine if the IP is in a private range and generate an appropriate subnet mask
-        if (ip_address[0] == 10) or (ip_address[0] == 172 and 16 <= ip_address[1] <= 31) or (ip_address[0] == 192 and ip_address[1] == 168):
-            subnet_mask = generate_private_subnet_mask(ip_address)
-        else:
-            subnet_mask = generate_random_subnet_mask()
-
-        # Display IP information
-        display_ip_info(ip_address, subnet_mask, turn_counter)
-
-        # Prompt to generate another IP
-        input("\nPress Enter to generate a new IP address and subnet, or Ctrl+C to exit...")
+    with metrics.session(args.metrics, args.profile):
+        while True:
+            # Clear the screen
+            clear_screen()
+
+            # Increment the turn counter
+            turn_counter += 1
+
+            # Generate a random IP address, ensuring a private IP every 5th turn
+            with metrics.timer(STAGE_SECONDS, stage='generate'):
+                if turn_counter % 5 == 0:
+                    ip_address = generate_random_private_ip()
+                else:
+                    ip_address = generate_random_ip()
+
+            # Determine if the IP is in a private range and generate an appropriate subnet mask
+            with metrics.timer(STAGE_SECONDS, stage='classify'):
+                private = is_private_ip(ip_address)
+            metrics.count('network_sim.turns', private=private)
+            with metrics.timer(STAGE_SECONDS, stage='mask'):
+                if private:
+                    subnet_mask = generate_private_subnet_mask(ip_address)
+                else:
+                    subnet_mask = generate_random_subnet_mask()
+
+            # Display IP information
+            display_ip_info(ip_address, subnet_mask, turn_counter, ranges)
+
+            # Prompt to generate another IP
+            input("\nPress Enter to generate a new IP address and subnet, or Ctrl+C to exit...")
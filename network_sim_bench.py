@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Before/after microbenchmark of the per-address rendering in network-sim.py.
+
+The original display_ip_info() built an ipaddress.IPv4Network per address,
+recovered the CIDR by counting bits and formatted every octet with f-strings.
+It is kept here as the "before" implementation and timed against the current
+table-driven format_ip_info(), after checking that both render the same text.
+
+Usage:
+    python network_sim_bench.py --addresses 20000
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import ipaddress
+import os
+import random
+import time
+
+def load_network_sim():
+    """Imports network-sim.py, whose file name is not a valid module name."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'network-sim.py')
+    spec = importlib.util.spec_from_file_location('network_sim', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def display_ip_info_reference(ip, subnet_mask, turn_counter):
+    """The original ipaddress and f-string based display_ip_info()."""
+    cidr = sum(bin(octet).count('1') for octet in subnet_mask)
+    network = ipaddress.IPv4Network(f'{ip[0]}.{ip[1]}.{ip[2]}.{ip[3]}/{cidr}', strict=False)
+
+    is_private = (ip[0] == 10) or (ip[0] == 172 and 16 <= ip[1] <= 31) or (ip[0] == 192 and ip[1] == 168)
+
+    print(f"\nTurn: {turn_counter}")
+    if is_private:
+        print("\nNote: This IP address is within a private IP range.")
+
+    print("\nIP Address:")
+    print(' '.join(f'{octet:08b}' for octet in ip))
+    print('.'.join(map(str, ip)))
+
+    print("\nSubnet Mask (CIDR /{}):".format(cidr))
+    print(' '.join(f'{octet:08b}' for octet in subnet_mask))
+    print('.'.join(str(octet) for octet in subnet_mask))
+
+    print("\nNetwork Address:")
+    print(' '.join(f'{octet:08b}' for octet in network.network_address.packed))
+    print(network.network_address)
+
+    print("\nClient ID/Address:")
+    print(' '.join(f'{octet:08b}' for octet in ip))
+    print('.'.join(map(str, ip)))
+
+    print("\nBroadcast Address:")
+    print(' '.join(f'{octet:08b}' for octet in network.broadcast_address.packed))
+    print(network.broadcast_address)
+
+    print("\nFirst Addressable IP:")
+    first_address = network.network_address + 1
+    print(' '.join(f'{octet:08b}' for octet in first_address.packed))
+    print(first_address)
+
+    print("\nLast Addressable IP:")
+    last_address = network.broadcast_address - 1
+    print(' '.join(f'{octet:08b}' for octet in last_address.packed))
+    print(last_address)
+
+def make_inputs(network_sim, count, seed):
+    """Generates trainer inputs the same way as the network-sim.py main loop."""
+    random.seed(seed)
+    inputs = []
+    for turn in range(1, count + 1):
+        ip = network_sim.generate_random_private_ip() if turn % 5 == 0 else network_sim.generate_random_ip()
+        inputs.append((ip, network_sim.generate_private_subnet_mask(ip), turn))
+    return inputs
+
+def render_reference(inputs):
+    """Renders every input with the original implementation, capturing its output."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        for ip, subnet_mask, turn in inputs:
+            display_ip_info_reference(ip, subnet_mask, turn)
+    return out.getvalue()
+
+def render_current(network_sim, inputs):
+    """Renders every input with the current implementation."""
+    return ''.join(network_sim.format_ip_info(ip, subnet_mask, turn) + '\n' for ip, subnet_mask, turn in inputs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark network-sim.py address rendering.")
+    parser.add_argument('--addresses', type=int, default=20000, help="number of addresses to render")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the generated addresses")
+    args = parser.parse_args()
+
+    network_sim = load_network_sim()
+    inputs = make_inputs(network_sim, args.addresses, args.seed)
+
+    if render_reference(inputs) != render_current(network_sim, inputs):
+        raise SystemExit("The current rendering differs from the original")
+
+    timings = {}
+    for name, render in [('before', render_reference), ('after', lambda i: render_current(network_sim, i))]:
+        start = time.perf_counter()
+        render(inputs)
+        timings[name] = (time.perf_counter() - start) / args.addresses
+
+    print(f"Rendered {args.addresses} addresses (outputs identical)")
+    print(f"before: {timings['before'] * 1e6:8.2f} us/address")
+    print(f"after:  {timings['after'] * 1e6:8.2f} us/address")
+    print(f"speedup: {timings['before'] / timings['after']:.1f}x")
+
+if __name__ == "__main__":
+    main()
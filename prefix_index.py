@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Longest-Prefix-Match Index
+
+Classifies IPv4 addresses against a table of labelled prefixes, such as the
+RFC special-purpose ranges or a list of internal allocations. When prefixes
+nest, the longest (most specific) matching prefix wins.
+
+Instead of walking a trie bit by bit, the table is flattened once into sorted,
+disjoint address intervals, each tagged with the prefix that owns it. A lookup
+is then a short binary search over the interval starts, bounded by a table of
+the intervals overlapping each /16:
+
+- PrefixIndex.lookup() and classify() use bisect on a list of ints (pure Python);
+- PrefixIndex.lookup_array() and classify_array() run the search over whole
+  uint32 arrays with NumPy, as produced by subnet_batch and subnet_dataset.
+
+Prefix table files hold one prefix per line in CIDR notation, optionally
+followed by a label; '#' starts a comment:
+
+    10.0.0.0/8        Private-Use (RFC 1918)
+    10.20.0.0/16      lab network
+
+Usage:
+    python prefix_index.py --table ipv4-special-ranges.txt 10.1.2.3 127.0.0.1
+    python prefix_index.py --random-prefixes 200000 --lookups 1000000
+"""
+
+import argparse
+import random
+import time
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from netmask_tables import MASK_INTS, address_octets, format_dotted
+
+# Code of addresses that match no prefix
+NO_MATCH = -1
+
+# Lookups first jump to the bucket of the top BUCKET_BITS address bits, then
+# binary search only the intervals overlapping that bucket
+BUCKET_BITS = 16
+
+# The private (RFC 1918) ranges checked by network-sim.py
+PRIVATE_PREFIXES = [
+    (0x0A000000, 8, 'Private-Use (RFC 1918)'),   # 10.0.0.0/8
+    (0xAC100000, 12, 'Private-Use (RFC 1918)'),  # 172.16.0.0/12
+    (0xC0A80000, 16, 'Private-Use (RFC 1918)'),  # 192.168.0.0/16
+]
+
+def parse_address(text):
+    """
+    Parses a dotted decimal IPv4 address into a 32-bit int.
+
+    Parameters:
+    text (str): The address, e.g. '192.168.1.1'.
+
+    Returns:
+    int: The address.
+    """
+    octets = text.split('.')
+    if len(octets) != 4 or not all(octet.isdigit() and int(octet) <= 255 for octet in octets):
+        raise ValueError(f"Invalid IPv4 address: {text!r}")
+    address = 0
+    for octet in octets:
+        address = (address << 8) | int(octet)
+    return address
+
+def parse_prefix(text):
+    """
+    Parses a prefix in CIDR notation. Host bits are cleared, and an address
+    without a length is a /32.
+
+    Parameters:
+    text (str): The prefix, e.g. '172.16.0.0/12'.
+
+    Returns:
+    tuple: The network address as an int and the prefix length.
+    """
+    address, _, length = text.partition('/')
+    if length and not (length.isdigit() and int(length) <= 32):
+        raise ValueError(f"Invalid prefix length in {text!r}")
+    prefix = int(length) if length else 32
+    return parse_address(address) & MASK_INTS[prefix], prefix
+
+def format_prefix(network, prefix):
+    """Formats a network address and prefix length in CIDR notation."""
+    return f'{format_dotted(address_octets(network))}/{prefix}'
+
+def load_prefix_table(path):
+    """
+    Reads a prefix table file.
+
+    Parameters:
+    path (str): The file to read.
+
+    Returns:
+    list: (network, prefix length, label) tuples. Prefixes without a label are
+    labelled with their CIDR notation.
+    """
+    entries = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split(None, 1)
+            if not fields:
+                continue
+            try:
+                network, prefix = parse_prefix(fields[0])
+            except ValueError as error:
+                raise ValueError(f"{path}:{line_number}: {error}") from None
+            label = fields[1].strip() if len(fields) > 1 else format_prefix(network, prefix)
+            entries.append((network, prefix, label))
+    return entries
+
+def save_prefix_table(path, entries):
+    """
+    Writes (network, prefix length, label) tuples as a prefix table file.
+
+    Parameters:
+    path (str): The file to write.
+    entries (iterable): The prefixes to write.
+    """
+    with open(path, 'w') as f:
+        f.writelines(f'{format_prefix(network, prefix)}\t{label}\n' for network, prefix, label in entries)
+
+class PrefixIndex:
+    """
+    A longest-prefix-match index over labelled IPv4 prefixes.
+
+    The index keeps the sorted starts of disjoint address intervals that cover
+    the whole address space, and for each interval the code of its longest
+    matching prefix (an index into prefixes), or NO_MATCH. A bucket table holds,
+    for every value of the top BUCKET_BITS bits, the interval containing the
+    first address of that bucket, which bounds the search of each lookup.
+
+    Attributes:
+    prefixes (list): The (network, prefix length, label) tuples, sorted and
+        without duplicates. If a prefix is listed twice, the last label wins.
+    labels (list): The label of every prefix, indexed by code.
+    """
+
+    def __init__(self, entries):
+        unique = {}
+        for network, prefix, label in entries:
+            if not 0 <= prefix <= 32:
+                raise ValueError(f"Invalid prefix length: {prefix}")
+            unique[(network & MASK_INTS[prefix], prefix)] = label
+        self.prefixes = [(network, prefix, label) for (network, prefix), label in sorted(unique.items())]
+        self.labels = [label for _, _, label in self.prefixes]
+        self._starts, self._codes = self._flatten()
+        self._buckets = [bisect_right(self._starts, bucket << (32 - BUCKET_BITS)) - 1
+                         for bucket in range(1 << BUCKET_BITS)]
+        self._buckets.append(len(self._starts) - 1)
+        self._start_array = self._code_array = self._bucket_array = self._label_array = None
+        self._search_steps = []
+
+    @classmethod
+    def from_file(cls, path):
+        """Builds an index from a prefix table file (see load_prefix_table())."""
+        return cls(load_prefix_table(path))
+
+    def _flatten(self):
+        """Turns the nested prefixes into sorted, disjoint intervals."""
+        starts = [0]
+        codes = [NO_MATCH]
+
+        def begin(start, code):
+            # A later interval starting at the same address is more specific
+            if starts[-1] == start:
+                codes[-1] = code
+            else:
+                starts.append(start)
+                codes.append(code)
+
+        # Prefixes sorted by network and then length arrive outermost first, so the
+        # prefixes containing the current address always form a stack
+        open_prefixes = []
+        for code, (network, prefix, _) in enumerate(self.prefixes):
+            while open_prefixes and open_prefixes[-1][0] < network:
+                self._close(open_prefixes, begin)
+            begin(network, code)
+            open_prefixes.append((network | (~MASK_INTS[prefix] & 0xFFFFFFFF), code))
+        while open_prefixes:
+            self._close(open_prefixes, begin)
+
+        # Merge neighbouring intervals owned by the same prefix
+        merged_starts, merged_codes = [], []
+        for start, code in zip(starts, codes):
+            if not merged_codes or merged_codes[-1] != code:
+                merged_starts.append(start)
+                merged_codes.append(code)
+        return merged_starts, merged_codes
+
+    @staticmethod
+    def _close(open_prefixes, begin):
+        """Ends the innermost open prefix and hands the rest of its parent back."""
+        last, _ = open_prefixes.pop()
+        if last < 0xFFFFFFFF:
+            begin(last + 1, open_prefixes[-1][1] if open_prefixes else NO_MATCH)
+
+    def __len__(self):
+        return len(self.prefixes)
+
+    @property
+    def interval_count(self):
+        """The number of disjoint intervals searched by a lookup."""
+        return len(self._starts)
+
+    def lookup(self, address):
+        """
+        Finds the longest prefix containing an address.
+
+        Parameters:
+        address (int): The address as a 32-bit int.
+
+        Returns:
+        int: The code of the matching prefix, or NO_MATCH.
+        """
+        bucket = address >> (32 - BUCKET_BITS)
+        return self._codes[bisect_right(self._starts, address, self._buckets[bucket], self._buckets[bucket + 1] + 1) - 1]
+
+    def classify(self, address, default=None):
+        """
+        Returns the label of the longest prefix containing an address.
+
+        Parameters:
+        address (int): The address as a 32-bit int.
+        default: The result for addresses that match no prefix.
+        """
+        code = self.lookup(address)
+        return default if code == NO_MATCH else self.labels[code]
+
+    def match(self, address):
+        """Returns the (network, prefix length, label) matching an address, or None."""
+        code = self.lookup(address)
+        return None if code == NO_MATCH else self.prefixes[code]
+
+    def _arrays(self):
+        """Builds the NumPy copies of the interval table on first use."""
+        if np is None:
+            raise ImportError("NumPy is required for array lookups")
+        if self._start_array is None:
+            buckets = np.array(self._buckets, dtype=np.int32)
+            widest = int((buckets[1:] - buckets[:-1]).max())
+            self._search_steps = [1 << bit for bit in reversed(range(widest.bit_length()))]
+            # Padding keeps lo + step in bounds; the padded starts are never selected
+            padding = np.full(2 * (self._search_steps[0] if self._search_steps else 0), 0xFFFFFFFF, dtype=np.uint32)
+            self._start_array = np.concatenate([np.array(self._starts, dtype=np.uint32), padding])
+            self._code_array = np.array(self._codes, dtype=np.int32)
+            self._bucket_array = buckets
+        return self._start_array, self._code_array, self._bucket_array
+
+    def lookup_array(self, addresses):
+        """
+        Finds the longest matching prefix of every address.
+
+        Parameters:
+        addresses (numpy.ndarray): A uint32 array of addresses.
+
+        Returns:
+        numpy.ndarray: An int32 array of prefix codes, NO_MATCH where nothing matches.
+        """
+        starts, codes, buckets = self._arrays()
+        addresses = np.asarray(addresses, dtype=np.uint32)
+        bucket = addresses >> (32 - BUCKET_BITS)
+        lo = buckets[bucket]
+        hi = buckets[bucket + 1]
+        # Branchless binary search within each bucket: the last interval start <= address
+        for step in self._search_steps:
+            candidate = lo + step
+            lo = np.where((candidate <= hi) & (starts[candidate] <= addresses), candidate, lo)
+        return codes[lo]
+
+    def classify_array(self, addresses, default=None):
+        """
+        Returns the label of the longest matching prefix of every address.
+
+        Parameters:
+        addresses (numpy.ndarray): A uint32 array of addresses.
+        default: The label of addresses that match no prefix.
+
+        Returns:
+        numpy.ndarray: An object array of labels.
+        """
+        codes = self.lookup_array(addresses)
+        if self._label_array is None or self._label_array[-1] is not default:
+            # NO_MATCH (-1) picks the default from the end of the array
+            self._label_array = np.array(self.labels + [default], dtype=object)
+        return self._label_array[codes]
+
+def reference_lookup(codes_by_prefix, address):
+    """
+    Finds the longest prefix containing an address by probing every prefix
+    length from /32 down to /0.
+
+    Parameters:
+    codes_by_prefix (dict): Maps (network, prefix length) to the prefix code.
+    address (int): The address as a 32-bit int.
+    """
+    for prefix in range(32, -1, -1):
+        code = codes_by_prefix.get((address & MASK_INTS[prefix], prefix))
+        if code is not None:
+            return code
+    return NO_MATCH
+
+def random_prefixes(count, seed=None):
+    """
+    Generates a synthetic allocation table of nested prefixes.
+
+    Parameters:
+    count (int): The number of prefixes.
+    seed (int, optional): Seed for a reproducible table.
+
+    Returns:
+    list: (network, prefix length, label) tuples.
+    """
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        prefix = rng.randint(8, 30)
+        network = rng.getrandbits(32) & MASK_INTS[prefix]
+        entries.append((network, prefix, f'allocation-{i}'))
+    return entries
+
+def verify_index(index, samples=2000, seed=0):
+    """
+    Cross-checks an index against reference_lookup() on random addresses and on
+    the first, last and neighbouring addresses of up to samples prefixes.
+
+    Returns:
+    int: The number of addresses checked. Raises AssertionError on the first mismatch.
+    """
+    rng = random.Random(seed)
+    addresses = [rng.getrandbits(32) for _ in range(samples)]
+    for network, prefix, _ in rng.sample(index.prefixes, min(samples, len(index))):
+        last = network | (~MASK_INTS[prefix] & 0xFFFFFFFF)
+        addresses += [address for address in (network - 1, network, last, last + 1) if 0 <= address <= 0xFFFFFFFF]
+
+    codes_by_prefix = {(network, prefix): code for code, (network, prefix, _) in enumerate(index.prefixes)}
+    batch = index.lookup_array(addresses).tolist() if np is not None else None
+    for i, address in enumerate(addresses):
+        expected = reference_lookup(codes_by_prefix, address)
+        if index.lookup(address) != expected or (batch is not None and batch[i] != expected):
+            raise AssertionError(f"{format_dotted(address_octets(address))}: expected code {expected}")
+    return len(addresses)
+
+def main():
+    parser = argparse.ArgumentParser(description="Longest-prefix-match IPv4 classifier.")
+    parser.add_argument('addresses', nargs='*', help="addresses to classify")
+    parser.add_argument('--table', help="prefix table file")
+    parser.add_argument('--random-prefixes', type=int, default=100000,
+                        help="size of the synthetic table used when no --table is given")
+    parser.add_argument('--lookups', type=int, default=1000000, help="number of lookups to time")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the synthetic table and addresses")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.table:
+        index = PrefixIndex.from_file(args.table)
+    else:
+        index = PrefixIndex(random_prefixes(args.random_prefixes, args.seed))
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {len(index)} prefixes into {index.interval_count} intervals in {elapsed:.2f}s")
+
+    if args.addresses:
+        for text in args.addresses:
+            entry = index.match(parse_address(text))
+            print(f"{text}: {'no match' if entry is None else f'{entry[2]} ({format_prefix(*entry[:2])})'}")
+        return
+
+    print(f"Verified {verify_index(index, seed=args.seed)} addresses against a per-length reference lookup.")
+
+    rng = random.Random(args.seed)
+    addresses = [rng.getrandbits(32) for _ in range(args.lookups)]
+    lookup = index.lookup
+    start = time.perf_counter()
+    for address in addresses:
+        lookup(address)
+    elapsed = time.perf_counter() - start
+    print(f"lookup():       {args.lookups / elapsed:14,.0f} lookups/s")
+
+    if np is not None:
+        address_array = np.array(addresses, dtype=np.uint32)
+        start = time.perf_counter()
+        index.lookup_array(address_array)
+        elapsed = time.perf_counter() - start
+        print(f"lookup_array(): {args.lookups / elapsed:14,.0f} lookups/s")
+
+if __name__ == "__main__":
+    main()
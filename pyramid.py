@@ -1,43 +1,204 @@
+import argparse
 import random
-import os
+import sys
+from array import array
 
-def build_pyramid(initial_row):
-    rows = []
+import metrics
+from frame_renderer import FrameRenderer
 
-    # Generate the pyramid
-    for group_size in range(1, len(initial_row) + 1):
-        current_row = []
-        for start in range(len(initial_row) - group_size + 1):
-            combined_bits = "".join(map(str, initial_row[start:start + group_size]))
-            combined_value = int(combined_bits, 2)
-            current_row.append(combined_value)
-        rows.append(current_row)
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-    return rows
+# Widest window that still fits in an unsigned 64-bit buffer
+MAX_BUFFER_BITS = 64
 
-def print_pyramid(rows):
-    max_width = len(" ".join(map(str, rows[0]))) * 2  # Calculate the maximum width of the first row
+# Write buffer used when exporting pyramids to a file
+EXPORT_BUFFER_SIZE = 1 << 20
+
+# Histogram of the time spent building and printing pyramids, labelled by stage
+STAGE_SECONDS = 'pyramid.stage_seconds'
+
+def _window_row(bits, group_size):
+    """Computes the row of every group_size-bit window directly in O(n)."""
+    mask = (1 << group_size) - 1
+    value = 0
+    for bit in bits[:group_size]:
+        value = (value << 1) | bit
+    row = [value]
+    for bit in bits[group_size:]:
+        value = ((value << 1) & mask) | bit
+        row.append(value)
+    return row
+
+def iter_pyramid(initial_row, start_row=1, stop_row=None, storage='list'):
+    """
+    Lazily yields the rows of the bit pyramid of a row of bits.
+
+    Row k holds the value of every window of k consecutive bits. The first
+    requested row is computed directly from the bits and every following row is
+    derived from the previous one by shifting every value left and or-ing in the
+    next bit, so each cell costs O(1) for windows up to 64 bits wide. Only the
+    current row is kept, so memory stays O(n) however many rows are consumed.
+
+    Args:
+    initial_row (sequence): The bits of the base row, as ints or a '0'/'1' string.
+    start_row (int): The first row to yield, counted from 1 (single bits).
+    stop_row (int, optional): The last row to yield. Runs to the top of the pyramid if None.
+    storage (str): 'list' for lists of ints, 'array' for array('Q') rows or 'numpy'
+        for uint64 arrays. Rows wider than 64 bits always fall back to lists of ints.
+
+    Yields:
+    list: The rows start_row..stop_row of the pyramid.
+    """
+    if storage not in ('list', 'array', 'numpy'):
+        raise ValueError(f"Unknown storage: {storage}")
+    if storage == 'numpy' and np is None:
+        raise ImportError("NumPy is required for numpy storage")
+    if start_row < 1:
+        raise ValueError("start_row must be at least 1")
+
+    bits = [int(bit) for bit in initial_row]
+    length = len(bits)
+    stop_row = length if stop_row is None else min(stop_row, length)
+    if start_row > stop_row:
+        return
+
+    row = _window_row(bits, start_row)
+    group_size = start_row
+
+    if storage == 'numpy' and group_size <= MAX_BUFFER_BITS:
+        bit_buffer = np.array(bits, dtype=np.uint64)
+        row = np.array(row, dtype=np.uint64)
+        yield row
+        while group_size < min(stop_row, MAX_BUFFER_BITS):
+            group_size += 1
+            row = (row[:-1] << np.uint64(1)) | bit_buffer[group_size - 1:]
+            yield row
+        # Hand the widest buffered row over to Python ints for the remaining rows
+        row = row.tolist()
+    elif storage == 'array' and group_size <= MAX_BUFFER_BITS:
+        yield array('Q', row)
+    else:
+        yield row
+
+    while group_size < stop_row:
+        group_size += 1
+        row = [(value << 1) | bit for value, bit in zip(row, bits[group_size - 1:])]
+        if storage == 'array' and group_size <= MAX_BUFFER_BITS:
+            yield array('Q', row)
+        else:
+            yield row
+
+def build_pyramid(initial_row, max_rows=None, storage='list'):
+    """
+    Builds the bit pyramid of a row of bits.
+
+    Args:
+    initial_row (sequence): The bits of the base row, as ints or a '0'/'1' string.
+    max_rows (int, optional): Stop after this many rows. All rows are built if None.
+    storage (str): 'list', 'array' or 'numpy', as for iter_pyramid().
+
+    Returns:
+    list: The rows of the pyramid, from single bits up to the whole row.
+    """
+    return list(iter_pyramid(initial_row, stop_row=max_rows, storage=storage))
+
+def _pyramid_lines(rows):
+    """Yields the rows of a pyramid as text centered on the width of the first row."""
+    max_width = None
     for row in rows:
-        decimal_values = " ".join(str(x) for x in row)
-        print(decimal_values.center(max_width))
+        decimal_values = " ".join(map(str, row))
+        if max_width is None:
+            max_width = len(decimal_values) * 2  # Calculate the maximum width of the first row
+        yield decimal_values.center(max_width)
+
+def format_pyramid(rows):
+    """
+    Renders a pyramid to a single string, one centered line per row.
+
+    Args:
+    rows (iterable): The rows of the pyramid.
+
+    Returns:
+    str: The rendered pyramid without a trailing newline.
+    """
+    return "\n".join(_pyramid_lines(rows))
+
+def print_pyramid(rows, out=None):
+    """
+    Prints the pyramid centered on the width of its first row.
+
+    Rows are consumed and written one at a time, so a generator from
+    iter_pyramid() is never materialized.
+
+    Args:
+    rows (iterable): The rows of the pyramid.
+    out (file, optional): A text file to write to. Defaults to sys.stdout.
+    """
+    out = sys.stdout if out is None else out
+    for line in _pyramid_lines(rows):
+        out.write(line)
+        out.write("\n")
+
+def export_pyramid(initial_row, path, start_row=1, stop_row=None):
+    """
+    Streams the rows start_row..stop_row of a pyramid to a text file.
+
+    Args:
+    initial_row (sequence): The bits of the base row.
+    path (str): The file to write.
+    start_row (int): The first row to write, counted from 1.
+    stop_row (int, optional): The last row to write. Runs to the top of the pyramid if None.
+    """
+    with open(path, 'w', buffering=EXPORT_BUFFER_SIZE) as out:
+        print_pyramid(metrics.timed_iter(STAGE_SECONDS, iter_pyramid(initial_row, start_row, stop_row),
+                                         stage='build_row'), out)
 
 def main():
-    # Initial array with 32 bits set to 1
-    initial_row = [1] * 32
-    rows = build_pyramid(initial_row)
+    parser = argparse.ArgumentParser(description="Display the bit pyramid of random rows of bits.")
+    parser.add_argument('--width', type=int, help="export one pyramid of a random row this many bits wide")
+    parser.add_argument('--rows', type=int, nargs=2, metavar=('START', 'STOP'),
+                        help="only export rows START..STOP (counted from 1)")
+    parser.add_argument('--output', help="file to export to instead of stdout")
+    parser.add_argument('--diff', action='store_true', help="only redraw the lines that change between pyramids")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    with metrics.session(args.metrics, args.profile):
+        if args.width is not None:
+            initial_row = [random.getrandbits(1) for _ in range(args.width)]
+            start_row, stop_row = args.rows if args.rows else (1, None)
+            # build_row times each row; export includes them, so printing takes the difference
+            with metrics.timer(STAGE_SECONDS, stage='export'):
+                if args.output:
+                    export_pyramid(initial_row, args.output, start_row, stop_row)
+                else:
+                    print_pyramid(metrics.timed_iter(STAGE_SECONDS, iter_pyramid(initial_row, start_row, stop_row),
+                                                     stage='build_row'))
+        else:
+            show_pyramids(FrameRenderer(diff=args.diff))
+
+def show_pyramids(renderer):
+    """Shows the pyramid of a new random 32-bit number every time a key is pressed."""
+    # Imported here because pyramid_cache builds on this module
+    from pyramid_cache import PyramidCache
+
+    prompt = "\nPress any key to generate a new random 32-bit number and update the pyramid..."
 
-    print("Initial Pyramid:")
-    print_pyramid(rows)
-    print("\nPress any key to generate a new random 32-bit number and update the pyramid...")
+    # Initial value with 32 bits set to 1
+    cache = PyramidCache(format_pyramid)
+    cache.warm([0xFFFFFFFF])
+    renderer.render("Initial Pyramid:\n" + cache.get(0xFFFFFFFF).text + "\n" + prompt)
 
     while True:
         input()
-        os.system('cls' if os.name == 'nt' else 'clear')
         random_value = random.getrandbits(32)
-        random_row = [int(bit) for bit in bin(random_value)[2:].zfill(32)]
-        rows = build_pyramid(random_row)
-        print_pyramid(rows)
-        print("\nPress any key to generate a new random 32-bit number and update the pyramid...")
+        with metrics.timer(STAGE_SECONDS, stage='build'):
+            text = cache.get(random_value).text
+        with metrics.timer(STAGE_SECONDS, stage='print'):
+            renderer.render(text + "\n" + prompt)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+"""
+Batched bit pyramids of many 32-bit draws, for statistics on the pyramid values.
+
+pyramid.py and bitslots.py build the pyramid of one 32-bit word at a time: row k
+holds the value of every window of k consecutive bits, read most significant
+bit first. pyramid_tensor() builds the pyramids of a whole uint32 array of draws
+at once as a (draws x rows x 32) array. Every cell is a shift and a mask of its
+draw, taken from precomputed (rows x 32) tables, so there is no Python loop per
+cell or per draw. Row k only has 33 - k cells; the rest of each row is padding,
+marked False in cell_mask().
+
+A full pyramid takes 4 KB per draw, so PyramidStats summarizes draws in
+fixed-size chunks without building their tensors: it keeps a few per-position
+counters from which the sum (for the mean), minimum, maximum and histogram of
+every cell follow exactly. Memory therefore stays constant however many draws
+are summarized, and the statistics of separate runs can be merged.
+A cell of row k takes 2^k values, so histograms use 2^bucket_bits equal-width
+buckets of the top bits of the value; rows up to bucket_bits wide are exact.
+
+By default draws are read as plain 32-bit values, as in pyramid.main(). With
+--display they are packed bitslots draws, rearranged into the display order of
+bitslots.pyramid_word() first.
+
+Usage:
+    python pyramid_batch.py --draws 10000000 --seed 1
+    python pyramid_batch.py --draws 10000000 --rows 8 --display --output stats.npz
+"""
+
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from jackpot_rules import REGISTER_FIELDS
+
+WORD_BITS = 32
+
+# Draws reduced per chunk; small chunks keep the temporaries (about 600 bytes a draw) in cache
+DEFAULT_CHUNK_SIZE = 1 << 12
+
+# Histogram buckets per cell are 2^DEFAULT_BUCKET_BITS
+DEFAULT_BUCKET_BITS = 8
+
+# Draws generated per chunk by the command line
+GENERATE_CHUNK_SIZE = 1 << 20
+
+RowSummary = namedtuple('RowSummary', 'row cells mean expected_mean minimum maximum')
+
+def _window_tables(rows):
+    """Returns the shift and mask of every (row, cell), with a zero mask for padding."""
+    width = np.arange(1, rows + 1)[:, None]
+    cell = np.arange(WORD_BITS)[None, :]
+    valid = cell <= WORD_BITS - width
+    shifts = np.where(valid, WORD_BITS - width - cell, 0).astype(np.uint32)
+    masks = np.where(valid, (np.uint64(1) << width.astype(np.uint64)) - np.uint64(1), 0).astype(np.uint32)
+    return shifts, masks
+
+def cell_mask(rows=WORD_BITS):
+    """Returns a (rows x 32) bool array marking the cells that exist in every row."""
+    width = np.arange(1, rows + 1)[:, None]
+    return np.arange(WORD_BITS)[None, :] <= WORD_BITS - width
+
+def display_words(words):
+    """Rearranges packed bitslots draws into display order, as bitslots.pyramid_word() does."""
+    words = np.asarray(words, dtype=np.uint32)
+    display = np.zeros_like(words)
+    for _, shift, width in REGISTER_FIELDS:
+        register = (words >> np.uint32(shift)) & np.uint32((1 << width) - 1)
+        display = (display << np.uint32(width)) | register
+    return display
+
+def pyramid_tensor(draws, rows=WORD_BITS):
+    """
+    Builds the pyramids of an array of 32-bit draws.
+
+    Args:
+    draws (numpy.ndarray): A one-dimensional uint32 array of draws.
+    rows (int): The number of rows to build, from single bits up to 32-bit windows.
+
+    Returns:
+    numpy.ndarray: A (draws x rows x 32) uint32 array; cell j of row k is the
+        value of the k bits starting j bits from the most significant one, and
+        the cells past the end of a row are 0.
+    """
+    if not 1 <= rows <= WORD_BITS:
+        raise ValueError(f"rows must be between 1 and {WORD_BITS}")
+    shifts, masks = _window_tables(rows)
+    draws = np.asarray(draws, dtype=np.uint32).ravel()
+    return (draws[:, None, None] >> shifts) & masks
+
+class PyramidStats:
+    """
+    Streaming per-cell statistics of the pyramids of many draws.
+
+    The reducers never build the pyramid tensor. Cell (k, j) is the top k bits
+    of the draw shifted left by j, so:
+
+    - its sum is a weighted sum of the number of 1 bits at each position;
+    - its minimum and maximum are the top k bits of the minimum and maximum of
+      the draws shifted left by j, since taking the top bits preserves order;
+    - its histogram bucket is the value of a cell of row bucket_bits, or a
+      window inside one, so only that row is counted and the others follow.
+
+    Each chunk therefore costs O(32 + 33 - bucket_bits) operations per draw.
+
+    Args:
+    rows (int): The number of pyramid rows to summarize.
+    bucket_bits (int): Histograms have 2^bucket_bits buckets per cell.
+    chunk_size (int): The number of draws reduced at a time.
+    """
+
+    def __init__(self, rows=WORD_BITS, bucket_bits=DEFAULT_BUCKET_BITS, chunk_size=DEFAULT_CHUNK_SIZE):
+        if not 1 <= rows <= WORD_BITS:
+            raise ValueError(f"rows must be between 1 and {WORD_BITS}")
+        if not 1 <= bucket_bits <= 16:
+            raise ValueError("bucket_bits must be between 1 and 16")
+        self.rows = rows
+        self.bucket_bits = bucket_bits
+        self.chunk_size = chunk_size
+        self.valid = cell_mask(rows)
+        self.count = 0
+
+        # Number of 1 bits at every position, most significant first
+        self.bit_counts = np.zeros(WORD_BITS, dtype=np.uint64)
+        # Minimum and maximum of the draws shifted left by 0..31
+        self.shifted_minima = np.full(WORD_BITS, 0xFFFFFFFF, dtype=np.uint32)
+        self.shifted_maxima = np.zeros(WORD_BITS, dtype=np.uint32)
+        # Value histograms of the cells of the widest exactly counted row
+        self.window_bits = min(rows, bucket_bits)
+        self.window_counts = np.zeros((WORD_BITS + 1 - self.window_bits, 1 << self.window_bits), dtype=np.int64)
+
+        self._left_shifts = np.arange(WORD_BITS, dtype=np.uint32)
+        self._bit_shifts = self._left_shifts[::-1].copy()
+        self._window_shifts = (WORD_BITS - self.window_bits - np.arange(len(self.window_counts))).astype(np.uint32)
+        self._window_offsets = np.arange(len(self.window_counts), dtype=np.intp) << self.window_bits
+
+    def update(self, draws):
+        """
+        Adds the pyramids of an array of draws.
+
+        Args:
+        draws (numpy.ndarray): A uint32 array of draws.
+        """
+        draws = np.asarray(draws, dtype=np.uint32).ravel()
+        window_mask = np.uint32((1 << self.window_bits) - 1)
+        for start in range(0, len(draws), self.chunk_size):
+            chunk = draws[start:start + self.chunk_size, None]
+            self.count += len(chunk)
+            self.bit_counts += ((chunk >> self._bit_shifts) & np.uint32(1)).sum(axis=0, dtype=np.uint64)
+            shifted = chunk << self._left_shifts
+            np.minimum(self.shifted_minima, shifted.min(axis=0), out=self.shifted_minima)
+            np.maximum(self.shifted_maxima, shifted.max(axis=0), out=self.shifted_maxima)
+            windows = ((chunk >> self._window_shifts) & window_mask) + self._window_offsets
+            self.window_counts += np.bincount(windows.ravel(), minlength=self.window_counts.size).reshape(
+                self.window_counts.shape)
+
+    def merge(self, other):
+        """Adds the statistics of another PyramidStats with the same rows and buckets."""
+        if (other.rows, other.bucket_bits) != (self.rows, self.bucket_bits):
+            raise ValueError("Only statistics with the same rows and bucket_bits can be merged")
+        self.count += other.count
+        self.bit_counts += other.bit_counts
+        np.minimum(self.shifted_minima, other.shifted_minima, out=self.shifted_minima)
+        np.maximum(self.shifted_maxima, other.shifted_maxima, out=self.shifted_maxima)
+        self.window_counts += other.window_counts
+
+    @property
+    def sums(self):
+        """The (rows x 32) sum of every cell over all draws, 0 for padding."""
+        width = np.arange(1, self.rows + 1)[:, None, None]
+        cell = np.arange(WORD_BITS)[None, :, None]
+        offset = np.arange(WORD_BITS)[None, None, :] - cell
+        inside = (offset >= 0) & (offset < width) & self.valid[:, :, None]
+        weights = np.where(inside, np.left_shift(np.uint64(1), np.where(inside, width - 1 - offset, 0).astype(np.uint64)),
+                           np.uint64(0))
+        return (weights * self.bit_counts).sum(axis=2, dtype=np.uint64)
+
+    def _top_bits(self, shifted):
+        """Returns the top k bits of shifted[j] for every cell (k, j), widened since a uint32 shift by 32 is undefined."""
+        width = np.arange(1, self.rows + 1, dtype=np.uint64)[:, None]
+        cells = shifted.astype(np.uint64)[None, :] >> (np.uint64(WORD_BITS) - width)
+        return np.where(self.valid, cells, 0).astype(np.uint32)
+
+    @property
+    def minima(self):
+        """The (rows x 32) minimum of every cell, 0 for padding."""
+        return self._top_bits(self.shifted_minima)
+
+    @property
+    def maxima(self):
+        """The (rows x 32) maximum of every cell, 0 for padding."""
+        return self._top_bits(self.shifted_maxima)
+
+    @property
+    def histograms(self):
+        """The (rows x 32 x 2^bucket_bits) histogram of every cell, all zeros for padding."""
+        histograms = np.zeros((self.rows, WORD_BITS, 1 << self.bucket_bits), dtype=np.int64)
+        values = np.arange(1 << self.window_bits)
+        last = len(self.window_counts) - 1
+        for k in range(1, self.rows + 1):
+            for j in range(WORD_BITS + 1 - k):
+                if k >= self.window_bits:
+                    # The bucket is the top window_bits of the value, which is a counted cell
+                    histograms[k - 1, j, :len(values)] = self.window_counts[j]
+                else:
+                    # The cell lies inside a counted cell, as its bits from the left
+                    source = min(j, last)
+                    buckets = (values >> (source + self.window_bits - j - k)) & ((1 << k) - 1)
+                    np.add.at(histograms[k - 1, j], buckets, self.window_counts[source])
+        return histograms
+
+    def means(self):
+        """Returns the (rows x 32) mean of every cell, NaN for padding."""
+        means = np.full((self.rows, WORD_BITS), np.nan)
+        if self.count:
+            means[self.valid] = self.sums[self.valid] / self.count
+        return means
+
+    def row_histogram(self, row):
+        """Returns the histogram of every cell of a row (counted from 1) added together."""
+        return self.histograms[row - 1, :WORD_BITS + 1 - row].sum(axis=0)
+
+    def bucket_edges(self, row):
+        """Returns the lowest value of every histogram bucket of a row (counted from 1)."""
+        return np.arange(1 << self.bucket_bits, dtype=np.uint64) << np.uint64(max(row - self.bucket_bits, 0))
+
+    def summary(self):
+        """Returns a RowSummary of the cells of every row."""
+        means, minima, maxima = self.means(), self.minima, self.maxima
+        summaries = []
+        for k in range(1, self.rows + 1):
+            cells = WORD_BITS + 1 - k
+            summaries.append(RowSummary(
+                k, cells,
+                float(np.mean(means[k - 1, :cells])),
+                ((1 << k) - 1) / 2,
+                int(minima[k - 1, :cells].min()) if self.count else None,
+                int(maxima[k - 1, :cells].max()) if self.count else None,
+            ))
+        return summaries
+
+    def save(self, path):
+        """Writes the statistics to a .npz file."""
+        np.savez_compressed(path, rows=self.rows, bucket_bits=self.bucket_bits, count=self.count,
+                            bit_counts=self.bit_counts, shifted_minima=self.shifted_minima,
+                            shifted_maxima=self.shifted_maxima, window_counts=self.window_counts)
+
+    @classmethod
+    def load(cls, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Reads statistics written by save()."""
+        with np.load(path) as data:
+            stats = cls(int(data['rows']), int(data['bucket_bits']), chunk_size)
+            stats.count = int(data['count'])
+            for name in ('bit_counts', 'shifted_minima', 'shifted_maxima', 'window_counts'):
+                getattr(stats, name)[...] = data[name]
+        return stats
+
+def summarize_draws(num_draws, seed=None, rows=WORD_BITS, bucket_bits=DEFAULT_BUCKET_BITS, display=False):
+    """
+    Summarizes the pyramids of random 32-bit draws, generated and reduced in chunks.
+
+    Args:
+    num_draws (int): The number of draws.
+    seed (int, optional): Seed for a reproducible run.
+    rows (int): The number of pyramid rows to summarize.
+    bucket_bits (int): Histograms have 2^bucket_bits buckets per cell.
+    display (bool): Read the draws as packed bitslots draws and summarize their display order.
+
+    Returns:
+    PyramidStats: The statistics of every cell.
+    """
+    rng = np.random.default_rng(seed)
+    stats = PyramidStats(rows, bucket_bits)
+    remaining = num_draws
+    while remaining > 0:
+        draws = rng.integers(0, 1 << 32, size=min(GENERATE_CHUNK_SIZE, remaining), dtype=np.uint32)
+        stats.update(display_words(draws) if display else draws)
+        remaining -= len(draws)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the bit pyramids of many random 32-bit draws.")
+    parser.add_argument('--draws', type=int, default=1000000)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--rows', type=int, default=WORD_BITS, help="pyramid rows to summarize")
+    parser.add_argument('--bucket-bits', type=int, default=DEFAULT_BUCKET_BITS,
+                        help="histograms have 2^BUCKET_BITS buckets per cell")
+    parser.add_argument('--display', action='store_true', help="read draws as packed bitslots draws in display order")
+    parser.add_argument('--output', help="save the statistics to this .npz file")
+    args = parser.parse_args()
+    if args.draws < 1:
+        parser.error("--draws must be at least 1")
+    if not 1 <= args.rows <= WORD_BITS:
+        parser.error(f"--rows must be between 1 and {WORD_BITS}")
+    if not 1 <= args.bucket_bits <= 16:
+        parser.error("--bucket-bits must be between 1 and 16")
+
+    start = time.perf_counter()
+    stats = summarize_draws(args.draws, args.seed, args.rows, args.bucket_bits, args.display)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'Row':>4}{'Cells':>7}{'Mean':>18}{'Expected':>18}{'Min':>12}{'Max':>12}")
+    for row in stats.summary():
+        print(f"{row.row:>4}{row.cells:>7}{row.mean:>18.3f}{row.expected_mean:>18.1f}{row.minimum:>12}{row.maximum:>12}")
+    print(f"{stats.count} draws in {elapsed:.2f}s ({stats.count / elapsed:,.0f} draws/s)")
+    if args.output:
+        stats.save(args.output)
+        print(f"Statistics saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
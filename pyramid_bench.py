@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks the incremental pyramid.build_pyramid() against the original
+implementation, which rebuilt every window from a joined bit string.
+
+The original is O(n^3) in character work, so rows above --reference-limit bits
+are only timed with the incremental engine. Wide rows are capped at --rows
+pyramid rows to keep the full O(n^2) pyramid from exhausting memory.
+
+Usage:
+    python pyramid_bench.py
+    python pyramid_bench.py --widths 32 256 4096 65536 --rows 128
+"""
+
+import argparse
+import random
+import time
+
+from pyramid import build_pyramid, np
+
+DEFAULT_WIDTHS = [32, 256, 4096, 65536]
+
+def build_pyramid_reference(initial_row, max_rows=None):
+    """The original string-joining build_pyramid(), kept for comparison."""
+    rows = []
+    num_rows = len(initial_row) if max_rows is None else min(max_rows, len(initial_row))
+    for group_size in range(1, num_rows + 1):
+        current_row = []
+        for start in range(len(initial_row) - group_size + 1):
+            combined_bits = "".join(map(str, initial_row[start:start + group_size]))
+            combined_value = int(combined_bits, 2)
+            current_row.append(combined_value)
+        rows.append(current_row)
+    return rows
+
+def time_call(function, *args, **kwargs):
+    """Returns the wall time in seconds of a single call."""
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pyramid construction.")
+    parser.add_argument('--widths', type=int, nargs='+', default=DEFAULT_WIDTHS, help="row widths in bits")
+    parser.add_argument('--rows', type=int, default=256, help="maximum number of pyramid rows to build")
+    parser.add_argument('--reference-limit', type=int, default=4096,
+                        help="widest row timed with the original implementation")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the random rows")
+    args = parser.parse_args()
+
+    storages = ['list', 'array'] + (['numpy'] if np is not None else [])
+    random.seed(args.seed)
+
+    print(f"{'Width':>8}{'Rows':>8}{'Reference':>12}" + ''.join(f"{storage:>12}" for storage in storages))
+    for width in args.widths:
+        initial_row = [random.getrandbits(1) for _ in range(width)]
+        num_rows = min(width, args.rows)
+
+        if width <= args.reference_limit:
+            reference = f"{time_call(build_pyramid_reference, initial_row, num_rows):.4f}s"
+        else:
+            reference = "skipped"
+        timings = [time_call(build_pyramid, initial_row, num_rows, storage) for storage in storages]
+
+        print(f"{width:>8}{num_rows:>8}{reference:>12}" + ''.join(f"{timing:>11.4f}s" for timing in timings))
+
+if __name__ == "__main__":
+    main()
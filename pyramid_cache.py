@@ -0,0 +1,120 @@
+"""
+Shared LRU cache of 32-bit bit pyramids.
+
+Building a 32-bit pyramid and rendering its 32 lines of text is repeated for
+every draw, even for values that come up again and again such as the all-ones
+initial state and the jackpot showcase states. PyramidCache memoizes both the
+rows and the rendered text per 32-bit value, evicting the least recently used
+entries once it is full.
+
+The value is read most significant bit first, so bit 31 is the leftmost cell
+of the base row. Each caller supplies its own render function, so the bitslots
+and pyramid scripts can share the cache implementation while keeping their own
+layouts.
+"""
+
+from collections import OrderedDict, namedtuple
+
+from pyramid import iter_pyramid
+
+WORD_BITS = 32
+
+# Number of pyramids kept before the least recently used one is evicted
+DEFAULT_MAXSIZE = 4096
+
+PyramidEntry = namedtuple('PyramidEntry', ['rows', 'text'])
+
+def word_to_bits(value, width=WORD_BITS):
+    """
+    Splits a value into its bits, most significant bit first.
+
+    Args:
+    value (int): The value to split.
+    width (int): The number of bits to return.
+
+    Returns:
+    list: The bits of the value as ints.
+    """
+    return [(value >> shift) & 1 for shift in range(width - 1, -1, -1)]
+
+class PyramidCache:
+    """
+    A bounded LRU cache of pyramid rows and rendered text keyed by a 32-bit value.
+
+    Args:
+    render (callable): Turns the rows of a pyramid into its text.
+    maxsize (int): The maximum number of pyramids to keep.
+    """
+
+    def __init__(self, render, maxsize=DEFAULT_MAXSIZE):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.render = render
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, value):
+        return value in self._entries
+
+    def get(self, value):
+        """
+        Returns the pyramid of a 32-bit value, building and rendering it on a miss.
+
+        Args:
+        value (int): The 32-bit value at the base of the pyramid.
+
+        Returns:
+        PyramidEntry: The rows (as tuples) and rendered text of the pyramid.
+        """
+        entry = self._entries.get(value)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(value)
+            return entry
+
+        self.misses += 1
+        rows = tuple(tuple(row) for row in iter_pyramid(word_to_bits(value)))
+        entry = PyramidEntry(rows, self.render(rows))
+        self._entries[value] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def warm(self, values):
+        """
+        Precomputes the pyramids of the given values without counting hits or misses.
+
+        Args:
+        values (iterable): The 32-bit values to precompute.
+        """
+        hits, misses = self.hits, self.misses
+        for value in values:
+            self.get(value)
+        self.hits, self.misses = hits, misses
+
+    def clear(self):
+        """Drops every cached pyramid and resets the statistics."""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Returns the cache statistics.
+
+        Returns:
+        dict: hits, misses, evictions, size and maxsize.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
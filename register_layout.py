@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+"""
+Configurable register layouts for bit-pyramid slot machine variants.
+
+bitslots.py splits a 32-bit word into four 7-bit registers and a 4-bit bonus
+register. A RegisterLayout describes any such split of a wider word, for example
+eight 15-bit registers and an 8-bit bonus in 128 bits. The layout precomputes
+the shift and mask of every register and carries the winning words of
+bitslots.JACKPOT_RULES over to its width:
+
+- registers that are all 1's or all 0's in a winning word stay all 1's or all
+  0's in every corresponding register, as for the Super Mega, Fools, Mega and
+  Super Jackpots;
+- a winning word that alternates in display order (registers left to right,
+  then the bonus register) keeps alternating from the same first bit, as for
+  the Double Slit Experiment Jackpot.
+
+A draw is classified with one dict lookup of its packed word, and its distance
+to the nearest jackpot is the int.bit_count() of its xor with each winning word.
+Neither converts the word to a string, so the cost per draw barely depends on
+the width of the word.
+
+Layouts are written as '4x7+4' (four 7-bit registers, a 4-bit bonus) or as a
+list of register widths such as '5,6,7,8+6'.
+
+Usage:
+    python register_layout.py 4x7+4 --draws 1000000 --seed 1
+    python register_layout.py 8x15+8 16x15+16 --draws 1000000
+    python register_layout.py 4x7+4 --word 0xa5555555
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+
+from bitslots import JACKPOT_RULES, JACKPOT_WORDS, parse_registers_from_32bit
+from jackpot_rules import NO_JACKPOT, WORD_BITS, display_word
+
+JACKPOT_NAMES = JACKPOT_RULES.names
+
+class RegisterLayout:
+    """
+    A split of a packed word into main registers and a bonus register.
+
+    Register 0 takes the lowest bits of the packed word, followed by the other
+    registers and finally the bonus register in the highest bits, as in
+    bitslots.parse_registers_from_32bit().
+
+    Args:
+    register_widths (list): The width in bits of every main register.
+    bonus_width (int): The width in bits of the bonus register, which may be 0.
+    """
+
+    def __init__(self, register_widths, bonus_width):
+        register_widths = [int(width) for width in register_widths]
+        if not register_widths or min(register_widths) < 1 or bonus_width < 0:
+            raise ValueError("A layout needs at least one register and only positive widths")
+        self.register_widths = register_widths
+        self.bonus_width = bonus_width
+
+        # (name, shift, width) of every register, in the format of jackpot_rules.REGISTER_FIELDS
+        self.fields = []
+        shift = 0
+        for i, width in enumerate(register_widths):
+            self.fields.append((f'r{i}', shift, width))
+            shift += width
+        self.bonus_shift = shift
+        self.word_bits = shift + bonus_width
+        if bonus_width:
+            self.fields.append(('bonus', shift, bonus_width))
+
+        self.full_mask = (1 << self.word_bits) - 1
+        self.main_mask = (1 << self.bonus_shift) - 1
+        self.bonus_mask = (1 << bonus_width) - 1
+        self._register_masks = [(shift, (1 << width) - 1) for _, shift, width in self.fields[:len(register_widths)]]
+
+        # The two alternating display words, starting with a 1 and with a 0
+        ones_first = int(('10' * self.word_bits)[:self.word_bits], 2)
+        self.alternating_words = (self.packed_word(ones_first), self.packed_word(self.full_mask ^ ones_first))
+        # With no bonus register, some jackpots coincide; the one with the highest priority keeps the word
+        self.jackpot_words = {}
+        for word, name in JACKPOT_WORDS:
+            self.jackpot_words.setdefault(self.scale_word(word), name)
+        self._nearest = list(self.jackpot_words.items())
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        Reads a layout such as '4x7+4' or '5,6,7,8+6'.
+
+        Args:
+        spec (str): The register widths, optionally followed by '+' and the bonus width.
+
+        Returns:
+        RegisterLayout: The layout.
+        """
+        registers, _, bonus = spec.partition('+')
+        try:
+            if 'x' in registers:
+                count, width = registers.split('x')
+                widths = [int(width)] * int(count)
+            else:
+                widths = [int(width) for width in registers.split(',')]
+            return cls(widths, int(bonus) if bonus else 0)
+        except ValueError:
+            raise ValueError(f"Invalid register layout: {spec!r}") from None
+
+    def __repr__(self):
+        return f"RegisterLayout({self.register_widths}, {self.bonus_width})"
+
+    @property
+    def spec(self):
+        """The layout in the notation of from_spec()."""
+        widths = self.register_widths
+        registers = f'{len(widths)}x{widths[0]}' if len(set(widths)) == 1 else ','.join(map(str, widths))
+        return f'{registers}+{self.bonus_width}' if self.bonus_width else registers
+
+    def parse(self, word):
+        """
+        Splits a packed word into its registers.
+
+        Args:
+        word (int): The packed word.
+
+        Returns:
+        tuple: The list of main registers and the bonus register.
+        """
+        return [(word >> shift) & mask for shift, mask in self._register_masks], (word >> self.bonus_shift) & self.bonus_mask
+
+    def compose(self, registers, bonus_register):
+        """Packs registers back into a word. This is the inverse of parse()."""
+        word = (bonus_register & self.bonus_mask) << self.bonus_shift
+        for (shift, mask), register in zip(self._register_masks, registers):
+            word |= (register & mask) << shift
+        return word
+
+    def display_word(self, word):
+        """Rearranges a packed word into display order: the registers left to right, then the bonus register."""
+        display = 0
+        for _, shift, width in self.fields:
+            display = (display << width) | ((word >> shift) & ((1 << width) - 1))
+        return display
+
+    def packed_word(self, display):
+        """Packs a display-order word back into the layout. This is the inverse of display_word()."""
+        word = 0
+        for _, shift, width in reversed(self.fields):
+            word |= (display & ((1 << width) - 1)) << shift
+            display >>= width
+        return word
+
+    def scale_word(self, word):
+        """
+        Carries a winning word of the standard 32-bit machine over to this layout.
+
+        Args:
+        word (int): A packed 32-bit word whose main registers are all 1's or all 0's
+            alike and whose bonus register is too, or that alternates in display order.
+
+        Returns:
+        int: The packed word of this layout with the same pattern.
+        Raises ValueError for any other word.
+        """
+        registers, bonus_register = parse_registers_from_32bit(word)
+        if len(set(registers)) == 1 and registers[0] in (0, 0b1111111) and bonus_register in (0, 0b1111):
+            return (self.main_mask if registers[0] else 0) | (self.full_mask ^ self.main_mask if bonus_register else 0)
+        bits = f'{display_word(word):0{WORD_BITS}b}'
+        if bits == bits[:2] * (WORD_BITS // 2) and bits[0] != bits[1]:
+            return self.alternating_words[bits[0] == '0']
+        raise ValueError(f"The winning word {word:#010x} has no counterpart in layout {self.spec}")
+
+    def classify(self, word):
+        """Returns the name of the jackpot a packed word wins, or NO_JACKPOT."""
+        return self.jackpot_words.get(word, NO_JACKPOT)
+
+    def is_alternating(self, word):
+        """Checks whether a packed word alternates in display order."""
+        return word in self.alternating_words
+
+    def nearest_jackpot(self, word):
+        """
+        Finds the jackpot a packed word is closest to.
+
+        Returns:
+        tuple: The name of the jackpot and the number of bits that differ from its nearest winning word.
+        """
+        # Ties go to the jackpot listed first
+        winning, name = min(self._nearest, key=lambda item: (word ^ item[0]).bit_count())
+        return name, (word ^ winning).bit_count()
+
+    def register_ones(self, word):
+        """Counts the 1 bits of every main register and of the bonus register."""
+        registers, bonus_register = self.parse(word)
+        return [register.bit_count() for register in registers], bonus_register.bit_count()
+
+    def format_word(self, word):
+        """Renders a packed word in display order, with the registers separated by spaces."""
+        registers, bonus_register = self.parse(word)
+        cells = [f'{register:0{width}b}' for register, width in zip(registers, self.register_widths)]
+        if self.bonus_width:
+            cells.append(f'{bonus_register:0{self.bonus_width}b}')
+        return ' '.join(cells)
+
+STANDARD_LAYOUT = RegisterLayout([7, 7, 7, 7], 4)
+
+def simulate(layout, num_draws, seed=None):
+    """
+    Draws random words of the layout's width and classifies them.
+
+    Args:
+    layout (RegisterLayout): The register layout.
+    num_draws (int): The number of draws.
+    seed (int, optional): Seed for a reproducible run.
+
+    Returns:
+    tuple: Outcome name mapped to its number of hits, and a Counter of the distances to the nearest jackpot.
+    """
+    getrandbits = random.Random(seed).getrandbits
+    classify = layout.classify
+    nearest = layout.nearest_jackpot
+    bits = layout.word_bits
+    outcomes = Counter()
+    distances = Counter()
+    for _ in range(num_draws):
+        word = getrandbits(bits)
+        outcomes[classify(word)] += 1
+        distances[nearest(word)[1]] += 1
+    return {name: outcomes[name] for name in JACKPOT_RULES.outcome_names}, distances
+
+def time_classify(layout, num_draws, seed=None):
+    """Returns the mean time in nanoseconds to classify one pre-drawn word."""
+    getrandbits = random.Random(seed).getrandbits
+    words = [getrandbits(layout.word_bits) for _ in range(num_draws)]
+    classify = layout.classify
+    start = time.perf_counter()
+    for word in words:
+        classify(word)
+    return (time.perf_counter() - start) / num_draws * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate bit-pyramid slot machines with custom register layouts.")
+    parser.add_argument('layouts', nargs='+', type=RegisterLayout.from_spec, help="layouts such as 4x7+4 or 8x15+8")
+    parser.add_argument('--draws', type=int, default=100000, help="random draws per layout")
+    parser.add_argument('--seed', type=int, help="seed for reproducible draws")
+    parser.add_argument('--word', type=lambda value: int(value, 0), help="classify this packed word instead of drawing")
+    args = parser.parse_args()
+    if args.draws < 1:
+        parser.error("--draws must be at least 1")
+
+    for layout in args.layouts:
+        print(f"Layout {layout.spec}: {layout.word_bits}-bit words")
+        if args.word is not None:
+            word = args.word & layout.full_mask
+            name, distance = layout.nearest_jackpot(word)
+            print(f"  {layout.format_word(word)}")
+            print(f"  {layout.classify(word)}; nearest jackpot {name} at {distance} bits\n")
+            continue
+        outcomes, distances = simulate(layout, args.draws, args.seed)
+        for name, hits in outcomes.items():
+            print(f"  {name:<32}{hits:>12}")
+        closest = min(distances)
+        print(f"  Closest draw to a jackpot: {closest} bits ({distances[closest]} draws)")
+        print(f"  Classification: {time_classify(layout, min(args.draws, 100000), args.seed):.0f} ns per draw\n")
+
+if __name__ == "__main__":
+    main()
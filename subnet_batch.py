@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Batch Subnet Calculator
+
+Vectorized companion to network-sim.py for generating large training and test
+datasets. Instead of building an ipaddress.IPv4Network per address, whole arrays
+of IPv4 addresses (as uint32) and prefix lengths are processed at once with
+bit arithmetic:
+
+- network address: address & mask
+- broadcast address: network | ~mask
+- first and last addressable IPs, and the number of addressable hosts
+- whether the address lies in a private (RFC 1918) range, as in network-sim.py
+
+Host ranges follow ipaddress.IPv4Network.hosts(): a /31 has two addressable
+hosts (RFC 3021) and a /32 has one, the address itself.
+
+Usage:
+Run the script to cross-check the batch API against the ipaddress module on
+random rows and edge cases (/0, /31, /32, octet carries), then time it:
+
+    python subnet_batch.py --rows 10000000
+"""
+
+import argparse
+import ipaddress
+import time
+
+import numpy as np
+
+from netmask_tables import MASK_INTS
+
+# Netmask of every prefix length from /0 to /32
+PREFIX_MASKS = np.array(MASK_INTS, dtype=np.uint32)
+
+# Private ranges as (network, mask) pairs, matching the checks in network-sim.py
+PRIVATE_RANGES = [
+    (0x0A000000, 0xFF000000),  # 10.0.0.0/8
+    (0xAC100000, 0xFFF00000),  # 172.16.0.0/12
+    (0xC0A80000, 0xFFFF0000),  # 192.168.0.0/16
+]
+
+REFERENCE_PRIVATE_NETWORKS = [ipaddress.IPv4Network((network, bin(mask).count('1'))) for network, mask in PRIVATE_RANGES]
+
+def octets_to_uint32(ips):
+    """
+    Packs IP addresses given as lists of 4 octets into uint32 values.
+
+    Parameters:
+    ips (array-like): An (n, 4) array or list of octet lists.
+
+    Returns:
+    numpy.ndarray: A uint32 array of addresses.
+    """
+    octets = np.asarray(ips, dtype=np.uint32).reshape(-1, 4)
+    return (octets[:, 0] << 24) | (octets[:, 1] << 16) | (octets[:, 2] << 8) | octets[:, 3]
+
+def uint32_to_octets(addresses):
+    """
+    Splits uint32 addresses into their octets.
+
+    Parameters:
+    addresses (numpy.ndarray): A uint32 array of addresses.
+
+    Returns:
+    numpy.ndarray: An (n, 4) uint8 array of octets, most significant first.
+    """
+    addresses = np.asarray(addresses, dtype=np.uint32)
+    return addresses.astype('>u4').view(np.uint8).reshape(-1, 4)
+
+def is_private(addresses):
+    """
+    Flags the addresses that lie in a private IP range.
+
+    Parameters:
+    addresses (numpy.ndarray): A uint32 array of addresses.
+
+    Returns:
+    numpy.ndarray: A boolean array.
+    """
+    addresses = np.asarray(addresses, dtype=np.uint32)
+    private = np.zeros(addresses.shape, dtype=bool)
+    for network, mask in PRIVATE_RANGES:
+        private |= (addresses & np.uint32(mask)) == network
+    return private
+
+def subnet_info(addresses, prefixes):
+    """
+    Computes the subnet details of every address/prefix pair.
+
+    Parameters:
+    addresses (numpy.ndarray): A uint32 array of addresses.
+    prefixes (numpy.ndarray): The prefix length of every address (0-32), or a single prefix length.
+
+    Returns:
+    dict: uint32 arrays 'network', 'broadcast', 'first_host', 'last_host' and
+    'host_count', and the boolean array 'private'.
+    """
+    addresses = np.asarray(addresses, dtype=np.uint32)
+    prefixes = np.broadcast_to(np.asarray(prefixes, dtype=np.uint8), addresses.shape)
+    if prefixes.size and prefixes.max() > 32:
+        raise ValueError("Prefix lengths must be between 0 and 32")
+
+    masks = PREFIX_MASKS[prefixes]
+    network = addresses & masks
+    broadcast = network | ~masks
+
+    # /31 and /32 have no separate network and broadcast addresses to skip
+    point_to_point = prefixes >= 31
+    offset = np.where(point_to_point, 0, 1).astype(np.uint32)
+    first_host = network + offset
+    last_host = broadcast - offset
+    host_count = (last_host - first_host) + np.uint32(1)
+
+    return {
+        'network': network,
+        'broadcast': broadcast,
+        'first_host': first_host,
+        'last_host': last_host,
+        'host_count': host_count,
+        'private': is_private(addresses),
+    }
+
+def reference_info(address, prefix):
+    """Computes the subnet details of one address with the ipaddress module."""
+    network = ipaddress.IPv4Network((address, prefix), strict=False)
+    hosts = list(network.hosts()) if network.num_addresses <= 4 else None
+    first_host = hosts[0] if hosts else network.network_address + 1
+    last_host = hosts[-1] if hosts else network.broadcast_address - 1
+    return {
+        'network': int(network.network_address),
+        'broadcast': int(network.broadcast_address),
+        'first_host': int(first_host),
+        'last_host': int(last_host),
+        'host_count': len(hosts) if hosts else network.num_addresses - 2,
+        'private': any(ipaddress.IPv4Address(address) in private for private in REFERENCE_PRIVATE_NETWORKS),
+    }
+
+def edge_cases():
+    """Returns address/prefix pairs covering /0, /31, /32 and carries across octets."""
+    addresses = [0, 0xFFFFFFFF, 0x0A0000FF, 0x0A00FFFF, 0x0AFFFFFF, 0xC0A801FE, 0xC0A801FF,
+                 0xAC0FFFFF, 0xAC100000, 0xAC1FFFFF, 0xAC200000, 0x0A000100, 0x7FFFFFFF, 0x80000000]
+    return [(address, prefix) for address in addresses for prefix in range(33)]
+
+def verify_against_ipaddress(samples=20000, seed=0):
+    """
+    Cross-checks subnet_info() against the ipaddress module.
+
+    Parameters:
+    samples (int): The number of random address/prefix pairs to check besides the edge cases.
+    seed (int): Seed for the random pairs.
+
+    Returns:
+    int: The number of pairs checked. Raises AssertionError on the first mismatch.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = edge_cases() + list(zip(rng.integers(0, 1 << 32, samples).tolist(), rng.integers(0, 33, samples).tolist()))
+    addresses = np.array([address for address, _ in pairs], dtype=np.uint32)
+    prefixes = np.array([prefix for _, prefix in pairs], dtype=np.uint8)
+    batch = subnet_info(addresses, prefixes)
+
+    for i, (address, prefix) in enumerate(pairs):
+        expected = reference_info(address, prefix)
+        for field, value in expected.items():
+            if batch[field][i] != value:
+                raise AssertionError(
+                    f"{ipaddress.IPv4Address(address)}/{prefix}: {field} is {batch[field][i]}, expected {value}")
+    return len(pairs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized IPv4 subnet calculator.")
+    parser.add_argument('--rows', type=int, default=10_000_000, help="number of rows to time")
+    parser.add_argument('--samples', type=int, default=20000, help="random rows checked against ipaddress")
+    args = parser.parse_args()
+
+    checked = verify_against_ipaddress(args.samples)
+    print(f"Verified {checked} address/prefix pairs against the ipaddress module.")
+
+    rng = np.random.default_rng()
+    addresses = rng.integers(0, 1 << 32, args.rows, dtype=np.uint32)
+    prefixes = rng.integers(0, 33, args.rows, dtype=np.uint8)
+    start = time.perf_counter()
+    subnet_info(addresses, prefixes)
+    elapsed = time.perf_counter() - start
+    print(f"{args.rows} rows in {elapsed:.3f}s ({args.rows / elapsed:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
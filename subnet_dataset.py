@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Subnet Quiz Dataset Generator
+
+Generates question banks for the IP address and subnet mask trainer
+(network-sim.py) in bulk. Each record is one trainer turn: an IP address, its
+prefix length and subnet mask, and the answers (network address, broadcast
+address, first and last addressable IPs, number of hosts, private flag).
+
+The generator follows the trainer's rules:
+- every 5th turn uses a random private IP address (10/8, 172.16/12 or 192.168/16
+  chosen with equal odds, last octet 1-254), other turns a fully random address;
+- private addresses get a prefix length from their class range (/8, /12 or /16
+  up to /30), all others a prefix length from /8 to /30.
+
+Records are generated in NumPy chunks and answered with subnet_batch, then
+written through a buffered sink: JSON lines, CSV or a compact binary columnar
+file (see ColumnarSink). The text sinks format every row in Python and are
+best suited to smaller banks; the columnar sink writes whole columns at once.
+
+Usage:
+    python subnet_dataset.py 50000000 --format columnar --output bank.sncol --seed 1
+    python subnet_dataset.py 1000 --format jsonl
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from netmask_tables import MASK_DOTTED
+from subnet_batch import subnet_info
+
+# Records generated per chunk
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# Dotted form of every 16-bit half of an address, so a full address is two lookups
+DOTTED_HALVES = np.array([f'{value >> 8}.{value & 0xFF}' for value in range(1 << 16)], dtype=object)
+
+# (first octet, second octet range) of the private classes in generate_random_private_ip()
+PRIVATE_CLASSES = [(10, 0, 255), (172, 16, 31), (192, 168, 168)]
+
+# Columns of a record and their binary dtype, in file order
+COLUMNS = [
+    ('turn', '<u8'),
+    ('ip', '<u4'),
+    ('prefix', 'u1'),
+    ('network', '<u4'),
+    ('broadcast', '<u4'),
+    ('first_host', '<u4'),
+    ('last_host', '<u4'),
+    ('host_count', '<u4'),
+    ('private', 'u1'),
+]
+
+def format_dotted(addresses):
+    """
+    Formats uint32 addresses in dotted decimal notation.
+
+    Parameters:
+    addresses (numpy.ndarray): A uint32 array of addresses.
+
+    Returns:
+    numpy.ndarray: An object array of strings.
+    """
+    return DOTTED_HALVES[addresses >> 16] + '.' + DOTTED_HALVES[addresses & 0xFFFF]
+
+def generate_chunk(rng, first_turn, count):
+    """
+    Generates the records of count consecutive trainer turns.
+
+    Parameters:
+    rng (numpy.random.Generator): The random generator to draw from.
+    first_turn (int): The turn counter of the first record (the trainer starts at 1).
+    count (int): The number of records.
+
+    Returns:
+    dict: One array per column in COLUMNS.
+    """
+    turns = np.arange(first_turn, first_turn + count, dtype=np.uint64)
+    ips = rng.integers(0, 1 << 32, count, dtype=np.uint32)
+
+    # Every 5th turn gets a random private address
+    private_turns = np.flatnonzero(turns % 5 == 0)
+    classes = rng.integers(0, len(PRIVATE_CLASSES), private_turns.size)
+    first_octets = np.array([first for first, _, _ in PRIVATE_CLASSES], dtype=np.uint32)[classes]
+    second_low = np.array([low for _, low, _ in PRIVATE_CLASSES])[classes]
+    second_high = np.array([high for _, _, high in PRIVATE_CLASSES])[classes]
+    second_octets = rng.integers(second_low, second_high + 1).astype(np.uint32)
+    third_octets = rng.integers(0, 256, private_turns.size, dtype=np.uint32)
+    fourth_octets = rng.integers(1, 255, private_turns.size, dtype=np.uint32)
+    ips[private_turns] = (first_octets << 24) | (second_octets << 16) | (third_octets << 8) | fourth_octets
+
+    # Prefix lengths follow generate_private_subnet_mask() for private addresses
+    first = ips >> 24
+    second = (ips >> 16) & 0xFF
+    shortest = np.full(count, 8, dtype=np.int64)
+    shortest[(first == 172) & (second >= 16) & (second <= 31)] = 12
+    shortest[(first == 192) & (second == 168)] = 16
+    prefixes = rng.integers(shortest, 31).astype(np.uint8)
+
+    answers = subnet_info(ips, prefixes)
+    return {
+        'turn': turns,
+        'ip': ips,
+        'prefix': prefixes,
+        'network': answers['network'],
+        'broadcast': answers['broadcast'],
+        'first_host': answers['first_host'],
+        'last_host': answers['last_host'],
+        'host_count': answers['host_count'],
+        'private': answers['private'].astype(np.uint8),
+    }
+
+def generate_records(num_records, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Lazily generates the records of num_records trainer turns, starting at turn 1.
+
+    Parameters:
+    num_records (int): The number of records.
+    seed (int, optional): Seed for a reproducible bank.
+    chunk_size (int): The number of records per chunk.
+
+    Yields:
+    dict: One array per column in COLUMNS for every chunk.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    rng = np.random.default_rng(seed)
+    generated = 0
+    while generated < num_records:
+        count = min(chunk_size, num_records - generated)
+        yield generate_chunk(rng, generated + 1, count)
+        generated += count
+
+class JsonlSink:
+    """Writes records as JSON lines with dotted addresses."""
+
+    RECORD = ('{"turn":%d,"ip":"%s","prefix":%d,"mask":"%s","network":"%s","broadcast":"%s",'
+              '"first_host":"%s","last_host":"%s","host_count":%d,"private":%s}\n')
+    BOOLEANS = ('false', 'true')
+
+    def __init__(self, out):
+        self.out = out
+
+    def _rows(self, chunk):
+        prefixes = chunk['prefix'].tolist()
+        return zip(
+            chunk['turn'].tolist(),
+            format_dotted(chunk['ip']),
+            prefixes,
+            [MASK_DOTTED[prefix] for prefix in prefixes],
+            format_dotted(chunk['network']),
+            format_dotted(chunk['broadcast']),
+            format_dotted(chunk['first_host']),
+            format_dotted(chunk['last_host']),
+            chunk['host_count'].tolist(),
+            [self.BOOLEANS[private] for private in chunk['private'].tolist()],
+        )
+
+    def write(self, chunk):
+        """Writes one chunk of records."""
+        self.out.write(''.join(map(self.RECORD.__mod__, self._rows(chunk))).encode())
+
+    def close(self):
+        """Finishes the output."""
+
+class CsvSink(JsonlSink):
+    """Writes records as CSV with a header row and dotted addresses."""
+
+    RECORD = '%d,%s,%d,%s,%s,%s,%s,%s,%d,%s\n'
+    HEADER = 'turn,ip,prefix,mask,network,broadcast,first_host,last_host,host_count,private\n'
+    BOOLEANS = ('0', '1')
+
+    def __init__(self, out):
+        super().__init__(out)
+        self.out.write(self.HEADER.encode())
+
+class ColumnarSink:
+    """
+    Writes records to a compact binary columnar file.
+
+    The file starts with the magic number b'SNCOL', a version byte and the number
+    of columns. Every chunk is then stored as a row group: the number of rows as a
+    little-endian uint32, followed by each column of COLUMNS as one contiguous
+    array of its dtype.
+    """
+
+    MAGIC = b'SNCOL'
+    VERSION = 1
+
+    def __init__(self, out):
+        self.out = out
+        self.out.write(self.MAGIC + bytes([self.VERSION, len(COLUMNS)]))
+
+    def write(self, chunk):
+        """Writes one chunk of records as a row group."""
+        self.out.write(np.uint32(len(chunk['turn'])).astype('<u4').tobytes())
+        for name, dtype in COLUMNS:
+            self.out.write(np.ascontiguousarray(chunk[name], dtype=dtype).tobytes())
+
+    def close(self):
+        """Finishes the output."""
+
+SINKS = {
+    'jsonl': JsonlSink,
+    'csv': CsvSink,
+    'columnar': ColumnarSink,
+}
+
+def read_columnar(path):
+    """
+    Loads a file written by ColumnarSink.
+
+    Parameters:
+    path (str): The file to read.
+
+    Returns:
+    dict: One array per column in COLUMNS.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    header_size = len(ColumnarSink.MAGIC) + 2
+    if data[:len(ColumnarSink.MAGIC)] != ColumnarSink.MAGIC:
+        raise ValueError(f"{path} is not a columnar subnet dataset")
+    if data[len(ColumnarSink.MAGIC)] != ColumnarSink.VERSION or data[header_size - 1] != len(COLUMNS):
+        raise ValueError(f"Unsupported columnar subnet dataset version in {path}")
+
+    parts = {name: [] for name, _ in COLUMNS}
+    offset = header_size
+    while offset < len(data):
+        rows = int(np.frombuffer(data, dtype='<u4', count=1, offset=offset)[0])
+        offset += 4
+        for name, dtype in COLUMNS:
+            parts[name].append(np.frombuffer(data, dtype=dtype, count=rows, offset=offset))
+            offset += rows * np.dtype(dtype).itemsize
+    return {name: np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+            for (name, dtype), arrays in zip(COLUMNS, parts.values())}
+
+def write_dataset(out, num_records, sink_format, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generates a question bank and writes it through a sink.
+
+    Parameters:
+    out (file): A file opened in binary mode.
+    num_records (int): The number of records.
+    sink_format (str): One of the keys of SINKS.
+    seed (int, optional): Seed for a reproducible bank.
+    chunk_size (int): The number of records per chunk.
+    """
+    sink = SINKS[sink_format](out)
+    for chunk in generate_records(num_records, seed, chunk_size):
+        sink.write(chunk)
+    sink.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate subnet quiz datasets.")
+    parser.add_argument('records', type=int, help="number of questions to generate")
+    parser.add_argument('--format', choices=sorted(SINKS), default='jsonl', help="output format")
+    parser.add_argument('--output', help="file to write instead of stdout")
+    parser.add_argument('--seed', type=int, help="seed for a reproducible bank")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="records per chunk")
+    args = parser.parse_args()
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+
+    start = time.perf_counter()
+    if args.output:
+        with open(args.output, 'wb', buffering=1 << 20) as out:
+            write_dataset(out, args.records, args.format, args.seed, args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"{args.records} records in {elapsed:.2f}s ({args.records / elapsed:,.0f} records/s)")
+    else:
+        write_dataset(sys.stdout.buffer, args.records, args.format, args.seed, args.chunk_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Subnet Enumeration and Summarization
+
+Arithmetic engine for subnetting exercises over large address spaces, built on
+the network-sim tables (netmask_tables) and prefix parsing (prefix_index).
+Networks are (network address, prefix length) pairs of ints, and no address or
+network objects are ever materialized:
+
+- subnet_range() and host_range() return Python range objects, so the k-th
+  subnet or host, len(), slicing and membership are all O(1) and iteration is
+  lazy: subnet_range(0x0A000000, 8, 24)[39999] is the 40,000th /24 of 10/8.
+- summarize() collapses a list of addresses and networks into the fewest
+  covering prefixes in O(n log n) (one sort, then a linear merge).
+- supernet() finds the single shortest prefix covering a list of networks.
+- allocate_vlsm() carves a network into variable-length subnets sized for a
+  list of host requirements.
+
+Usage:
+    python subnet_enum.py split 10.0.0.0/8 24 40000
+    python subnet_enum.py summarize 10.0.0.0/24 10.0.1.0/24 10.0.2.0/23
+    python subnet_enum.py vlsm 192.168.0.0/24 50 20 10 2
+    python subnet_enum.py exercise
+    python subnet_enum.py verify
+"""
+
+import argparse
+import ipaddress
+import itertools
+import random
+
+from netmask_tables import MASK_INTS, address_octets, format_dotted
+from prefix_index import format_prefix, parse_prefix
+
+ADDRESS_SPACE = 1 << 32
+
+def block_size(prefix):
+    """Returns the number of addresses in a network with the given prefix length."""
+    return 1 << (32 - prefix)
+
+def last_address(network, prefix):
+    """Returns the last (broadcast) address of a network."""
+    return network | (~MASK_INTS[prefix] & 0xFFFFFFFF)
+
+def subnet_range(network, prefix, new_prefix):
+    """
+    Splits a network into equal subnets.
+
+    Parameters:
+    network (int): The network address.
+    prefix (int): The prefix length of the network.
+    new_prefix (int): The prefix length of the subnets (prefix to 32).
+
+    Returns:
+    range: The network addresses of the subnets, in order.
+    """
+    if not 0 <= prefix <= new_prefix <= 32:
+        raise ValueError(f"Cannot split a /{prefix} into /{new_prefix} subnets")
+    network &= MASK_INTS[prefix]
+    return range(network, network + block_size(prefix), block_size(new_prefix))
+
+def host_range(network, prefix):
+    """
+    Returns the addressable hosts of a network, following subnet_batch: the
+    network and broadcast addresses are skipped, except in a /31 (two hosts)
+    and a /32 (one host).
+
+    Parameters:
+    network (int): The network address.
+    prefix (int): The prefix length.
+
+    Returns:
+    range: The host addresses, in order.
+    """
+    network &= MASK_INTS[prefix]
+    skip = 0 if prefix >= 31 else 1
+    return range(network + skip, last_address(network, prefix) + 1 - skip)
+
+def range_to_prefixes(first, last):
+    """
+    Covers an inclusive address range with the fewest CIDR prefixes.
+
+    Parameters:
+    first (int): The first address.
+    last (int): The last address.
+
+    Returns:
+    list: (network, prefix length) pairs, in address order.
+    """
+    prefixes = []
+    while first <= last:
+        # The largest aligned block starting at first that does not pass last
+        size = first & -first if first else ADDRESS_SPACE
+        while size > last - first + 1:
+            size >>= 1
+        prefixes.append((first, 33 - size.bit_length()))
+        first += size
+    return prefixes
+
+def summarize(networks):
+    """
+    Collapses addresses and networks into the fewest covering prefixes.
+    Overlapping, duplicate and adjacent networks are merged.
+
+    Parameters:
+    networks (iterable): (network, prefix length) pairs; a plain int is a /32.
+
+    Returns:
+    list: (network, prefix length) pairs, in address order.
+    """
+    intervals = sorted(
+        (item, item) if isinstance(item, int) else (item[0] & MASK_INTS[item[1]], last_address(item[0], item[1]))
+        for item in networks
+    )
+    summary = []
+    first = last = None
+    for start, end in intervals:
+        if first is not None and start <= last + 1:
+            last = max(last, end)
+            continue
+        if first is not None:
+            summary += range_to_prefixes(first, last)
+        first, last = start, end
+    if first is not None:
+        summary += range_to_prefixes(first, last)
+    return summary
+
+def supernet(networks):
+    """
+    Finds the single shortest prefix covering all networks (a summary route).
+
+    Parameters:
+    networks (iterable): (network, prefix length) pairs; a plain int is a /32.
+
+    Returns:
+    tuple: The (network, prefix length) of the supernet.
+    """
+    lowest, highest = ADDRESS_SPACE, -1
+    for item in networks:
+        network, prefix = (item, 32) if isinstance(item, int) else item
+        lowest = min(lowest, network & MASK_INTS[prefix])
+        highest = max(highest, last_address(network, prefix))
+    if highest < 0:
+        raise ValueError("Cannot find the supernet of no networks")
+    prefix = 32 - (lowest ^ highest).bit_length()
+    return lowest & MASK_INTS[prefix], prefix
+
+def prefix_for_hosts(hosts):
+    """Returns the longest prefix length with room for the given number of hosts."""
+    if hosts < 1:
+        raise ValueError("A subnet needs at least one host")
+    if hosts <= 2:
+        return 33 - hosts  # /32 for one host, /31 for two (see host_range())
+    return 32 - (hosts + 1).bit_length()
+
+def allocate_vlsm(network, prefix, host_requirements):
+    """
+    Carves a network into variable-length subnets (VLSM). The largest subnets are
+    placed first, which keeps every subnet aligned without gaps between them.
+
+    Parameters:
+    network (int): The network address.
+    prefix (int): The prefix length of the network.
+    host_requirements (list): The number of hosts each subnet must hold.
+
+    Returns:
+    list: The (network, prefix length) of each subnet, in the order of host_requirements.
+    """
+    network &= MASK_INTS[prefix]
+    end = network + block_size(prefix)
+    prefixes = [prefix_for_hosts(hosts) for hosts in host_requirements]
+    allocation = [None] * len(prefixes)
+    next_network = network
+    for i in sorted(range(len(prefixes)), key=lambda i: prefixes[i]):
+        if prefixes[i] < prefix or next_network + block_size(prefixes[i]) > end:
+            raise ValueError(f"{format_prefix(network, prefix)} has no room for {host_requirements[i]} more hosts")
+        allocation[i] = (next_network, prefixes[i])
+        next_network += block_size(prefixes[i])
+    return allocation
+
+def format_address(address):
+    """Formats a 32-bit address in dotted decimal notation."""
+    return format_dotted(address_octets(address))
+
+def ordinal(number):
+    """Returns a number as an English ordinal, e.g. 40,000th."""
+    suffix = 'th' if 10 <= number % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(number % 10, 'th')
+    return f'{number:,}{suffix}'
+
+def split_exercise(rng):
+    """Returns a random subnet-splitting question and its answer."""
+    prefix = rng.randint(8, 24)
+    network = rng.getrandbits(32) & MASK_INTS[prefix]
+    new_prefix = rng.randint(prefix + 1, min(prefix + 20, 30))
+    subnets = subnet_range(network, prefix, new_prefix)
+    k = rng.randrange(len(subnets))
+    subnet = subnets[k]
+    question = (f"Split {format_prefix(network, prefix)} into /{new_prefix} subnets. "
+                f"How many subnets are there, and what is the {ordinal(k + 1)} subnet and its last host?")
+    answer = (f"{len(subnets):,} subnets; the {ordinal(k + 1)} is {format_prefix(subnet, new_prefix)}, "
+              f"last host {format_address(host_range(subnet, new_prefix)[-1])}")
+    return question, answer
+
+def summarize_exercise(rng):
+    """Returns a random route summarization question and its answer."""
+    prefix = rng.randint(16, 28)
+    base = rng.getrandbits(32) & MASK_INTS[prefix - 4]
+    networks = sorted(set((base + rng.randrange(16) * block_size(prefix), prefix) for _ in range(rng.randint(2, 6))))
+    listed = ', '.join(format_prefix(*network) for network in networks)
+    question = f"Summarize {listed}. Which single route covers them all, and what is the exact summary?"
+    answer = (f"Supernet {format_prefix(*supernet(networks))}; "
+              f"exact summary {', '.join(format_prefix(*network) for network in summarize(networks))}")
+    return question, answer
+
+def vlsm_exercise(rng):
+    """Returns a random VLSM allocation question and its answer."""
+    prefix = rng.randint(20, 24)
+    network = rng.getrandbits(32) & MASK_INTS[prefix]
+    while True:
+        hosts = [rng.choice([2, 5, 10, 14, 25, 30, 50, 60, 100, 120, 200, 250, 500]) for _ in range(rng.randint(2, 5))]
+        try:
+            allocation = allocate_vlsm(network, prefix, hosts)
+            break
+        except ValueError:
+            continue
+    question = (f"Allocate subnets for {', '.join(map(str, hosts))} hosts from {format_prefix(network, prefix)}, "
+                "largest first.")
+    answer = '; '.join(f"{count} hosts: {format_prefix(*subnet)}" for count, subnet in zip(hosts, allocation))
+    return question, answer
+
+EXERCISES = {
+    'split': split_exercise,
+    'summarize': summarize_exercise,
+    'vlsm': vlsm_exercise,
+}
+
+def verify_against_ipaddress(samples=2000, seed=0):
+    """
+    Cross-checks the engine against the ipaddress module on random networks.
+
+    Returns:
+    int: The number of checks. Raises AssertionError on the first mismatch.
+    """
+    rng = random.Random(seed)
+    checks = 0
+    for _ in range(samples):
+        prefix = rng.randint(0, 32)
+        network = rng.getrandbits(32) & MASK_INTS[prefix]
+        reference = ipaddress.IPv4Network((network, prefix))
+
+        new_prefix = rng.randint(prefix, min(prefix + 12, 32))
+        subnets = subnet_range(network, prefix, new_prefix)
+        k = rng.randrange(len(subnets))
+        expected = next(itertools.islice(reference.subnets(new_prefix=new_prefix), k, None))
+        assert (subnets[k], new_prefix) == (int(expected.network_address), expected.prefixlen), (reference, new_prefix, k)
+
+        if prefix >= 16:
+            hosts = list(reference.hosts())
+            assert list(host_range(network, prefix)) == [int(host) for host in hosts], reference
+
+        items = [(rng.getrandbits(32) & MASK_INTS[p], p) for p in (rng.randint(20, 32) for _ in range(rng.randint(1, 8)))]
+        base = rng.getrandbits(32) & MASK_INTS[16]
+        items = [((network & 0xFFFF) | base, p) for network, p in items if p >= 16]
+        if items:
+            collapsed = ipaddress.collapse_addresses(ipaddress.IPv4Network(item) for item in items)
+            expected = [(int(net.network_address), net.prefixlen) for net in collapsed]
+            assert summarize(items) == expected, items
+            covering = supernet(items)
+            assert all(ipaddress.IPv4Network(item).subnet_of(ipaddress.IPv4Network(covering)) for item in items), items
+        checks += 3
+    return checks
+
+def run_command(args):
+    """Runs a parsed command line. Invalid networks, addresses and sizes raise ValueError."""
+    if args.command == 'split':
+        network, prefix = parse_prefix(args.network)
+        subnets = subnet_range(network, prefix, args.new_prefix)
+        print(f"{format_prefix(network, prefix)} holds {len(subnets):,} /{args.new_prefix} subnets "
+              f"of {len(host_range(network, args.new_prefix)):,} hosts each")
+        if args.k is not None:
+            if not 1 <= args.k <= len(subnets):
+                raise ValueError(f"k must be between 1 and {len(subnets):,}")
+            subnet = subnets[args.k - 1]
+            hosts = host_range(subnet, args.new_prefix)
+            print(f"The {ordinal(args.k)} subnet is {format_prefix(subnet, args.new_prefix)}: "
+                  f"hosts {format_address(hosts[0])} - {format_address(hosts[-1])}, "
+                  f"broadcast {format_address(last_address(subnet, args.new_prefix))}")
+    elif args.command == 'summarize':
+        networks = [parse_prefix(text) for text in args.networks]
+        for network in summarize(networks):
+            print(format_prefix(*network))
+        print(f"Supernet: {format_prefix(*supernet(networks))}")
+    elif args.command == 'vlsm':
+        network, prefix = parse_prefix(args.network)
+        for hosts, subnet in zip(args.hosts, allocate_vlsm(network, prefix, args.hosts)):
+            print(f"{hosts:>8} hosts: {format_prefix(*subnet)}")
+    elif args.command == 'exercise':
+        rng = random.Random(args.seed)
+        while True:
+            kind = args.kind or rng.choice(sorted(EXERCISES))
+            question, answer = EXERCISES[kind](rng)
+            print(f"\n{question}")
+            input("\nPress Enter to see the answer...")
+            print(answer)
+            input("\nPress Enter for another exercise, or Ctrl+C to exit...")
+    else:
+        print(f"Verified {verify_against_ipaddress()} results against the ipaddress module.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Subnet enumeration, summarization and VLSM exercises.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    split = commands.add_parser('split', help="show the k-th subnet of a split network")
+    split.add_argument('network', help="network in CIDR notation")
+    split.add_argument('new_prefix', type=int, help="prefix length of the subnets")
+    split.add_argument('k', type=int, nargs='?', help="1-based subnet number (default: summary only)")
+
+    summary = commands.add_parser('summarize', help="summarize networks and addresses")
+    summary.add_argument('networks', nargs='+', help="networks in CIDR notation or addresses")
+
+    vlsm = commands.add_parser('vlsm', help="allocate variable-length subnets")
+    vlsm.add_argument('network', help="network in CIDR notation")
+    vlsm.add_argument('hosts', type=int, nargs='+', help="hosts needed in each subnet")
+
+    exercise = commands.add_parser('exercise', help="practise with random exercises")
+    exercise.add_argument('--kind', choices=sorted(EXERCISES), help="exercise type (default: random)")
+    exercise.add_argument('--seed', type=int, help="seed for reproducible exercises")
+
+    commands.add_parser('verify', help="cross-check the engine against the ipaddress module")
+    args = parser.parse_args()
+
+    try:
+        run_command(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()